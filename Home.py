@@ -1,10 +1,13 @@
 import streamlit as st
 
+from utils.warmup import start_warmup
+
 st.set_page_config(
     layout="wide",
     page_title="Vipshop Sales and Inventory Manage System",
     page_icon="🚀",
 )
+start_warmup()
 st.title("Welcome to Vipshop Sales and Inventory Management System")
 st.page_link("pages/1_🎨_Overview.py", label="Overview", icon="🎨")
 st.page_link("pages/2_📊_Sales.py", label="Sales", icon="📊")
@@ -1,20 +1,75 @@
+import math
+
 import plotly.express as px
-import polars as pl
 import streamlit as st
 
-from utils.data import load_data
-from utils.config import DATE, DATE_MIN
+from utils.charts import compact_figure, downsample_dates, fold_top_n
+from utils.cube import HIERARCHIES
+from utils.queries import (
+    get_distinct_counts,
+    get_members,
+    get_monthly_rollup,
+    get_order_rows,
+    get_range_rollup,
+    get_raw_columns,
+    get_raw_count,
+    get_raw_page,
+)
+from utils.config import CAT, CAT_MAP, DATE, DATE_MIN
+from utils.export import export_buttons
+from utils.perf import finish_page, section, start_rerun
+from utils.prefetch import prefetch
+from utils.sketch import ERROR
+from utils.warmup import start_warmup
 
 st.set_page_config(layout="wide", page_title="Overview", page_icon="🎨")
 st.title("Overview")
-
-df_raw = load_data()
+start_warmup()
+start_rerun("Overview")
 
 # -----------------------------------
 # raw data
 # -----------------------------------
-with st.expander("View Raw Data", expanded=False):
-    st.dataframe(df_raw)
+with section("raw data"), st.expander("View Raw Data", expanded=False):
+    # filtered, sorted and paged server-side, only the visible rows are sent
+    raw_columns = get_raw_columns()
+    cols_raw = st.columns(4)
+    with cols_raw[0]:
+        search = st.text_input("Search", placeholder="Product, brand, customer...")
+    with cols_raw[1]:
+        sort = st.selectbox(
+            "Sort by", raw_columns, index=raw_columns.index("OrderDate")
+        )
+    with cols_raw[2]:
+        page_size = st.selectbox("Rows per Page", [50, 100, 500], index=1)
+    with cols_raw[3]:
+        descending = st.toggle("Descending", value=False)
+
+    raw_filters = {}
+    for col_raw_filter, (cat_sel, cat) in zip(
+        st.columns(len(CAT_MAP)), CAT_MAP.items()
+    ):
+        with col_raw_filter:
+            raw_filters[cat] = st.selectbox(
+                cat_sel, [None] + get_members(cat), key=f"raw_filter_{cat}"
+            )
+
+    n_rows = get_raw_count(raw_filters, search)
+    n_pages = max(math.ceil(n_rows / page_size), 1)
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
+    st.dataframe(
+        get_raw_page(raw_filters, search, sort, descending, page - 1, page_size),
+        hide_index=True,
+    )
+    st.caption(
+        f"Rows {min((page - 1) * page_size + 1, n_rows)} - "
+        f"{min(page * page_size, n_rows)} of {n_rows}"
+    )
+    export_buttons(
+        "raw",
+        "orders",
+        {"Orders": lambda: get_order_rows(None, raw_filters, search, sort, descending)},
+    )
 
 
 # -----------------------------------
@@ -31,16 +86,42 @@ with st.expander("Filter", expanded=True):
         value=date_range,
     )
 
-df_date_range = df_raw.filter(
-    pl.col("OrderDate").is_between(date_range_selected[0], date_range_selected[1])
+# the sections below are independent, their views run together while the
+# widgets of a section not rendered yet keep their last values
+prefetch(
+    [
+        *[
+            (get_range_rollup, (dims, [metric], date_range_selected))
+            for dims in [HIERARCHIES["Category"], HIERARCHIES["Team"], ["BrandName"]]
+        ],
+        *[
+            (
+                get_distinct_counts,
+                (
+                    dims,
+                    date_range_selected,
+                    {},
+                    st.session_state.get("distinct_exact", False),
+                ),
+            )
+            for dims in [(), (CAT_MAP[st.session_state.get("distinct_cat", CAT[0])],)]
+        ],
+        *[
+            (get_monthly_rollup, (dim, [metric]))
+            for dim in ["CategoryName", "TeamID", "BrandName"]
+        ],
+    ]
 )
 
 # -----------------------------------
 # sunburst chart
 # -----------------------------------
-with st.expander(
-    f"{metric} Proportion between {date_range_selected[0]} and {date_range_selected[1]}",
-    expanded=True,
+with (
+    section("sunburst"),
+    st.expander(
+        f"{metric} Proportion between {date_range_selected[0]} and {date_range_selected[1]}",
+        expanded=True,
+    ),
 ):
     color_map_cat = px.colors.qualitative.Prism
     color_map_team = px.colors.qualitative.T10
@@ -49,105 +130,143 @@ with st.expander(
     col_sunburst = st.columns(3)
     with col_sunburst[0]:
         fig_sunburst_cat_sales = px.sunburst(
-            df_date_range.group_by("CategoryName", "SubcategoryName")
-            .agg(pl.sum(metric))
-            .sort("CategoryName", "SubcategoryName"),
-            path=["CategoryName", "SubcategoryName"],
+            get_range_rollup(HIERARCHIES["Category"], [metric], date_range_selected),
+            path=HIERARCHIES["Category"],
             values=metric,
             title="Category",
             color_discrete_sequence=color_map_cat,
         )
-        st.plotly_chart(fig_sunburst_cat_sales)
+        st.plotly_chart(compact_figure(fig_sunburst_cat_sales))
 
     with col_sunburst[1]:
         fig_sunburst_team_sales = px.sunburst(
-            df_date_range.group_by("TeamID", "BuyerName")
-            .agg(pl.sum(metric))
-            .sort("TeamID", "BuyerName"),
-            path=["TeamID", "BuyerName"],
+            fold_top_n(
+                get_range_rollup(HIERARCHIES["Team"], [metric], date_range_selected),
+                "BuyerName",
+                [metric],
+                within=["TeamID"],
+            ),
+            path=HIERARCHIES["Team"],
             values=metric,
             title="Team",
             color_discrete_sequence=color_map_team,
         )
-        st.plotly_chart(fig_sunburst_team_sales)
+        st.plotly_chart(compact_figure(fig_sunburst_team_sales))
 
     with col_sunburst[2]:
         fig_sunburst_brand_sales = px.sunburst(
-            df_date_range.group_by("BrandName").agg(pl.sum(metric)).sort("BrandName"),
+            fold_top_n(
+                get_range_rollup(["BrandName"], [metric], date_range_selected),
+                "BrandName",
+                [metric],
+            ),
             path=["BrandName"],
             values=metric,
             title="Brand",
             color_discrete_sequence=color_map_brand,
         )
-        st.plotly_chart(fig_sunburst_brand_sales)
+        st.plotly_chart(compact_figure(fig_sunburst_brand_sales))
+
+    export_buttons(
+        "sunburst",
+        f"{date_range_selected[0]}_{date_range_selected[1]}",
+        {
+            "Orders": lambda: get_order_rows(date_range_selected),
+            **{
+                hierarchy: get_range_rollup(dims, [metric], date_range_selected)
+                for hierarchy, dims in [
+                    ("Category", HIERARCHIES["Category"]),
+                    ("Team", HIERARCHIES["Team"]),
+                    ("Brand", ["BrandName"]),
+                ]
+            },
+        },
+    )
 
 # -----------------------------------
-# time series chart
+# customers and orders
 # -----------------------------------
-fig_ts_cat = px.area(
-    df_raw.with_columns(
-        pl.col("OrderDate").dt.year().alias("Year"),
-        pl.col("OrderDate").dt.month().alias("Month"),
-    )
-    .group_by("Year", "Month", "CategoryName", maintain_order=True)
-    .agg(pl.sum(metric))
-    .with_columns(
-        pl.date(pl.col("Year"), pl.col("Month"), 1).dt.month_end().alias("OrderDate")
-    )
-    .sort("OrderDate", "CategoryName"),
-    x="OrderDate",
-    y=metric,
-    color="CategoryName",
-    color_discrete_sequence=color_map_cat,
-    title="Category",
-)
-fig_ts_cat.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
-fig_ts_cat.update_layout(hovermode="x unified")
+with (
+    section("customers"),
+    st.expander(
+        f"Customers and Orders between {date_range_selected[0]} and {date_range_selected[1]}",
+        expanded=True,
+    ),
+):
+    cols_distinct = st.columns(2)
+    with cols_distinct[0]:
+        cat_sel_distinct = st.radio(
+            "Breakdown by", CAT, horizontal=True, key="distinct_cat"
+        )
+    with cols_distinct[1]:
+        exact_distinct = st.toggle(
+            "Exact Counts",
+            value=False,
+            key="distinct_exact",
+            help=f"Estimates are within about ±{ERROR:.1%}, exact counts scan the order lines",
+        )
 
-fig_ts_team = px.area(
-    df_raw.with_columns(
-        pl.col("OrderDate").dt.year().alias("Year"),
-        pl.col("OrderDate").dt.month().alias("Month"),
-    )
-    .group_by("Year", "Month", "TeamID", maintain_order=True)
-    .agg(pl.sum(metric))
-    .with_columns(
-        pl.date(pl.col("Year"), pl.col("Month"), 1).dt.month_end().alias("OrderDate")
+    df_distinct_total = get_distinct_counts((), date_range_selected, {}, exact_distinct)
+    for col_metric, key in zip(
+        st.columns(len(df_distinct_total.columns)), df_distinct_total.columns
+    ):
+        with col_metric:
+            st.metric(key, f"{df_distinct_total[key].sum():,}")
+
+    st.dataframe(
+        get_distinct_counts(
+            (CAT_MAP[cat_sel_distinct],), date_range_selected, {}, exact_distinct
+        ),
+        hide_index=True,
     )
-    .sort("OrderDate", "TeamID"),
-    x="OrderDate",
-    y=metric,
-    color="TeamID",
-    color_discrete_sequence=color_map_team,
-    title="Team",
-)
-fig_ts_team.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
-fig_ts_team.update_layout(hovermode="x unified")
 
+# -----------------------------------
+# time series chart
+# -----------------------------------
+with section("time series"):
+    fig_ts_cat = px.area(
+        downsample_dates(get_monthly_rollup("CategoryName", [metric]), [metric]),
+        x="OrderDate",
+        y=metric,
+        color="CategoryName",
+        color_discrete_sequence=color_map_cat,
+        title="Category",
+    )
+    fig_ts_cat.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
+    fig_ts_cat.update_layout(hovermode="x unified")
 
-fig_ts_brand = px.area(
-    df_raw.with_columns(
-        pl.col("OrderDate").dt.year().alias("Year"),
-        pl.col("OrderDate").dt.month().alias("Month"),
+    fig_ts_team = px.area(
+        downsample_dates(get_monthly_rollup("TeamID", [metric]), [metric]),
+        x="OrderDate",
+        y=metric,
+        color="TeamID",
+        color_discrete_sequence=color_map_team,
+        title="Team",
     )
-    .group_by("Year", "Month", "BrandName", maintain_order=True)
-    .agg(pl.sum(metric))
-    .with_columns(
-        pl.date(pl.col("Year"), pl.col("Month"), 1).dt.month_end().alias("OrderDate")
+    fig_ts_team.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
+    fig_ts_team.update_layout(hovermode="x unified")
+
+    fig_ts_brand = px.area(
+        downsample_dates(
+            fold_top_n(
+                get_monthly_rollup("BrandName", [metric]), "BrandName", [metric]
+            ),
+            [metric],
+        ),
+        x="OrderDate",
+        y=metric,
+        color="BrandName",
+        color_discrete_sequence=color_map_brand,
+        title="Brand",
     )
-    .sort("OrderDate", "BrandName"),
-    x="OrderDate",
-    y=metric,
-    color="BrandName",
-    color_discrete_sequence=color_map_brand,
-    title="Brand",
-)
-fig_ts_brand.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
-fig_ts_brand.update_layout(hovermode="x unified")
+    fig_ts_brand.update_traces(mode="markers+lines", hovertemplate="$%{y: ,.2r}")
+    fig_ts_brand.update_layout(hovermode="x unified")
 
-with st.expander(
-    f"{metric} Trend between {date_range[0]} and {date_range[1]}", expanded=True
-):
-    st.plotly_chart(fig_ts_cat)
-    st.plotly_chart(fig_ts_team)
-    st.plotly_chart(fig_ts_brand)
+    with st.expander(
+        f"{metric} Trend between {date_range[0]} and {date_range[1]}", expanded=True
+    ):
+        st.plotly_chart(compact_figure(fig_ts_cat))
+        st.plotly_chart(compact_figure(fig_ts_team))
+        st.plotly_chart(compact_figure(fig_ts_brand))
+
+finish_page()
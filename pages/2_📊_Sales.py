@@ -1,47 +1,75 @@
-import polars as pl
+import datetime as dt
+
 import streamlit as st
 
+from utils.charts import compact_figure
 from utils.config import CAT, CAT_MAP, DATE, DATE_MAX, DATE_MIN
-from utils.data import (
-    get_df_ov,
-    get_monthly_ov_heatmap,
-    get_sub_td_metric,
-    get_td_filters,
-    get_td_metric,
-    load_data,
+from utils.data import plot_monthly_ov_heatmap
+from utils.export import export_buttons
+from utils.perf import finish_page, section, start_rerun
+from utils.prefetch import prefetch
+from utils.queries import (
+    get_cat_sub_td_metrics,
+    get_cat_td_distinct,
+    get_cat_td_metrics,
+    get_heatmap,
+    get_members,
+    get_order_rows,
+    get_sales_trend,
 )
+from utils.sketch import ERROR
+from utils.warmup import start_warmup
 
 st.set_page_config(layout="wide", page_title="Sales", page_icon="📊")
 st.title("Sales")
-df_raw = load_data()
+start_warmup()
+start_rerun("Sales")
 
 
-with st.expander("Sales Decomposition", expanded=True):
+with section("decomposition"), st.expander("Sales Decomposition", expanded=True):
     # ------------------------------
     # Filter by Date and Category
     # ------------------------------
     cols_filter = st.columns(3)
     with cols_filter[0]:
         date = st.date_input("As of Date", DATE, min_value=DATE_MIN, max_value=DATE_MAX)
-        year = date.year
-        month = date.month
-        day = date.day
-        quarter = (month - 1) // 3 + 1
 
     with cols_filter[1]:
         cat_sel = st.radio("Display by", CAT, horizontal=True)
         cat = CAT_MAP.get(cat_sel)
 
     with cols_filter[2]:
-        subcat_list = sorted(df_raw[cat].unique().to_list())
+        subcat_list = get_members(cat)
         subcat = st.selectbox(f"Select {cat_sel}", subcat_list)
 
-    df = df_raw.filter(pl.col(cat) == subcat)
+    # the tables, the heatmap and the trend are independent, their views run
+    # together while the widgets not rendered yet keep their last values
+    col_detail = "ProductName" if cat == "BrandName" else "BrandName"
+    year_ov = st.session_state.get("heatmap_year", DATE.year)
+    cat_ov = CAT_MAP[st.session_state.get("heatmap_cat", CAT[0])]
+    subcat_ov = st.session_state.get("heatmap_subcat")
+    if subcat_ov not in get_members(cat_ov):
+        subcat_ov = None
+    prefetch(
+        [
+            (get_cat_td_metrics, (cat, subcat, date, ["Sales", "Profit", "Cost"])),
+            (
+                get_cat_td_distinct,
+                (cat, subcat, date, st.session_state.get("td_distinct_exact", False)),
+            ),
+            (
+                get_cat_sub_td_metrics,
+                (cat, subcat, date, "Sales", ["SubcategoryName", col_detail]),
+            ),
+            (get_heatmap, (year_ov, cat_ov, subcat_ov)),
+            (get_sales_trend, ()),
+        ]
+    )
 
-    filters = get_td_filters(year, month, quarter, day)
-    df_sales = get_td_metric(df, "Sales", filters)
-    df_profit = get_td_metric(df, "Profit", filters)
-    df_cost = get_td_metric(df, "Cost", filters)
+    td_metrics = get_cat_td_metrics(cat, subcat, date, ["Sales", "Profit", "Cost"])
+    df_sales = td_metrics["Sales"]
+    df_profit = td_metrics["Profit"]
+    df_cost = td_metrics["Cost"]
 
     # ------------------------------
     # Total Sales and Gross Profit
@@ -70,26 +98,37 @@ with st.expander("Sales Decomposition", expanded=True):
             },
         )
 
+    # ------------------------------
+    # Customers and Orders
+    # ------------------------------
+    exact_distinct = st.toggle(
+        "Exact Counts",
+        value=False,
+        key="td_distinct_exact",
+        help=f"Estimates are within about ±{ERROR:.1%}, exact counts scan the order lines",
+    )
+    td_distinct = get_cat_td_distinct(cat, subcat, date, exact_distinct)
+    cols_distinct = st.columns(2)
+    for col_distinct, key in zip(cols_distinct, ["Customers", "Orders"]):
+        with col_distinct:
+            st.caption(f"{key} of {cat_sel} - {subcat}")
+            st.dataframe(
+                td_distinct[key],
+                column_config={
+                    "CurrentPeriod": st.column_config.NumberColumn(format="%d"),
+                    "LastPeriod": st.column_config.NumberColumn(format="%d"),
+                    "Growth": st.column_config.ProgressColumn(),
+                },
+            )
+
     # ------------------------------
     # Total Sales by Subcategory
     # ------------------------------
-    ytd_filter, qtd_filter, mtd_filter, lytd_filter, lqtd_filter, lmtd_filter = filters
     col_sub = "SubcategoryName"
-    metric = "Sales"
-    try:
-        df_sub_sales = (
-            get_sub_td_metric(df, metric, col_sub, "YTD", ytd_filter, lytd_filter)
-            .join(
-                get_sub_td_metric(df, metric, col_sub, "QTD", ytd_filter, lytd_filter),
-                on=col_sub,
-            )
-            .join(
-                get_sub_td_metric(df, metric, col_sub, "MTD", ytd_filter, lytd_filter),
-                on=col_sub,
-            )
-        )
-    except Exception:
-        df_sub_sales = pl.DataFrame({"Subcategory": ["No Data"]})
+    sub_td_sales = get_cat_sub_td_metrics(
+        cat, subcat, date, "Sales", [col_sub, col_detail]
+    )
+    df_sub_sales = sub_td_sales[col_sub]
 
     st.caption(f"Total Sales of {cat_sel} - {subcat}  by Subcategory")
     st.dataframe(
@@ -108,26 +147,7 @@ with st.expander("Sales Decomposition", expanded=True):
     # ------------------------------
     # Total Sales by Brand or Product
     # ------------------------------
-    col_detail = "ProductName" if cat == "BrandName" else "BrandName"
-    metric = "Sales"
-    try:
-        df_detail_sales = (
-            get_sub_td_metric(df, metric, col_detail, "YTD", ytd_filter, lytd_filter)
-            .join(
-                get_sub_td_metric(
-                    df, metric, col_detail, "QTD", ytd_filter, lytd_filter
-                ),
-                on=col_detail,
-            )
-            .join(
-                get_sub_td_metric(
-                    df, metric, col_detail, "MTD", ytd_filter, lytd_filter
-                ),
-                on=col_detail,
-            )
-        )
-    except Exception:
-        df_detail_sales = pl.DataFrame({col_detail.strip("Name"): ["No Data"]})
+    df_detail_sales = sub_td_sales[col_detail]
 
     st.caption(f"Total Sales of {cat_sel} - {subcat} by {col_detail.strip('Name')}")
     st.dataframe(
@@ -143,11 +163,26 @@ with st.expander("Sales Decomposition", expanded=True):
         },
     )
 
+    # the order lines behind the tables, this and last year up to date
+    export_buttons(
+        "decomposition",
+        f"{subcat}_{date}",
+        {
+            "Orders": lambda: get_order_rows(
+                (dt.date(date.year - 1, 1, 1), date), {cat: subcat}
+            ),
+            "Sales": df_sales,
+            "Profit": df_profit,
+            "Subcategory Sales": df_sub_sales,
+            f"{col_detail.strip('Name')} Sales": df_detail_sales,
+        },
+    )
+
 
 # ------------------------------
 # Monthly Sales Heatmap
 # ------------------------------
-with st.expander("Monthly Sales Heatmap", expanded=True):
+with section("heatmap"), st.expander("Monthly Sales Heatmap", expanded=True):
     cols_filter_ov = st.columns(3)
     with cols_filter_ov[0]:
         year_sel_ov = st.radio(
@@ -155,22 +190,30 @@ with st.expander("Monthly Sales Heatmap", expanded=True):
             options=[DATE.year, DATE.year - 1],
             index=0,
             horizontal=True,
+            key="heatmap_year",
         )
 
     with cols_filter_ov[1]:
-        cat_sel_ov = st.radio("Breakdown by", CAT, horizontal=True)
+        cat_sel_ov = st.radio("Breakdown by", CAT, horizontal=True, key="heatmap_cat")
         cat_ov = CAT_MAP.get(cat_sel_ov)
 
     with cols_filter_ov[2]:
-        subcat_list_ov = sorted(df_raw[cat_ov].unique().to_list())
-        subcat_ov = st.selectbox("Further Breakdown", [None] + subcat_list_ov)
+        subcat_list_ov = get_members(cat_ov)
+        subcat_ov = st.selectbox(
+            "Further Breakdown", [None] + subcat_list_ov, key="heatmap_subcat"
+        )
 
-    fig_heatmap = get_monthly_ov_heatmap(df_raw, year_sel_ov, cat_ov, subcat_ov)
-    st.plotly_chart(fig_heatmap)
+    fig_heatmap = plot_monthly_ov_heatmap(
+        get_heatmap(year_sel_ov, cat_ov, subcat_ov), subcat_ov
+    )
+    st.plotly_chart(compact_figure(fig_heatmap))
 
 
-with st.expander("Total Sales Trend (Available to Admin)", expanded=False):
-    df_ov = get_df_ov(df_raw)
+with (
+    section("sales trend"),
+    st.expander("Total Sales Trend (Available to Admin)", expanded=False),
+):
+    df_ov = get_sales_trend()
 
     st.dataframe(
         df_ov,
@@ -185,3 +228,5 @@ with st.expander("Total Sales Trend (Available to Admin)", expanded=False):
             ),
         },
     )
+
+finish_page()
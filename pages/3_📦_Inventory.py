@@ -2,21 +2,27 @@ import polars as pl
 import streamlit as st
 
 from utils.config import DATE
-from utils.data import get_df_turnover, load_data
+from utils.export import export_buttons
+from utils.perf import finish_page, section, start_rerun
+from utils.queries import (
+    get_brand_turnover,
+    get_category_turnover,
+    get_members,
+    get_turnover_rows,
+)
+from utils.warmup import start_warmup
 
 st.set_page_config(layout="wide", page_title="Inventory", page_icon="📦")
 st.title("Inventory")
+start_warmup()
+start_rerun("Inventory")
 
-df_raw = load_data()
-year = DATE.year
-month = DATE.month
-
-with st.expander("Trunover Analysis", expanded=True):
+with section("turnover"), st.expander("Trunover Analysis", expanded=True):
     with st.columns(2)[0]:
         n_month = st.slider(
             "Based on Number of Past Months", min_value=1, max_value=DATE.month, value=3
         )
-        subcat_list = sorted(df_raw["CategoryName"].unique().to_list())
+        subcat_list = get_members("CategoryName")
         subcat = st.selectbox("Category", subcat_list)
 
     # ------------------------------
@@ -58,12 +64,8 @@ with st.expander("Trunover Analysis", expanded=True):
     # ------------------------------
     # Category Turnover
     # ------------------------------
-    df_cat = df_raw.filter(pl.col("CategoryName") == subcat).filter(
-        (pl.col("OrderDate") >= pl.date(year, month - n_month + 1, 1))
-    )
-
     df_cat_turnover = (
-        get_df_turnover(df_cat, group_cat, turnover_cat, n_month)
+        get_category_turnover(subcat, DATE, n_month)
         .select(cols_cat)
         .with_columns(pl.col(avg_quantity_col).round(1))
     )
@@ -86,12 +88,11 @@ with st.expander("Trunover Analysis", expanded=True):
     # Brand Turnover
     # ------------------------------
     with st.columns(2)[0]:
-        brand = st.selectbox("Brand", sorted(df_cat["BrandName"].unique().to_list()))
+        brand = st.selectbox("Brand", df_cat_turnover["BrandName"].to_list())
         # sort_by_sales_brand = st.checkbox("Sort by Sales", value=True)
 
-    df_brand = df_cat.filter(pl.col("BrandName") == brand)
     df_brand_turnover = (
-        get_df_turnover(df_brand, group_brand, turnover_brand, n_month)
+        get_brand_turnover(subcat, brand, DATE, n_month)
         # .sort(
         #     avg_sales_col if sort_by_sales_brand else "ProductName",
         #     descending=sort_by_sales_brand,
@@ -110,3 +111,14 @@ with st.expander("Trunover Analysis", expanded=True):
             "Stock": st.column_config.NumberColumn(format="%d"),
         },
     )
+    export_buttons(
+        "turnover",
+        f"{subcat}_{brand}_{n_month}M",
+        {
+            "Orders": lambda: get_turnover_rows(subcat, brand, DATE, n_month),
+            "Brand Turnover": df_brand_turnover,
+            "Category Turnover": df_cat_turnover,
+        },
+    )
+
+finish_page()
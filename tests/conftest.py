@@ -0,0 +1,44 @@
+import polars as pl
+import pytest
+
+import utils.data
+from utils.cache import result_cache
+from utils.config import DATA_FILE
+from utils.data import ingest_file
+
+
+@pytest.fixture(scope="session")
+def df_raw():
+    # the order lines as the pages loaded them before the query layer, every
+    # view is checked against plain filters and group_bys over them
+    return (
+        pl.read_csv(DATA_FILE)
+        .with_columns(
+            pl.col("OrderDate").str.to_date(format="%m/%d/%y"),
+        )
+        .with_columns(
+            Sales=(pl.col("UnitPrice") - pl.col("Discount")) * pl.col("Quantity"),
+            StockValue=(pl.col("UnitPrice") - pl.col("Discount")) * pl.col("Stock"),
+        )
+        .with_columns(Profit=(pl.col("Sales") - pl.col("Cost") * pl.col("Quantity")))
+        .with_columns(
+            BuyerName=pl.concat_str(
+                pl.col("BuyerFirstName"), pl.col("BuyerLastName"), separator=" "
+            )
+        )
+    )
+
+
+@pytest.fixture(scope="session")
+def snapshot_parts(tmp_path_factory):
+    return [ingest_file(DATA_FILE, str(tmp_path_factory.mktemp("snapshot")))]
+
+
+@pytest.fixture
+def dataset(snapshot_parts, monkeypatch):
+    # the shipped export in a snapshot of its own, the result cache starts
+    # empty so no view is served from another test
+    monkeypatch.setattr(utils.data, "get_snapshot_parts", lambda: snapshot_parts)
+    result_cache.clear()
+    yield snapshot_parts
+    result_cache.clear()
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import utils.cache
+import utils.warmup
+from utils.cache import (
+    cached_result,
+    get_usage,
+    merge_usage,
+    record_usage,
+)
+from utils.config import USAGE_DECAY, WARMUP_INTERVAL
+from utils.warmup import load_usage, save_usage
+
+PARTS = [
+    {"files": {"data": "base"}, "date_min": "2024-01-01", "date_max": "2024-01-31"}
+]
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    # the usage counts of the process, empty for every test
+    monkeypatch.setattr(utils.cache, "_usage", {})
+    monkeypatch.setattr(utils.cache, "_usage_delta", {})
+
+
+def test_only_recorded_calls_are_counted(usage):
+    @cached_result(lambda: PARTS, record=lambda page: page == 0)
+    def get_page(page):
+        return page
+
+    for page in [0, 0, 1, 2]:
+        get_page(page)
+    assert [entry["count"] for entry in get_usage().values()] == [2]
+
+
+def test_merge_keeps_top_calls_of_each_view(usage):
+    for i in range(5):
+        record_usage(("m", "f", i), (i,), count=i + 1)
+        record_usage(("m", "g", i), (i,), count=10)
+    # the saved counts are decayed, the calls since are added to them
+    merged = merge_usage({("m", "f", 0): {"count": 8, "args": (0,)}}, 0.5, top_n=2)
+
+    assert {key: entry["count"] for key, entry in merged.items()} == {
+        ("m", "f", 0): 5,
+        ("m", "f", 4): 5,
+        ("m", "g", 0): 10,
+        ("m", "g", 1): 10,
+    }
+    assert get_usage() == merged
+    # the calls were merged, they are not added again
+    assert merge_usage({}) == {}
+
+
+def counts(usage):
+    return {key[2]: entry["count"] for key, entry in usage.items()}
+
+
+def test_processes_add_up_their_calls(usage, tmp_path, monkeypatch):
+    # two server processes sharing the file, each with its own counts
+    file = str(tmp_path / ".usage.pkl")
+    processes = [({}, {}), ({}, {})]
+    now = [1000.0]
+    monkeypatch.setattr(utils.warmup.time, "time", lambda: now[0])
+
+    def run(process, *calls):
+        monkeypatch.setattr(utils.cache, "_usage", processes[process][0])
+        monkeypatch.setattr(utils.cache, "_usage_delta", processes[process][1])
+        for call, count in calls:
+            record_usage(("m", "f", call), (call,), count=count)
+        save_usage(file)
+        return counts(get_usage())
+
+    run(0, (1, 3))
+    assert run(1, (1, 5), (2, 2)) == {1: 8, 2: 2}
+    # saved again without new calls, nothing is counted twice
+    assert run(0) == {1: 8, 2: 2}
+
+    # ten intervals later the counts decay once, whichever process saves
+    now[0] += 10 * WARMUP_INTERVAL
+    assert run(1) == pytest.approx({1: 8 * USAGE_DECAY**10, 2: 2 * USAGE_DECAY**10})
+    saved = run(0, (2, 1))
+    assert saved == pytest.approx({1: 8 * USAGE_DECAY**10, 2: 2 * USAGE_DECAY**10 + 1})
+
+    # a restarted process starts from the saved counts
+    monkeypatch.setattr(utils.cache, "_usage", {})
+    load_usage(file)
+    assert counts(get_usage()) == saved
+    # no temporary file is left behind
+    assert sorted(os.listdir(tmp_path)) == [".lock", ".usage.pkl"]
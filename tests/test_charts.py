@@ -0,0 +1,97 @@
+import base64
+import datetime as dt
+import json
+
+import numpy as np
+import plotly.express as px
+import polars as pl
+import pytest
+from plotly.tools import return_figure_from_figure_or_data
+
+from utils.charts import (
+    OTHER,
+    compact_figure,
+    downsample_dates,
+    encode_typed_array,
+    fold_top_n,
+)
+
+
+def decode(spec):
+    # what plotly.js does with a typed array spec
+    values = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=f"<{spec['dtype']}")
+    return values.reshape([int(n) for n in spec["shape"].split(",")])
+
+
+@pytest.mark.parametrize(
+    "values, dtype",
+    [
+        (np.array([1.5, np.nan, -2.25]), "f8"),
+        (np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], dtype=np.float32), "f4"),
+        (np.array([1, -2, 3], dtype=np.int64), "i4"),
+        (np.array([1, 2**40], dtype=np.int64), "f8"),
+        (np.array([], dtype=np.int64), "i4"),
+        ([1, 2, 3], "i4"),
+    ],
+)
+def test_typed_arrays_decode_to_the_values(values, dtype):
+    spec = encode_typed_array(values)
+    assert spec["dtype"] == dtype
+    np.testing.assert_array_equal(decode(spec), np.asarray(values))
+
+
+@pytest.mark.parametrize(
+    "values", [np.array(["a", "b"]), np.array([dt.date(2024, 1, 1)]), [1, None]]
+)
+def test_other_arrays_are_not_encoded(values):
+    assert encode_typed_array(values) is None
+
+
+def test_compact_figure_is_what_streamlit_sends():
+    rng = np.random.default_rng(0)
+    df = pl.DataFrame(
+        {
+            "OrderDate": pl.date_range(
+                dt.date(2024, 1, 1), dt.date(2024, 12, 31), eager=True
+            ),
+            "Sales": rng.random(366) * 1e5,
+        }
+    )
+    fig = px.area(df, x="OrderDate", y="Sales")
+
+    # st.plotly_chart takes the dict of a figure as validated and writes it
+    # out without validating it again
+    spec = return_figure_from_figure_or_data(compact_figure(fig), True)
+    trace = spec["data"][0]
+    assert trace["y"]["dtype"] == "f8"
+    np.testing.assert_array_equal(decode(trace["y"]), df["Sales"].to_numpy())
+    assert len(trace["x"]) == 366
+    # the dates stay strings, the sales go out in fewer bytes than as text
+    assert len(json.dumps(trace["y"])) < 0.75 * len(json.dumps(fig.data[0].y.tolist()))
+
+
+def test_heatmap_rows_keep_their_order():
+    z = np.arange(12, dtype=np.float64).reshape(3, 4)
+    fig = px.imshow(z, y=["a", "b", "c"])
+    trace = compact_figure(fig).to_dict()["data"][0]
+    assert trace["z"]["shape"] == "3,4"
+    np.testing.assert_array_equal(decode(trace["z"]), z)
+    assert list(trace["y"]) == ["a", "b", "c"]
+
+
+def test_folding_and_downsampling_keep_the_totals():
+    dates = pl.date_range(dt.date(2023, 1, 1), dt.date(2024, 12, 31), eager=True)
+    df = pl.DataFrame(
+        {
+            "OrderDate": pl.concat([dates, dates]),
+            "BrandName": ["A"] * len(dates) + ["B"] * len(dates),
+            "Sales": np.arange(2 * len(dates), dtype=np.float64),
+        }
+    )
+    df_folded = fold_top_n(df, "BrandName", ["Sales"], n=1)
+    assert df_folded["BrandName"].unique().sort().to_list() == ["B", OTHER]
+    df_sampled = downsample_dates(df_folded, ["Sales"], max_points=100)
+    assert df_sampled["OrderDate"].n_unique() <= 100
+    for df_chart in [df_folded, df_sampled]:
+        assert df_chart["Sales"].sum() == df["Sales"].sum()
+    assert fold_top_n(df, "BrandName", ["Sales"], n=None) is df
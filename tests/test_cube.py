@@ -0,0 +1,144 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.cube import (
+    CUBE_METRICS,
+    build_cube,
+    build_prefix_index,
+    extend_prefix_index,
+    range_sum,
+    range_sums,
+)
+
+DATE_START = dt.date(2024, 1, 1)
+N_DAYS = 120
+
+
+def make_orders(n_rows=2000):
+    # order lines with every cube column, a few members per dimension and no
+    # orders on sundays
+    days = [(i * 7919) % N_DAYS for i in range(n_rows)]
+    df = pl.DataFrame(
+        {
+            "OrderDate": [DATE_START + dt.timedelta(days=day) for day in days],
+            "CategoryName": [f"Cat{i % 3}" for i in range(n_rows)],
+            "SubcategoryName": [f"Sub{i % 5}" for i in range(n_rows)],
+            "TeamID": [i % 2 for i in range(n_rows)],
+            "BuyerName": [f"Buyer{i % 4}" for i in range(n_rows)],
+            "BrandName": [f"Brand{i % 7}" for i in range(n_rows)],
+            "ProductName": [f"Product{i % 11}" for i in range(n_rows)],
+            "Sales": [float(i % 97) for i in range(n_rows)],
+            "Profit": [float(i % 13 - 6) for i in range(n_rows)],
+            "Cost": [float(i % 31) for i in range(n_rows)],
+            "Quantity": [i % 5 + 1 for i in range(n_rows)],
+        }
+    )
+    return df.filter(pl.col("OrderDate").dt.weekday() != 7).with_columns(
+        pl.col(pl.String).cast(pl.Categorical("lexical"))
+    )
+
+
+def direct_sum(df, dims, date_range):
+    date_start, date_end = date_range
+    df_window = df.filter(pl.col("OrderDate").is_between(date_start, date_end))
+    if not dims:
+        if df_window.is_empty():
+            return df_window.select(CUBE_METRICS).clear()
+        return df_window.select(pl.sum(*CUBE_METRICS))
+    return df_window.group_by(dims).agg(pl.sum(*CUBE_METRICS)).sort(dims)
+
+
+@pytest.fixture(scope="module")
+def orders():
+    return make_orders()
+
+
+@pytest.fixture(scope="module")
+def cube(orders):
+    return build_cube(orders).collect()
+
+
+WINDOWS = [
+    (DATE_START, DATE_START + dt.timedelta(days=N_DAYS)),
+    (DATE_START + dt.timedelta(days=10), DATE_START + dt.timedelta(days=40)),
+    # a single day, and a sunday without orders
+    (DATE_START + dt.timedelta(days=3), DATE_START + dt.timedelta(days=3)),
+    (dt.date(2024, 1, 7), dt.date(2024, 1, 7)),
+    # windows starting before and ending after the data
+    (dt.date(2023, 6, 1), DATE_START + dt.timedelta(days=20)),
+    (DATE_START + dt.timedelta(days=100), dt.date(2025, 1, 1)),
+    (dt.date(2025, 1, 1), dt.date(2025, 2, 1)),
+]
+DIMS = [[], ["CategoryName"], ["CategoryName", "BrandName"], ["TeamID"]]
+
+
+@pytest.mark.parametrize("dims", DIMS)
+@pytest.mark.parametrize("date_range", WINDOWS)
+def test_range_sum_matches_filter(orders, cube, dims, date_range):
+    index = build_prefix_index(cube, dims)
+    assert_frame_equal(
+        range_sum(index, dims, date_range),
+        direct_sum(orders, dims, date_range),
+        check_dtypes=False,
+    )
+
+
+@pytest.mark.parametrize("dims", DIMS)
+def test_range_sums_answer_every_window(orders, cube, dims):
+    index = build_prefix_index(cube, dims)
+    windows = dict(enumerate(WINDOWS))
+    df_sums = range_sums(index, dims, windows).filter(pl.col("Count") > 0)
+    for name, date_range in windows.items():
+        assert_frame_equal(
+            df_sums.filter(pl.col("Window") == name)
+            .select(*dims, *CUBE_METRICS)
+            .sort(dims),
+            direct_sum(orders, dims, date_range),
+            check_dtypes=False,
+        )
+
+
+@pytest.mark.parametrize("dims", DIMS)
+def test_extend_prefix_index_matches_rebuild(cube, dims):
+    split = DATE_START + dt.timedelta(days=60)
+    cube_old = cube.filter(pl.col("OrderDate") <= split)
+    cube_new = cube.filter(pl.col("OrderDate") > split)
+
+    extended = extend_prefix_index(build_prefix_index(cube_old, dims), cube_new, dims)
+    rebuilt = build_prefix_index(cube, dims)
+    assert_frame_equal(
+        extended.sort(*dims, "OrderDate"), rebuilt.sort(*dims, "OrderDate")
+    )
+    for date_range in WINDOWS:
+        assert_frame_equal(
+            range_sum(extended, dims, date_range),
+            range_sum(rebuilt, dims, date_range),
+        )
+
+
+def test_extend_prefix_index_with_new_members(cube):
+    # a member first seen in the appended rows starts its own running totals
+    dims = ["BrandName"]
+    split = DATE_START + dt.timedelta(days=60)
+    cube_old = cube.filter(
+        (pl.col("OrderDate") <= split) & (pl.col("BrandName") != "Brand6")
+    )
+    cube_new = cube.filter(pl.col("OrderDate") > split)
+    extended = extend_prefix_index(build_prefix_index(cube_old, dims), cube_new, dims)
+    expected = build_prefix_index(pl.concat([cube_old, cube_new]), dims)
+    assert_frame_equal(
+        extended.sort(*dims, "OrderDate"), expected.sort(*dims, "OrderDate")
+    )
+
+
+def test_extend_prefix_index_rejects_overlap(cube):
+    split = DATE_START + dt.timedelta(days=60)
+    index = build_prefix_index(cube.filter(pl.col("OrderDate") <= split), [])
+    cube_new = cube.filter(pl.col("OrderDate") > split)
+    assert extend_prefix_index(index, cube_new, []) is not None
+    # rows on or before the last indexed day need a rebuild
+    cube_overlap = cube.filter(pl.col("OrderDate") >= split)
+    assert extend_prefix_index(index, cube_overlap, []) is None
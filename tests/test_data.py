@@ -0,0 +1,59 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.data import collect, query_data, search_data
+
+COLUMNS = ["OrderID", "ProductID", "OrderDate", "BrandName", "Sales", "Profit"]
+
+
+@pytest.mark.parametrize(
+    "date_range, filters",
+    [
+        (None, None),
+        ((dt.date(2023, 3, 1), dt.date(2024, 2, 29)), None),
+        ((None, dt.date(2023, 6, 30)), {"CategoryName": "Sportswear"}),
+        ((dt.date(2024, 1, 1), None), {"CategoryName": "Sportswear", "TeamID": None}),
+        (None, {"TeamID": 12}),
+    ],
+)
+def test_query_data_matches_the_eager_filters(df_raw, dataset, date_range, filters):
+    date_start, date_end = date_range or (None, None)
+    expected = df_raw.filter(
+        pl.lit(True),
+        pl.col("OrderDate") >= date_start if date_start else True,
+        pl.col("OrderDate") <= date_end if date_end else True,
+        *(
+            pl.col(col) == value
+            for col, value in (filters or {}).items()
+            if value is not None
+        ),
+    ).select(COLUMNS)
+    # the categories are read back as categoricals, the export holds strings
+    result = collect(query_data(COLUMNS, date_range, filters)).with_columns(
+        pl.col(pl.Categorical).cast(pl.String)
+    )
+
+    assert len(result) > 0
+    assert_frame_equal(
+        result.sort("OrderID", "ProductID"),
+        expected.sort("OrderID", "ProductID"),
+    )
+
+
+def test_search_data_matches_any_text_column(df_raw, dataset):
+    text = df_raw["BrandName"][0][1:4].upper()
+    expected = df_raw.filter(
+        pl.any_horizontal(
+            pl.col(col)
+            .cast(pl.String)
+            .str.to_lowercase()
+            .str.contains(text.lower(), literal=True)
+            for col in ["ProductID", "ProductName", "BrandName", "CategoryName"]
+            + ["SubcategoryName", "CustomerName", "BuyerName"]
+        )
+    )
+    result = collect(search_data(query_data(), text))
+    assert sorted(result["OrderID"].to_list()) == sorted(expected["OrderID"].to_list())
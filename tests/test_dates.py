@@ -0,0 +1,97 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+
+from utils.dates import get_month_offsets, slice_date_range, split_window
+
+DATE_START = dt.date(2023, 11, 20)
+
+
+@pytest.fixture(scope="module")
+def orders():
+    # a few lines a day, none in january so one month has no rows at all
+    dates = [DATE_START + dt.timedelta(days=i // 3) for i in range(3 * 200)]
+    df = pl.DataFrame({"OrderDate": [date for date in dates if date.month != 1]})
+    return df.with_row_index("Row").set_sorted("OrderDate")
+
+
+def test_month_offsets_point_at_the_first_row_of_every_month(orders):
+    df_offsets = get_month_offsets(orders)
+    months = df_offsets["Month"].to_list()
+    assert months[0] == dt.date(2023, 11, 1)
+    # a trailing month past the last row
+    assert months[-1] == dt.date(2024, 7, 1)
+    assert df_offsets["Offset"][-1] == orders.height
+    for month, offset in df_offsets.head(-1).iter_rows():
+        first = orders.filter(pl.col("OrderDate") >= month)["Row"].min()
+        assert offset == first
+
+
+@pytest.mark.parametrize(
+    "date_range",
+    [
+        (dt.date(2023, 11, 1), dt.date(2024, 6, 30)),
+        (dt.date(2023, 12, 31), dt.date(2024, 2, 1)),
+        (dt.date(2024, 1, 5), dt.date(2024, 1, 25)),
+        (dt.date(2024, 3, 15), dt.date(2024, 3, 15)),
+        (None, dt.date(2024, 4, 10)),
+        (dt.date(2024, 4, 10), None),
+        (dt.date(2025, 1, 1), None),
+        (dt.date(2024, 5, 1), dt.date(2024, 4, 1)),
+    ],
+)
+def test_slice_date_range_equals_filter(orders, date_range):
+    date_start, date_end = date_range
+    df_expected = orders.filter(
+        pl.col("OrderDate") >= (date_start or dt.date.min),
+        pl.col("OrderDate") <= (date_end or dt.date.max),
+    )
+    offsets = get_month_offsets(orders)
+    assert slice_date_range(orders, date_range).equals(df_expected)
+    assert slice_date_range(orders, date_range, offsets).equals(df_expected)
+
+
+def days(date_range):
+    date_start, date_end = date_range
+    return {
+        date_start + dt.timedelta(days=i)
+        for i in range((date_end - date_start).days + 1)
+    }
+
+
+@pytest.mark.parametrize(
+    "date_range, months, n_edges",
+    [
+        ((dt.date(2024, 1, 1), dt.date(2024, 3, 31)), (1, 3), 0),
+        ((dt.date(2024, 1, 10), dt.date(2024, 3, 31)), (2, 3), 1),
+        ((dt.date(2024, 1, 10), dt.date(2024, 4, 20)), (2, 3), 2),
+        ((dt.date(2024, 2, 1), dt.date(2024, 2, 29)), (2, 2), 0),
+        ((dt.date(2024, 2, 2), dt.date(2024, 3, 30)), None, 1),
+        ((dt.date(2024, 5, 3), dt.date(2024, 5, 3)), None, 1),
+    ],
+)
+def test_split_window_covers_every_day_once(date_range, months, n_edges):
+    window_months, edges = split_window(date_range)
+    assert len(edges) == n_edges
+    covered = [day for edge in edges for day in days(edge)]
+    if months is None:
+        assert window_months is None
+    else:
+        month_start, month_end = window_months
+        assert (month_start.month, month_end.month) == months
+        assert month_start.day == 1
+        assert (month_end + dt.timedelta(days=1)).day == 1
+        covered.extend(days(window_months))
+    assert sorted(covered) == sorted(days(date_range))
+
+
+def test_split_window_open_ends():
+    assert split_window((None, dt.date(2024, 3, 31))) == (
+        (None, dt.date(2024, 3, 31)),
+        [],
+    )
+    assert split_window((dt.date(2024, 3, 5), None)) == (
+        (dt.date(2024, 4, 1), None),
+        [(dt.date(2024, 3, 5), dt.date(2024, 3, 31))],
+    )
@@ -0,0 +1,62 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.config import DATE
+from utils.export import write_export
+from utils.queries import get_category_turnover, get_order_rows
+
+KEYS = ["OrderID", "ProductID"]
+
+
+@pytest.mark.parametrize(
+    "fmt, part_rows", [("CSV", 100), ("Parquet", 100), ("CSV", 10**6)]
+)
+def test_exported_rows_are_the_filtered_rows(df_raw, dataset, tmp_path, fmt, part_rows):
+    date_range = (dt.date(2024, 1, 1), DATE)
+    files = write_export(
+        get_order_rows(date_range, {"CategoryName": "Beauty"}),
+        "rows",
+        fmt,
+        tmp_path,
+        part_rows,
+    )
+    expected = df_raw.filter(
+        pl.col("OrderDate").is_between(*date_range),
+        pl.col("CategoryName") == "Beauty",
+    )
+    assert len(files) == -(-len(expected) // part_rows)
+    read = pl.read_csv if fmt == "CSV" else pl.read_parquet
+    df_export = pl.concat(
+        read(file).with_columns(
+            pl.col("OrderDate").cast(pl.Date), pl.col(pl.Categorical).cast(pl.String)
+        )
+        for file in files
+    )
+    assert_frame_equal(
+        df_export.select(expected.columns).sort(KEYS),
+        expected.sort(KEYS),
+        check_dtypes=False,
+    )
+
+
+def test_exported_aggregate_is_the_frame_shown(dataset, tmp_path):
+    # the turnover table of the inventory page, its monthly series as lists
+    df_turnover = get_category_turnover("Electronics", DATE, 3)
+    (file,) = write_export(df_turnover, "turnover", "Parquet", tmp_path)
+    assert_frame_equal(pl.read_parquet(file), df_turnover, categorical_as_str=True)
+
+    (file,) = write_export(df_turnover, "turnover", "CSV", tmp_path)
+    lists = ["Sales(3M)", "Quantity(3M)"]
+    assert_frame_equal(
+        pl.read_csv(file).with_columns(
+            pl.col(lists).str.split(" ").cast(pl.List(pl.Float64))
+        ),
+        df_turnover.with_columns(
+            pl.col(pl.Categorical).cast(pl.String),
+            pl.col(lists).cast(pl.List(pl.Float64)),
+        ),
+        check_dtypes=False,
+    )
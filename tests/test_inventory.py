@@ -0,0 +1,82 @@
+import polars as pl
+import pytest
+from polars.testing import assert_series_equal
+
+from utils.config import DATE
+from utils.queries import get_brand_turnover, get_category_turnover
+
+
+def get_monthly_series(df, group, n_month):
+    # the monthly sales and quantity of each member over the last n_month
+    # months, as the inventory page grouped the order lines before
+    return (
+        df.filter(
+            pl.col("OrderDate") >= pl.date(DATE.year, DATE.month - n_month + 1, 1)
+        )
+        .group_by(pl.col("OrderDate").dt.month().alias("Month"), group)
+        .agg(pl.sum("Sales", "Quantity"))
+        .sort("Month")
+        .group_by(group)
+        .agg(
+            pl.col("Sales").alias(f"Sales({n_month}M)"),
+            pl.mean("Sales").alias(f"AvgSales({n_month}M)"),
+            pl.col("Quantity").alias(f"Quantity({n_month}M)"),
+            pl.mean("Quantity").alias(f"AvgQuantity({n_month}M)"),
+        )
+        .sort(group)
+    )
+
+
+def get_stock(df, group):
+    # stock of each product on its latest order line, summed per member
+    return (
+        df.filter(pl.col("OrderDate") <= DATE)
+        .sort("OrderDate", "OrderID")
+        .group_by("ProductID")
+        .agg(pl.col(group, "Stock", "StockValue").last())
+        .group_by(group)
+        .agg(pl.sum("Stock", "StockValue"))
+        .sort(group)
+    )
+
+
+def check_turnover(df_turnover, df, group, n_month):
+    df_turnover = df_turnover.with_columns(pl.col(group).cast(pl.String)).sort(group)
+    df_series = get_monthly_series(df, group, n_month)
+    assert df_turnover[group].to_list() == df_series[group].to_list()
+    for col in df_series.columns[1:]:
+        assert_series_equal(df_turnover[col], df_series[col], check_dtypes=False)
+
+    df_stock = get_stock(df, group).join(df_series.select(group), on=group)
+    assert df_turnover["Stock"].to_list() == df_stock["Stock"].to_list()
+    assert df_turnover["StockValue"].to_list() == pytest.approx(
+        df_stock["StockValue"].to_list()
+    )
+    assert df_turnover["DollarTurnover"].to_list() == pytest.approx(
+        (df_stock["StockValue"] / df_series[f"AvgSales({n_month}M)"] * 30)
+        .round()
+        .to_list()
+    )
+    assert df_turnover["Turnover"].to_list() == pytest.approx(
+        (df_stock["Stock"] / df_series[f"AvgQuantity({n_month}M)"] * 30)
+        .round()
+        .to_list()
+    )
+
+
+@pytest.mark.parametrize("n_month", [1, 3, DATE.month])
+def test_turnover_matches_the_monthly_group_bys(df_raw, dataset, n_month):
+    category = "Electronics"
+    df_cat = df_raw.filter(pl.col("CategoryName") == category)
+    check_turnover(
+        get_category_turnover(category, DATE, n_month), df_cat, "BrandName", n_month
+    )
+
+    brand = df_cat["BrandName"].sort()[0]
+    df_brand = df_cat.filter(pl.col("BrandName") == brand)
+    check_turnover(
+        get_brand_turnover(category, brand, DATE, n_month),
+        df_brand,
+        "ProductName",
+        n_month,
+    )
@@ -0,0 +1,55 @@
+import datetime as dt
+
+import numpy as np
+import polars as pl
+import pytest
+
+from utils.charts import OTHER
+from utils.data import get_monthly_ov, pivot_calendar
+from utils.pivot import PERIODS, fold_rows
+
+
+def make_pivot(sales):
+    # one order line per brand and month of 2024, sales by brand
+    df = pl.DataFrame(
+        {
+            "OrderDate": [dt.date(2024, month, 1) for _ in sales for month in (1, 2)],
+            "BrandName": [brand for brand in sales for _ in (1, 2)],
+            "Sales": [float(sales[brand]) for brand in sales for _ in (1, 2)],
+        }
+    )
+    return pivot_calendar(df, ["BrandName"], ["Sales"])
+
+
+def test_fold_rows_flags_the_folded_row():
+    matrix = np.array([[1.0, np.nan], [5.0, 1.0], [3.0, np.nan], [2.0, np.nan]])
+    labels = pl.Series(["a", "b", "c", "d"])
+    folded_matrix, folded_labels, folded = fold_rows(matrix, labels, 2)
+    assert folded_labels.to_list() == ["b", "c", OTHER]
+    assert folded.tolist() == [False, False, True]
+    np.testing.assert_array_equal(folded_matrix[-1], [3.0, np.nan])
+
+    _, _, folded = fold_rows(matrix, labels, None)
+    assert not folded.any()
+
+
+def test_member_named_other_keeps_its_place():
+    pivot = make_pivot({"Alpha": 3, OTHER: 2, "Zeta": 1})
+    df_monthly = get_monthly_ov(pivot, 2024, "BrandName", None)
+    assert df_monthly["BrandName"].to_list() == ["Alpha", OTHER, "Zeta"]
+
+
+@pytest.mark.parametrize(
+    "top_n, brands, other",
+    [
+        # the real member is folded with the long tail
+        (1, ["Alpha"], 4 + 2 + 1),
+        # a real member among the top joins the folded row
+        (3, ["Alpha", "Beta"], 2 + 1),
+    ],
+)
+def test_folded_row_goes_last(top_n, brands, other):
+    pivot = make_pivot({"Alpha": 9, "Beta": 4, OTHER: 2, "Zeta": 1})
+    df_monthly = get_monthly_ov(pivot, 2024, "BrandName", None, top_n)
+    assert df_monthly["BrandName"].to_list() == [*brands, OTHER]
+    assert df_monthly[PERIODS["month"][0]][-1] == other
@@ -0,0 +1,56 @@
+import math
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.queries import get_raw_columns, get_raw_count, get_raw_page
+
+KEYS = ["OrderID", "ProductID"]
+
+
+@pytest.mark.parametrize(
+    "filters, search, sort, descending",
+    [
+        ({"CategoryName": None, "TeamID": None}, "", "OrderDate", False),
+        ({"CategoryName": "Beauty", "TeamID": None}, "", "Sales", True),
+        ({"CategoryName": None, "TeamID": 12}, "an", "BrandName", False),
+        ({"CategoryName": None, "TeamID": None}, "o", "BrandName", True),
+    ],
+)
+def test_raw_pages_slice_the_sorted_rows(
+    df_raw, dataset, filters, search, sort, descending
+):
+    # the pages the explorer sends are the slices of the order lines the
+    # expander used to ship whole, sorted the same way
+    page_size = 40
+    expected = df_raw.filter(
+        pl.lit(True),
+        *(pl.col(col) == value for col, value in filters.items() if value is not None),
+        pl.any_horizontal(
+            pl.col(col).cast(pl.String).str.to_lowercase().str.contains(search)
+            for col in ["ProductID", "ProductName", "BrandName", "CategoryName"]
+            + ["SubcategoryName", "CustomerName", "BuyerName"]
+        ),
+    ).sort(sort, descending=descending)
+
+    n_rows = get_raw_count(filters, search)
+    assert n_rows == len(expected)
+    pages = [
+        get_raw_page(filters, search, sort, descending, page, page_size)
+        for page in range(math.ceil(n_rows / page_size))
+    ]
+    assert all(df_page.columns == get_raw_columns() for df_page in pages)
+    assert [len(df_page) for df_page in pages[:-1]] == [page_size] * (len(pages) - 1)
+    # rows tied on the sort column may come in another order, their values
+    # line up page by page and the pages together hold every row once
+    df_pages = pl.concat(
+        df_page.with_columns(pl.col(pl.Categorical).cast(pl.String))
+        for df_page in pages
+    )
+    assert df_pages[sort].to_list() == expected[sort].to_list()
+    assert_frame_equal(
+        df_pages.select(expected.columns).sort(KEYS),
+        expected.sort(KEYS),
+        check_dtypes=False,
+    )
@@ -0,0 +1,60 @@
+import os
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.config import DATE
+from utils.data import get_sub_td_metrics, get_td_filters, get_td_metrics
+from utils.queries import get_turnover_tables
+from utils.report import TD_METRICS, compute_reports, write_reports
+
+
+@pytest.fixture
+def reports(dataset):
+    return compute_reports(DATE, ["Category", "Team"], 1)
+
+
+def test_reports_hold_the_tables_of_every_member(df_raw, reports):
+    # each member as the sales page would show it after picking it
+    filters = get_td_filters(DATE.year, DATE.month, (DATE.month - 1) // 3 + 1, DATE.day)
+    for cat_sel, cat in [("Category", "CategoryName"), ("Team", "TeamID")]:
+        members = df_raw[cat].unique().sort()
+        assert len(members) > 1
+        for member in members:
+            keys = [pl.col("Dimension") == cat_sel, pl.col("Member") == str(member)]
+            df = df_raw.filter(pl.col(cat) == member)
+            td_metrics = get_td_metrics(df, TD_METRICS, filters)
+            assert_frame_equal(
+                reports["td_metrics"].filter(keys).drop("Dimension", "Member"),
+                pl.concat(
+                    df_td.select(pl.lit(metric).alias("Metric"), pl.all())
+                    for metric, df_td in td_metrics.items()
+                ),
+            )
+            sub_td_metrics = get_sub_td_metrics(
+                df, "Sales", ["SubcategoryName", "BrandName"], filters
+            )
+            for col, df_sub in sub_td_metrics.items():
+                assert_frame_equal(
+                    reports[f"sub_td_{col}"]
+                    .filter(keys)
+                    .drop("Dimension", "Member")
+                    .sort(col),
+                    df_sub.sort(col),
+                )
+
+
+def test_written_reports_read_back_the_same(reports, tmp_path):
+    write_reports(reports, DATE, tmp_path)
+    for name, df in reports.items():
+        assert_frame_equal(pl.read_parquet(tmp_path / f"{name}.parquet"), df)
+    for level, df in get_turnover_tables(DATE).items():
+        assert_frame_equal(
+            reports[f"turnover_{level}"],
+            df.select(reports[f"turnover_{level}"].columns),
+        )
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [f"{name}.parquet" for name in reports]
+        + ["Category.html", "Team.html", "Inventory.html", "index.html"]
+    )
@@ -0,0 +1,197 @@
+import datetime as dt
+import threading
+import time
+
+import polars as pl
+import pytest
+
+from utils.cache import ResultCache, estimate_size
+
+
+def make_part(data, date_min="2024-01-01", date_max="2024-01-31"):
+    return {"files": {"data": data}, "date_min": date_min, "date_max": date_max}
+
+
+PARTS = [make_part("base")]
+
+
+def make_value(n_rows):
+    return pl.DataFrame({"x": pl.int_range(n_rows, eager=True, dtype=pl.Int64)})
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_evicts_least_recently_used_over_budget():
+    size = estimate_size(make_value(1000))
+    cache = ResultCache(3 * size)
+    for key in "abc":
+        cache.put(key, make_value(1000), PARTS)
+    # a hit makes "a" the most recently used, "b" goes first
+    assert cache.get("a", PARTS) is not None
+    cache.put("d", make_value(1000), PARTS)
+
+    assert cache.get("b", PARTS) is None
+    for key in "acd":
+        assert cache.get(key, PARTS) is not None
+    assert cache.stats()["nbytes"] == 3 * size
+    assert cache.stats()["entries"] == 3
+
+
+def test_skips_values_over_budget_and_replaces_keys():
+    size = estimate_size(make_value(1000))
+    cache = ResultCache(2 * size)
+    cache.put("a", make_value(1000), PARTS)
+    cache.put("big", make_value(10_000), PARTS)
+    assert cache.get("big", PARTS) is None
+    assert cache.get("a", PARTS) is not None
+
+    # putting a key again replaces its size instead of adding to it
+    cache.put("a", make_value(1000), PARTS)
+    assert cache.stats()["nbytes"] == size
+    cache.put("a", make_value(10_000), PARTS)
+    assert cache.get("a", PARTS) is None
+    assert cache.stats()["nbytes"] == 0
+
+
+def test_appended_parts_only_invalidate_overlapping_windows():
+    cache = ResultCache(1 << 20)
+    cache.put("history", 1, PARTS)
+    cache.put("jan", 4, PARTS, window=(dt.date(2024, 1, 1), dt.date(2024, 1, 31)))
+    cache.put("feb", 5, PARTS, window=(None, dt.date(2024, 2, 29)))
+    parts = [*PARTS, make_part("delta", "2024-02-10", "2024-02-12")]
+    assert cache.get("history", parts) is None
+    assert cache.get("jan", parts)["value"] == 4
+    assert cache.get("feb", parts) is None
+    # a rewritten base file invalidates everything
+    assert cache.get("jan", [make_part("rewritten")]) is None
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(1 << 20)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("k", compute, PARTS))
+        )
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    # every other thread waits for the first computation before it finishes
+    wait_for(lambda: cache.coalesced == 5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [42] * 6
+    assert len(calls) == 1
+    assert cache.get_or_compute("k", compute, PARTS) == 42
+    assert len(calls) == 1
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    cache = ResultCache(1 << 20)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("k", compute, PARTS)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.coalesced == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4 and len(calls) == 1
+    assert cache.stats()["entries"] == 0
+    # nothing is left in flight, the next call computes again
+    assert cache.get_or_compute("k", lambda: 7, PARTS) == 7
+
+
+def test_waiters_compute_again_after_a_failed_warm():
+    cache = ResultCache(1 << 20)
+    release = threading.Event()
+    calls = []
+
+    def warm():
+        release.wait(5)
+        raise ImportError("half initialized module")
+
+    def compute():
+        calls.append(1)
+        return 42
+
+    errors = []
+
+    def call_warm():
+        try:
+            cache.get_or_compute("k", warm, PARTS, background=True)
+        except ImportError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call_warm)
+    thread.start()
+    wait_for(lambda: "k" in cache._inflight)
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("k", compute, PARTS))
+        )
+        for _ in range(3)
+    ]
+    for waiter in threads:
+        waiter.start()
+    wait_for(lambda: cache.coalesced == 3)
+    release.set()
+    for waiter in [thread, *threads]:
+        waiter.join(5)
+
+    # only the warm sees its error, the waiters compute the result once
+    assert len(errors) == 1
+    assert results == [42] * 3
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("n_keys", [1, 3])
+def test_distinct_keys_do_not_wait_on_each_other(n_keys):
+    cache = ResultCache(1 << 20)
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return "blocked"
+
+    thread = threading.Thread(target=cache.get_or_compute, args=("k", blocked, PARTS))
+    thread.start()
+    wait_for(lambda: "k" in cache._inflight)
+    for i in range(n_keys):
+        assert cache.get_or_compute(f"other{i}", lambda i=i: i, PARTS) == i
+    release.set()
+    thread.join(5)
+    assert cache.get("k", PARTS)["value"] == "blocked"
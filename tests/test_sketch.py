@@ -0,0 +1,132 @@
+import datetime as dt
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.sketch import (
+    ERROR,
+    REGISTERS,
+    build_sketch,
+    count_distinct,
+    estimate,
+    hash_ids,
+    merge_sketch,
+    slice_months,
+)
+
+DATE_START = dt.date(2024, 1, 1)
+N_DAYS = 150
+
+
+def make_rows(n_rows, n_customers, offset=0):
+    # order lines spread over five months, every line its own order
+    ids = range(offset, offset + n_rows)
+    return pl.DataFrame(
+        {
+            "OrderDate": [DATE_START + dt.timedelta(days=i % N_DAYS) for i in ids],
+            "CategoryName": [f"Cat{i % 3}" for i in ids],
+            "SubcategoryName": [f"Sub{i % 5}" for i in ids],
+            "TeamID": [i % 2 for i in ids],
+            "BuyerName": [f"Buyer{i % 4}" for i in ids],
+            "BrandName": [f"Brand{i % 7}" for i in ids],
+            "ClassName": ["SVIP" if i % 10 == 0 else "Non-SVIP" for i in ids],
+            "CustomerID": [(i * 7919) % n_customers for i in ids],
+            "OrderID": list(ids),
+        },
+        schema_overrides={"CustomerID": pl.Int32},
+    )
+
+
+def sketch(df):
+    return build_sketch(df).collect()
+
+
+def counts(df_counts, dims):
+    return df_counts.sort(*dims, "Key")
+
+
+def test_hash_is_splitmix64():
+    # the first outputs of splitmix64 seeded with 0, sketches of older parts
+    # only merge as long as these stay the same
+    df = pl.DataFrame({"id": [0, 0x9E3779B97F4A7C15]}, schema={"id": pl.UInt64})
+    assert df.select(hash_ids("id"))["id"].to_list() == [
+        0xE220A8397B1DCDAF,
+        0x6E789E6AA1B965F4,
+    ]
+
+
+@pytest.mark.parametrize("n_ids", [10, 1000, 20_000, 100_000])
+def test_estimates_within_the_error(n_ids):
+    # as many customers as orders, small counts are corrected by linear
+    # counting
+    df_counts = merge_sketch(sketch(make_rows(n_ids, n_ids)), [])
+    error = (
+        df_counts.filter(pl.col("Key").is_in(["Customers", "Orders"]))["Count"] - n_ids
+    ).abs()
+    assert error.max() <= 4 * ERROR * n_ids
+
+
+def test_estimate_of_empty_registers():
+    assert estimate(np.zeros((2, REGISTERS), dtype=np.uint8)).tolist() == [0, 0]
+
+
+def test_sketch_counts_within_the_error():
+    df = make_rows(30_000, 5_000)
+    for dims in [[], ["CategoryName"], ["TeamID", "BuyerName"]]:
+        df_exact = counts(count_distinct(df.lazy(), dims), dims)
+        df_sketch = counts(merge_sketch(sketch(df), dims), dims)
+        assert df_sketch.select(*dims, "Key").equals(df_exact.select(*dims, "Key"))
+        error = (df_sketch["Count"] - df_exact["Count"]).abs() / df_exact["Count"]
+        assert error.max() <= 4 * ERROR
+
+
+@pytest.mark.parametrize(
+    "dims, filters",
+    [
+        ([], None),
+        (["BrandName"], None),
+        (["SubcategoryName"], {"CategoryName": "Cat1"}),
+    ],
+)
+def test_merged_parts_equal_one_sketch(dims, filters):
+    # parts covering the same months, a sketch of both parts and their order
+    # lines merged in directly all hold the same registers
+    df_a, df_b = make_rows(3000, 800), make_rows(2000, 800, offset=3000)
+    df_counts = merge_sketch(sketch(pl.concat([df_a, df_b])), dims, filters)
+
+    df_parts = merge_sketch(pl.concat([sketch(df_a), sketch(df_b)]), dims, filters)
+    df_rows = merge_sketch(sketch(df_a), dims, filters, rows=[df_b.lazy()])
+    assert_frame_equal(counts(df_parts, dims), counts(df_counts, dims))
+    assert_frame_equal(counts(df_rows, dims), counts(df_counts, dims))
+
+
+def test_whole_months_and_partial_month_rows():
+    df = make_rows(5000, 1000)
+    date_range = (dt.date(2024, 1, 10), dt.date(2024, 4, 20))
+    months = (dt.date(2024, 2, 1), dt.date(2024, 3, 31))
+    edges = [
+        (dt.date(2024, 1, 10), dt.date(2024, 1, 31)),
+        (dt.date(2024, 4, 1), date_range[1]),
+    ]
+    df_window = df.filter(pl.col("OrderDate").is_between(*date_range))
+
+    df_merged = merge_sketch(
+        slice_months(sketch(df), months),
+        ["CategoryName"],
+        rows=[
+            df.lazy().filter(pl.col("OrderDate").is_between(*edge)) for edge in edges
+        ],
+    )
+    df_counts = merge_sketch(sketch(df_window), ["CategoryName"])
+    assert_frame_equal(
+        counts(df_merged, ["CategoryName"]), counts(df_counts, ["CategoryName"])
+    )
+
+
+def test_empty_selection():
+    df = make_rows(100, 50)
+    df_counts = merge_sketch(sketch(df), ["SubcategoryName"], {"CategoryName": "Gone"})
+    assert df_counts.is_empty()
+    assert df_counts.columns == ["SubcategoryName", "Key", "Count"]
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.config import DATA_FILE
+from utils.cube import CUBE_DIMS, CUBE_METRICS, build_cube
+from utils.data import ingest_file, read_parts
+from utils.partition import partition_csv
+from utils.sketch import build_sketch, merge_sketch
+from utils.snapshot import find_snapshot, read_meta
+
+
+@pytest.fixture
+def sources(tmp_path):
+    # batches of the shipped export, each its own source file
+    df = pl.read_csv(DATA_FILE, n_rows=600)
+    files = []
+    for i, df_batch in enumerate(df.iter_slices(100)):
+        file = tmp_path / f"orders-{i}.csv"
+        df_batch.write_csv(file)
+        files.append(str(file))
+    return files
+
+
+def run_threads(target, args_list):
+    # every call in its own thread, the results and errors of all of them
+    with ThreadPoolExecutor(len(args_list)) as executor:
+        futures = [executor.submit(target, *args) for args in args_list]
+    errors = [future.exception() for future in futures if future.exception()]
+    results = [future.result() for future in futures if not future.exception()]
+    return results, errors
+
+
+def test_concurrent_cold_ingest_of_one_file(sources, tmp_path):
+    snapshot_dir = str(tmp_path / ".snapshot")
+    results, errors = run_threads(ingest_file, [(sources[0], snapshot_dir)] * 6)
+
+    assert errors == []
+    assert len({part["files"]["data"] for part in results}) == 1
+    assert sorted(
+        name for name in os.listdir(snapshot_dir) if not name.startswith(".")
+    ) == sorted(
+        [*(os.path.basename(f) for f in results[0]["files"].values()), "meta.json"]
+    )
+
+
+def test_concurrent_ingest_keeps_every_part(sources, tmp_path):
+    # every writer updates meta.json under the lock, none of the parts is lost
+    snapshot_dir = str(tmp_path / ".snapshot")
+    _, errors = run_threads(ingest_file, [(file, snapshot_dir) for file in sources])
+
+    assert errors == []
+    meta = read_meta(snapshot_dir)
+    assert sorted(meta["parts"]) == sorted(os.path.abspath(f) for f in sources)
+    for file in sources:
+        assert find_snapshot(file, snapshot_dir) is not None
+
+
+def test_touched_source_keeps_its_snapshot(sources, tmp_path):
+    snapshot_dir = str(tmp_path / ".snapshot")
+    part = ingest_file(sources[0], snapshot_dir)
+    stat = os.stat(sources[0])
+    os.utime(sources[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    _, errors = run_threads(find_snapshot, [(sources[0], snapshot_dir)] * 4)
+    assert errors == []
+    meta = read_meta(snapshot_dir)
+    assert meta["parts"][part["source"]]["mtime_ns"] == stat.st_mtime_ns + 10**9
+    assert find_snapshot(sources[0], snapshot_dir)["files"] == part["files"]
+
+
+def test_dataset_reads_with_a_delta(sources, tmp_path):
+    # the dataset stores its categories as strings, the snapshot of the delta
+    # as categoricals, the parts of every frame still concatenate
+    base = str(tmp_path / "base.csv")
+    pl.concat([pl.read_csv(file) for file in sources[:-1]]).write_csv(base)
+    parts = [
+        partition_csv(base, str(tmp_path / "dataset")),
+        ingest_file(sources[-1], str(tmp_path / ".snapshot")),
+    ]
+    df = read_parts(parts, "data")
+    assert len(df) == 600
+
+    def sums(df_cube):
+        return (
+            df_cube.lazy()
+            .with_columns(pl.col(pl.Categorical).cast(pl.String))
+            .group_by(CUBE_DIMS)
+            .agg(pl.sum(*CUBE_METRICS))
+            .sort(CUBE_DIMS)
+            .collect()
+        )
+
+    df_cube = read_parts(parts, "cube")
+    assert df_cube.schema["CategoryName"] == pl.Categorical
+    assert_frame_equal(sums(df_cube), sums(build_cube(df)))
+
+    df_counts = merge_sketch(read_parts(parts, "sketch"), ["CategoryName"])
+    df_expected = merge_sketch(build_sketch(df).collect(), ["CategoryName"])
+    assert_frame_equal(
+        df_counts.sort("CategoryName", "Key"),
+        df_expected.sort("CategoryName", "Key"),
+        categorical_as_str=True,
+    )
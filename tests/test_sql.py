@@ -0,0 +1,89 @@
+import sqlite3
+
+import polars as pl
+import pytest
+
+from utils import sql
+from utils.config import DATA_FILE, ORDERS_TABLE
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # a fresh orders table, get_part reads its state on every call
+    monkeypatch.setattr(sql, "SQL_REFRESH", 0)
+    file = tmp_path / "orders.db"
+    sql.write_orders(pl.read_csv(DATA_FILE, n_rows=500), f"sqlite:///{file}")
+    return file
+
+
+def update(file, *statements):
+    conn = sqlite3.connect(file)
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("col", ["UnitPrice", "Discount", "Cost", "ProductName"])
+def test_updates_change_the_part(database, col):
+    url = f"sqlite:///{database}"
+    files = sql.get_part(url)["files"]
+    value = "'renamed'" if col == "ProductName" else f"{col} + 1"
+    update(database, f"UPDATE {ORDERS_TABLE} SET {col} = {value} WHERE rowid = 1")
+    assert sql.get_part(url)["files"] != files
+
+
+def test_tables_without_the_counter_are_fingerprinted(database):
+    url = f"sqlite:///{database}"
+    update(
+        database,
+        *(
+            f"DROP TRIGGER {ORDERS_TABLE}_{event}"
+            for event in ["insert", "update", "delete"]
+        ),
+        f"DROP TABLE {sql.CHANGES_TABLE}",
+    )
+    part = sql.get_part(url)
+    assert part["date_min"] is not None
+    update(database, f"UPDATE {ORDERS_TABLE} SET Discount = Discount + 1")
+    assert sql.get_part(url)["files"] != part["files"]
+
+
+def test_read_orders_in_batches(database, monkeypatch):
+    url = f"sqlite:///{database}"
+    df = sql.read_orders(url=url)
+    monkeypatch.setattr(sql, "SQL_BATCH_ROWS", 64)
+    df_batched = sql.read_orders(url=url)
+
+    assert df_batched.n_chunks() == 8
+    assert df_batched.schema["OrderDate"] == pl.Date
+    assert df_batched.equals(df)
+
+
+def test_other_errors_of_the_counter_raise(database):
+    # only a missing table falls back to the fingerprint
+    update(
+        database,
+        f"ALTER TABLE {sql.CHANGES_TABLE} RENAME COLUMN changes TO n_changes",
+    )
+    with pytest.raises(sqlite3.OperationalError, match="no such column"):
+        sql.get_part(f"sqlite:///{database}")
+
+
+def test_failed_connect_frees_its_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        return sqlite3.connect(":memory:")
+
+    pool = sql.ConnectionPool(connect, 1)
+    with pytest.raises(sqlite3.OperationalError), pool.connection():
+        pass
+    assert pool.n_open == 0
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    assert pool.n_open == 1
+    pool.close()
@@ -0,0 +1,86 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.cube import build_cube
+from utils.data import ORDER_COLS, prepare_data, read_raw_data
+from utils.sketch import build_sketch
+from utils.star import (
+    DIMENSIONS,
+    FACT_COLS,
+    build_star,
+    build_star_cube,
+    build_star_sketch,
+    decode,
+    filter_keys,
+)
+
+
+def as_strings(df):
+    return df.with_columns(pl.col(pl.Categorical).cast(pl.String))
+
+
+@pytest.fixture(scope="module")
+def df():
+    return prepare_data(read_raw_data())
+
+
+@pytest.fixture(scope="module")
+def star(df):
+    return build_star(df)
+
+
+def test_star_decodes_to_the_prepared_rows(df, star):
+    df_fact, dims = star
+    result = decode(df_fact.lazy(), dims, ORDER_COLS).select(ORDER_COLS).collect()
+
+    assert df_fact.columns == FACT_COLS
+    for name, (key, _) in DIMENSIONS.items():
+        assert dims[name][key].is_unique().all()
+    assert_frame_equal(as_strings(result), as_strings(df.select(ORDER_COLS)))
+
+
+def test_dimension_keys_are_the_same_in_every_part(df, star):
+    # a part holding only some of the rows keys its combinations alike
+    _, dims = star
+    _, part_dims = build_star(df.slice(0, 1000))
+
+    for name, (key, _) in DIMENSIONS.items():
+        assert_frame_equal(
+            part_dims[name], dims[name].join(part_dims[name].select(key), on=key)
+        )
+
+
+@pytest.mark.parametrize(
+    "col, value", [("CategoryName", "Sportswear"), ("ClassID", 2), ("TeamID", 12)]
+)
+def test_filter_keys_matches_the_attribute_filter(df, star, col, value):
+    df_fact, dims = star
+    result = df_fact.filter(filter_keys(dims, col, value))
+
+    assert len(result) > 0
+    assert_frame_equal(
+        result["OrderID"].to_frame(),
+        df.filter(pl.col(col) == value)["OrderID"].to_frame(),
+    )
+
+
+def test_star_cube_and_sketch_match_those_of_the_rows(df, star):
+    df_fact, dims = star
+    cube = build_star_cube(df_fact.lazy(), dims).collect()
+    sketch = build_star_sketch(df_fact.lazy(), dims).collect()
+
+    assert_frame_equal(
+        cube.sort(pl.all()), as_strings(build_cube(df).collect()).sort(pl.all())
+    )
+    # registers of a level come out of the list aggregation in any order
+    expected = as_strings(build_sketch(df).collect())
+    assert_frame_equal(
+        sketch.with_columns(pl.col("Registers").list.sort()).sort(
+            pl.exclude("Registers")
+        ),
+        expected.with_columns(pl.col("Registers").list.sort()).sort(
+            pl.exclude("Registers")
+        ),
+        check_column_order=False,
+    )
@@ -0,0 +1,85 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from utils.config import DATE
+from utils.data import get_sub_td_metrics, get_td_filters, get_td_metrics
+from utils.queries import get_cat_td_metrics
+
+METRICS = ["Sales", "Profit", "Cost"]
+
+
+def get_td_sums(df, metric, filters):
+    # one filtered sum per window, as get_td_metric computed them before
+    return [df.filter(td_filter)[metric].sum() for td_filter in filters]
+
+
+def check_td_table(df_td, sums):
+    assert df_td["Range"].to_list() == ["YTD", "QTD", "MTD"]
+    assert df_td["CurrentPeriod"].to_list() == pytest.approx(sums[:3])
+    assert df_td["LastPeriod"].to_list() == pytest.approx(sums[3:])
+    assert_frame_equal(
+        df_td.select("Growth"),
+        df_td.select(
+            (pl.col("CurrentPeriod") / pl.col("LastPeriod") - 1).alias("Growth")
+        ),
+    )
+
+
+@pytest.mark.parametrize("date", [DATE, dt.date(2024, 3, 31), dt.date(2024, 2, 29)])
+def test_td_metrics_match_a_scan_per_window(df_raw, date):
+    quarter = (date.month - 1) // 3 + 1
+    filters = get_td_filters(date.year, date.month, quarter, date.day)
+    td_metrics = get_td_metrics(df_raw, METRICS, filters)
+    for metric in METRICS:
+        check_td_table(td_metrics[metric], get_td_sums(df_raw, metric, filters))
+
+
+@pytest.mark.parametrize("cat, subcat", [("CategoryName", "Beauty"), ("TeamID", 12)])
+def test_cat_td_metrics_match_a_scan_per_window(df_raw, dataset, cat, subcat):
+    # the prefix index view against the filters of the sales page before
+    df = df_raw.filter(pl.col(cat) == subcat)
+    ytd_filter = pl.col("OrderDate").dt.year() == DATE.year
+    filters = (
+        ytd_filter,
+        ytd_filter & (pl.col("OrderDate").dt.quarter() == 3),
+        ytd_filter & (pl.col("OrderDate").dt.month() == DATE.month),
+        pl.col("OrderDate").is_between(dt.date(2023, 1, 1), dt.date(2023, 9, 30)),
+        pl.col("OrderDate").is_between(dt.date(2023, 7, 1), dt.date(2023, 9, 30)),
+        pl.col("OrderDate").is_between(dt.date(2023, 9, 1), dt.date(2023, 9, 30)),
+    )
+    td_metrics = get_cat_td_metrics(cat, subcat, DATE, METRICS)
+    for metric in METRICS:
+        check_td_table(td_metrics[metric], get_td_sums(df, metric, filters))
+
+
+def test_sub_td_metrics_list_members_with_rows_in_every_window():
+    # A sells in every window, B not in the current month, C only last year
+    df = pl.DataFrame(
+        {
+            "OrderDate": [
+                dt.date(2024, 11, 3),
+                dt.date(2023, 11, 3),
+                dt.date(2024, 10, 20),
+                dt.date(2024, 2, 1),
+                dt.date(2023, 11, 3),
+            ],
+            "BrandName": ["A", "A", "B", "B", "C"],
+            "Sales": [10.0, 5.0, 7.0, 3.0, 4.0],
+        }
+    )
+    filters = get_td_filters(2024, 11, 4, 15)
+    df_brands = get_sub_td_metrics(df, "Sales", ["BrandName"], filters)["BrandName"]
+
+    assert df_brands.columns == [
+        "BrandName",
+        "YTD",
+        "YTD Growth",
+        "QTD",
+        "QTD Growth",
+        "MTD",
+        "MTD Growth",
+    ]
+    assert df_brands.rows() == [("A", 10.0, 1.0, 10.0, 1.0, 10.0, 1.0)]
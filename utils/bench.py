@@ -0,0 +1,280 @@
+import argparse
+import datetime as dt
+import functools
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import polars as pl
+
+from utils.config import BENCH_DIR, DATE, DATE_MIN, SNAPSHOT_DIR
+from utils.synthetic import write_orders
+
+SIZES = {
+    "100k": 100_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000,
+    "50M": 50_000_000,
+}
+PAGES = ["Home.py", *sorted(glob.glob("pages/*.py"))]
+
+
+def time_runs(func, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": runs}
+
+
+def clear_caches():
+    import streamlit as st
+
+    from utils.cache import result_cache
+    from utils.data import _prefix_index_state
+
+    st.cache_data.clear()
+    result_cache.clear()
+    # so a cold prefix index is built from the cube, not extended
+    _prefix_index_state.clear()
+
+
+def get_view_cases():
+    # the views the pages show by default, named after the view and the
+    # position of its arguments in the list so the names stay comparable
+    from utils.warmup import get_default_views
+
+    cases = {}
+    seen = {}
+    for func, args in get_default_views():
+        i = seen[func.__name__] = seen.get(func.__name__, -1) + 1
+        cases[f"view:{func.__name__}:{i}"] = functools.partial(func, *args)
+    return cases
+
+
+def bench_functions(repeat):
+    from utils.cache import result_cache
+    from utils.cube import HIERARCHIES, range_sum, rollup
+    from utils.data import (
+        get_snapshot_parts,
+        load_cube,
+        load_data,
+        load_prefix_index,
+        load_sketch,
+    )
+
+    timings = {}
+    # the first load parses the csv and writes the snapshot, later ones read it
+    timings["ingest"] = time_runs(
+        get_snapshot_parts,
+        1,
+        setup=lambda: shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True),
+    )
+    dims = HIERARCHIES["Category"]
+    loaders = {
+        "load_data": load_data,
+        "load_cube": load_cube,
+        "load_sketch": load_sketch,
+        "load_prefix_index": lambda: load_prefix_index(dims),
+    }
+    for name, func in loaders.items():
+        timings[name] = time_runs(func, repeat, setup=clear_caches)
+
+    # the two ways a window rollup is answered, summing the cube rows of the
+    # window or subtracting two rows of the prefix index
+    cube = load_cube()
+    index = load_prefix_index(dims)
+    date_range = (DATE_MIN, DATE)
+    timings["cube:rollup"] = time_runs(
+        lambda: rollup(cube, dims, ["Sales"], date_range), repeat
+    )
+    timings["prefix:range_sum"] = time_runs(
+        lambda: range_sum(index, dims, date_range, ["Sales"]), repeat
+    )
+
+    # cold runs compute the view over the loaded frames, cached runs are the
+    # hits of the shared result cache every later session gets
+    views = get_view_cases()
+    for name, func in views.items():
+        timings[name] = time_runs(func, repeat, setup=result_cache.clear)
+    for func in views.values():
+        func()
+    timings["views:cached"] = time_runs(
+        lambda: [func() for func in views.values()], repeat
+    )
+    return timings
+
+
+def run_page(page):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(page, default_timeout=3600).run()
+    if at.exception:
+        raise RuntimeError(f"{page} raised {[e.value for e in at.exception]}")
+
+
+def bench_pages(repeat):
+    # cold runs start from empty caches, warm runs reuse what the previous run
+    # of the same page left behind, as a rerun in a live session would
+    timings = {}
+    for page in PAGES:
+        name = os.path.basename(page)
+        timings[f"page:{name}"] = time_runs(
+            functools.partial(run_page, page), repeat, setup=clear_caches
+        )
+        timings[f"page:{name}:warm"] = time_runs(
+            functools.partial(run_page, page), repeat
+        )
+    return timings
+
+
+def get_meta():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_size(size, repeat, pages):
+    # every size runs in its own process so caches and memory do not leak
+    # from one size into the next
+    file = os.path.join(BENCH_DIR, size, "data.csv")
+    if not os.path.exists(file):
+        print(f"generating {SIZES[size]} rows into {file}")
+        write_orders(file, SIZES[size])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_file = os.path.join(tmp_dir, "timings.json")
+        args = ["--worker", result_file, "--repeat", str(repeat)]
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "utils.bench",
+                *args,
+                *([] if pages else ["--no-pages"]),
+            ],
+            env={**os.environ, "SIMS_DATA_FILE": file, "SIMS_WARMUP": "0"},
+            check=True,
+        )
+        with open(result_file) as f:
+            return json.load(f)
+
+
+def find_regressions(baseline, results, threshold, min_delta):
+    # a timing regresses when its median is both relatively and absolutely
+    # slower than the baseline, the absolute floor keeps tiny timings quiet
+    regressions = []
+    for size, timings in results["results"].items():
+        for name, timing in timings.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is None:
+                continue
+            if (
+                timing["median"] > base["median"] * (1 + threshold)
+                and timing["median"] - base["median"] > min_delta
+            ):
+                regressions.append((size, name, base["median"], timing["median"]))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for size, timings in results["results"].items():
+        print(f"\n{size} rows")
+        for name, timing in timings.items():
+            line = f"  {name:<32} {timing['median'] * 1000:>10.1f} ms"
+            base = (baseline or {"results": {}})["results"].get(size, {}).get(name)
+            if base is not None:
+                line += f"  ({timing['median'] / base['median'] - 1:+.0%} vs baseline)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the loaders, views and pages on synthetic datasets."
+    )
+    parser.add_argument(
+        "--rows", nargs="+", choices=SIZES, default=["100k"], help="dataset sizes"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing")
+    parser.add_argument("--no-pages", action="store_true", help="skip the pages")
+    parser.add_argument(
+        "--output", default="bench-results.json", help="json file of the results"
+    )
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown of a median that counts as a regression",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.01,
+        help="absolute slowdown in seconds below which nothing is a regression",
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        timings = bench_functions(args.repeat)
+        if not args.no_pages:
+            timings.update(bench_pages(args.repeat))
+        with open(args.worker, "w") as f:
+            json.dump(timings, f)
+        return
+
+    results = {
+        "meta": get_meta(),
+        "results": {
+            size: run_size(size, args.repeat, not args.no_pages) for size in args.rows
+        },
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"\nresults written to {args.output}")
+
+    if baseline is not None:
+        regressions = find_regressions(
+            baseline, results, args.threshold, args.min_delta
+        )
+        for size, name, base, median in regressions:
+            print(
+                f"REGRESSION {size} {name}: {base * 1000:.1f} ms -> {median * 1000:.1f} ms"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import datetime as dt
+import functools
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import polars as pl
+
+from utils.config import RESULT_CACHE_BYTES, USAGE_TOP_N
+
+
+def estimate_size(value):
+    if isinstance(value, (pl.DataFrame, pl.Series)):
+        return value.estimated_size()
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+def normalize_key(value):
+    # make widget values usable as a key, e.g. the date slider returns a list
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_key(v) for v in value)
+    return value
+
+
+def _overlaps(window, part):
+    if part["date_min"] is None:
+        return False
+    date_start, date_end = window
+    part_start = dt.date.fromisoformat(part["date_min"])
+    part_end = dt.date.fromisoformat(part["date_max"])
+    return (date_end is None or part_start <= date_end) and (
+        date_start is None or part_end >= date_start
+    )
+
+
+class ResultCache:
+    # results shared by every session of the process, evicted least recently
+    # used first once their estimated size goes over max_bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _is_valid(self, entry, parts):
+        files = [part["files"]["data"] for part in parts]
+        if entry["files"] == files:
+            return True
+        # appended batches only invalidate results whose date window they touch
+        n_files = len(entry["files"])
+        if entry["window"] is None or files[:n_files] != entry["files"]:
+            return False
+        return not any(_overlaps(entry["window"], part) for part in parts[n_files:])
+
+    def get(self, key, parts):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_valid(entry, parts):
+                self.misses += 1
+                return None
+            entry["files"] = [part["files"]["data"] for part in parts]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, value, parts, window=None):
+        nbytes = estimate_size(value)
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.nbytes -= old_entry["nbytes"]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = {
+                "value": value,
+                "nbytes": nbytes,
+                "files": [part["files"]["data"] for part in parts],
+                "window": window,
+            }
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, entry = self._entries.popitem(last=False)
+                self.nbytes -= entry["nbytes"]
+
+    def get_or_compute(self, key, compute, parts, window=None, background=False):
+        entry = self.get(key, parts)
+        if entry is not None:
+            return entry["value"]
+
+        # identical misses of concurrent sessions or prefetches wait for the
+        # first one instead of computing the same result again
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._is_valid(entry, parts):
+                    # stored since the miss above
+                    return entry["value"]
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    future = Future()
+                    self._inflight[key] = (future, background)
+                    break
+                future, owner_background = inflight
+                self.coalesced += 1
+            try:
+                return future.result()
+            except Exception:
+                # a warm-up or prefetch may fail where a session would not,
+                # e.g. on arguments recorded for an older dataset, the waiters
+                # compute the result themselves
+                if not owner_background:
+                    raise
+
+        try:
+            value = compute()
+            self.put(key, value, parts, window)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_BYTES)
+
+
+# calls of every cached view with the arguments of the last call, ranks the
+# views warmed up by utils/warmup.py. _usage holds the counts saved by every
+# server process plus the calls of this one, _usage_delta only the calls of
+# this one since its last save
+_usage = {}
+_usage_delta = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(key, args, count=1):
+    with _usage_lock:
+        for usage in (_usage, _usage_delta):
+            entry = usage.setdefault(key, {"count": 0, "args": args})
+            entry["count"] += count
+            entry["args"] = args
+
+
+def get_usage():
+    with _usage_lock:
+        return {key: dict(entry) for key, entry in _usage.items()}
+
+
+def merge_usage(saved, decay=1.0, top_n=USAGE_TOP_N, clear_delta=True):
+    # the counts saved by the server processes scaled by decay, so calls
+    # nobody makes anymore fade out, plus the calls of this process since its
+    # last save, keeping the top_n calls of each view. with clear_delta the
+    # result is about to be saved and the calls are not added again
+    with _usage_lock:
+        usage = {
+            key: {**entry, "count": entry["count"] * decay}
+            for key, entry in saved.items()
+        }
+        for key, entry in _usage_delta.items():
+            own_entry = usage.setdefault(key, {"count": 0, "args": entry["args"]})
+            own_entry["count"] += entry["count"]
+            own_entry["args"] = entry["args"]
+        calls = {}
+        for key in usage:
+            calls.setdefault(key[:2], []).append(key)
+        for keys in calls.values():
+            keys.sort(key=lambda key: usage[key]["count"], reverse=True)
+            for key in keys[top_n:]:
+                del usage[key]
+        if clear_delta:
+            _usage_delta.clear()
+        _usage.clear()
+        _usage.update(usage)
+        return {key: dict(entry) for key, entry in usage.items()}
+
+
+def cached_result(get_parts, window=None, record=None):
+    # window maps the call arguments to the (start, end) dates the result
+    # depends on, None means it depends on the whole history. record tells
+    # from the call arguments whether to count the call for the warm-up, None
+    # counts every call
+    def decorator(func):
+        def get_or_compute(key, args, background=False):
+            return result_cache.get_or_compute(
+                key,
+                lambda: func(*args),
+                get_parts(),
+                None if window is None else window(*args),
+                background,
+            )
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (func.__module__, func.__qualname__, normalize_key(args))
+            if record is None or record(*args):
+                record_usage(key, args)
+            return get_or_compute(key, args)
+
+        def warm(*args):
+            # fill the cache without counting as a call, sessions waiting on
+            # a failed warm compute the result themselves
+            key = (func.__module__, func.__qualname__, normalize_key(args))
+            return get_or_compute(key, args, background=True)
+
+        wrapper.warm = warm
+        return wrapper
+
+    return decorator
@@ -0,0 +1,123 @@
+import functools
+
+import polars as pl
+
+from utils.config import CHART_MAX_POINTS, CHART_TOP_N
+
+# members folded by fold_top_n are summed under this label
+OTHER = "Other"
+# calendar buckets tried in order by downsample_dates
+DATE_BUCKETS = ["1d", "1w", "1mo", "1q", "1y"]
+
+
+def fold_top_n(df, dim, metrics, n=CHART_TOP_N, within=()):
+    # keep the n members of dim with the largest total of the first metric in
+    # every group of the within columns, the long tail is summed into "Other",
+    # every other non-metric column (e.g. OrderDate) is kept as is, n=None
+    # keeps every member
+    if n is None:
+        return df
+    within = list(within)
+    keys = [col for col in df.columns if col not in metrics]
+    rank = pl.col("Total").rank("ordinal", descending=True)
+    df_rank = (
+        df.group_by(*within, dim)
+        .agg(pl.sum(metrics[0]).alias("Total"))
+        .with_columns((rank.over(within) if within else rank).alias("Rank"))
+    )
+    if df_rank["Rank"].max() is None or df_rank["Rank"].max() <= n:
+        return df
+
+    df_folded = (
+        df.join(df_rank.select(*within, dim, "Rank"), on=[*within, dim])
+        .with_columns(
+            pl.when(pl.col("Rank") <= n)
+            .then(pl.col(dim).cast(pl.String))
+            .otherwise(pl.lit(OTHER))
+            .alias(dim)
+        )
+        .group_by(keys)
+        .agg(pl.sum(*metrics))
+        .sort(*[col for col in keys if col != dim], pl.col(dim) == OTHER, dim)
+    )
+    return df_folded
+
+
+def downsample_dates(df, metrics, max_points=CHART_MAX_POINTS, date_col="OrderDate"):
+    # sum the metrics over the finest calendar bucket that keeps the number of
+    # distinct dates under max_points, the metrics must be additive
+    n_dates = df[date_col].n_unique()
+    if n_dates <= max_points:
+        return df
+
+    keys = [col for col in df.columns if col not in metrics]
+    for every in DATE_BUCKETS:
+        bucket = pl.col(date_col).dt.truncate(every)
+        if df.select(bucket.n_unique()).item() <= max_points:
+            break
+    df_sampled = (
+        df.with_columns(bucket)
+        .group_by(keys)
+        .agg(pl.sum(*metrics))
+        .sort(date_col, *[col for col in keys if col != date_col])
+    )
+    return df_sampled
+
+
+# trace arrays sent as typed arrays, the other ones stay json lists
+TYPED_ARRAY_ATTRS = ["x", "y", "z", "values"]
+# numpy dtype kinds and sizes plotly.js decodes from a typed array spec
+TYPED_ARRAY_DTYPES = {"i": (1, 2, 4), "u": (1, 2, 4), "f": (4, 8)}
+
+
+def encode_typed_array(values):
+    # a numeric array as a plotly.js typed array spec, its raw little endian
+    # bytes in base64. int64 has no typed array and goes as int32 when it
+    # fits, float64 otherwise. None for arrays plotly.js cannot decode
+    import base64
+
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.dtype.kind not in TYPED_ARRAY_DTYPES or values.ndim > 2:
+        return None
+    if values.dtype.itemsize not in TYPED_ARRAY_DTYPES[values.dtype.kind]:
+        info = np.iinfo(np.int32)
+        fits = values.dtype.kind != "f" and (
+            values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+        )
+        values = values.astype(np.int32 if fits else np.float64)
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+    return {
+        "dtype": values.dtype.str[1:],
+        "bdata": base64.b64encode(values.tobytes()).decode(),
+        "shape": ",".join(map(str, values.shape)),
+    }
+
+
+@functools.cache
+def _typed_array_figure():
+    # plotly 5 validates trace arrays and rejects typed array specs, the
+    # figure is built as usual and only its dict, which st.plotly_chart
+    # serializes as is, carries the specs
+    import plotly.graph_objects as go
+
+    class TypedArrayFigure(go.Figure):
+        def to_dict(self):
+            fig = super().to_dict()
+            for trace in fig["data"]:
+                for attr in TYPED_ARRAY_ATTRS:
+                    if trace.get(attr) is not None:
+                        spec = encode_typed_array(trace[attr])
+                        if spec is not None:
+                            trace[attr] = spec
+            return fig
+
+    return TypedArrayFigure
+
+
+def compact_figure(fig):
+    # the numeric arrays of the traces are sent as base64 typed arrays
+    # instead of json lists of numbers, about 11 characters per float64 value
+    # against up to 20, plotly.js decodes them without parsing any text
+    return _typed_array_figure()(fig)
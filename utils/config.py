@@ -1,7 +1,9 @@
 import datetime as dt
+import os
 
 # configurations
-DATA_FILE = "./data/data.csv"
+# SIMS_DATA_FILE points the app at another export, e.g. the benchmark datasets
+DATA_FILE = os.environ.get("SIMS_DATA_FILE", "./data/data.csv")
 CAT_MAP = {
     "Category": "CategoryName",
     "Team": "TeamID",
@@ -12,3 +14,65 @@ CAT = list(CAT_MAP.keys())
 DATE = dt.date(2024, 9, 30)
 DATE_MAX = dt.date(2024, 12, 31)
 DATE_MIN = dt.date(2023, 1, 1)
+
+# SIMS_DATABASE_URL, e.g. sqlite:///data/orders.db, reads the orders from a
+# table in the DATA_FILE columns instead of DATA_FILE, see utils/sql.py
+DATABASE_URL = os.environ.get("SIMS_DATABASE_URL")
+ORDERS_TABLE = os.environ.get("SIMS_ORDERS_TABLE", "orders")
+# connections kept open to the database
+SQL_POOL_SIZE = 4
+# rows per batch fetched from the database
+SQL_BATCH_ROWS = 100_000
+# seconds before the state of the orders table is checked again
+SQL_REFRESH = 60
+
+# year/month partitioned dataset written by python -m utils.partition, read
+# instead of DATA_FILE when set, e.g. for exports that do not fit in memory
+DATASET_DIR = os.environ.get("SIMS_DATASET_DIR")
+# csv rows parsed per batch by python -m utils.partition
+PARTITION_BATCH_ROWS = 1_000_000
+
+# on-disk columnar snapshot of the prepared data, refreshed when DATA_FILE changes
+SNAPSHOT_DIR = os.path.join(os.path.dirname(DATA_FILE), ".snapshot")
+# SIMS_SHARED_DATASET=1 maps the prepared data, cube, sketches and prefix
+# indexes from files shared by every server process on the host, see
+# utils/shared.py
+SHARED_DATASET = os.environ.get("SIMS_SHARED_DATASET") == "1"
+SHARED_DIR = os.path.join(os.path.dirname(DATA_FILE), ".shared")
+# batches of new order rows appended after DATA_FILE, see utils/ingest.py
+DELTA_DIR = os.path.join(os.path.dirname(DATA_FILE), "deltas")
+# memory budget of the aggregation results shared across sessions
+RESULT_CACHE_BYTES = 256 * 1024**2
+# synthetic datasets of the benchmark suite, see utils/bench.py
+BENCH_DIR = "./data/synthetic"
+# timing of the data functions and page sections, see utils/perf.py
+PERF_PANEL = os.environ.get("SIMS_PERF_PANEL") == "1"
+TRACE_FILE = os.environ.get("SIMS_TRACE_FILE")
+TRACE_PLANS = os.environ.get("SIMS_TRACE_PLANS") == "1"
+# charts keep this many members of a dimension and fold the rest into "Other"
+CHART_TOP_N = 20
+# time series with more distinct dates are summed into coarser calendar buckets
+CHART_MAX_POINTS = 400
+# files of the download actions, served by streamlit from ./static
+EXPORT_DIR = "./static/exports"
+# seconds an export stays downloadable
+EXPORT_TTL = 3600
+# rows per exported file, streamlit serves static files up to 200 MB
+EXPORT_PART_ROWS = 500_000
+# background warm-up of the default and most used views, see utils/warmup.py
+WARMUP = os.environ.get("SIMS_WARMUP", "1") == "1"
+# seconds between two checks for a new dataset version
+WARMUP_INTERVAL = 60
+# most used views warmed up on top of the page defaults
+WARMUP_TOP_N = 50
+# call counts of the views, kept across server restarts
+USAGE_FILE = os.path.join(os.path.dirname(DATA_FILE), ".usage.pkl")
+# calls kept per view in the usage counts, the most called ones
+USAGE_TOP_N = 20
+# factor applied to the usage counts per WARMUP_INTERVAL of wall time, by
+# whichever server process saves them, halves a count in about 11 hours
+USAGE_DECAY = 0.999
+# pages start the views of their sections together, see utils/prefetch.py
+PREFETCH = os.environ.get("SIMS_PREFETCH", "1") == "1"
+# threads shared by the prefetches of every session
+PREFETCH_WORKERS = 8
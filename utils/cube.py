@@ -0,0 +1,163 @@
+import datetime as dt
+
+import polars as pl
+
+from utils.dates import is_date_sorted, slice_date_range
+
+# daily rollup of the order lines, every visual that only sums metrics
+# can be answered from it instead of the raw rows
+CUBE_DIMS = [
+    "OrderDate",
+    "CategoryName",
+    "SubcategoryName",
+    "TeamID",
+    "BuyerName",
+    "BrandName",
+    "ProductName",
+]
+CUBE_METRICS = ["Sales", "Profit", "Cost", "Quantity"]
+HIERARCHIES = {
+    "Category": ["CategoryName", "SubcategoryName"],
+    "Team": ["TeamID", "BuyerName"],
+    "Brand": ["BrandName", "ProductName"],
+}
+
+
+def build_cube(df):
+    return (
+        df.lazy()
+        .select(*CUBE_DIMS, *CUBE_METRICS)
+        .group_by(CUBE_DIMS)
+        .agg(pl.sum(*CUBE_METRICS))
+        .sort("OrderDate")
+    )
+
+
+def slice_cube(cube, date_range=None, filters=None, offsets=None):
+    df = cube
+    if date_range is not None and is_date_sorted(df):
+        df = slice_date_range(df, date_range, offsets)
+    elif date_range is not None:
+        date_start, date_end = date_range
+        if date_start is not None:
+            df = df.filter(pl.col("OrderDate") >= date_start)
+        if date_end is not None:
+            df = df.filter(pl.col("OrderDate") <= date_end)
+    for col, value in (filters or {}).items():
+        if value is not None:
+            df = df.filter(pl.col(col) == value)
+    return df
+
+
+def rollup(cube, dims, metrics=CUBE_METRICS, date_range=None, filters=None):
+    # dims may be column names or expressions, e.g. a month bucket of OrderDate
+    df_rollup = (
+        slice_cube(cube, date_range, filters)
+        .group_by(dims)
+        .agg(pl.sum(*metrics))
+        .sort(dims)
+    )
+    return df_rollup
+
+
+def drill_down(cube, hierarchy, members, metrics=CUBE_METRICS, date_range=None):
+    # members fixes the leading levels of the hierarchy, the next level is returned
+    level = hierarchy[len(members)]
+    filters = dict(zip(hierarchy, members))
+    return rollup(cube, [level], metrics, date_range, filters)
+
+
+def get_cube_members(cube, col, filters=None):
+    return sorted(slice_cube(cube, filters=filters)[col].unique().to_list())
+
+
+def build_prefix_index(cube, dims, metrics=CUBE_METRICS):
+    # running totals per group over daily totals, ordered by OrderDate so any
+    # [start, end] window is the difference of two as-of lookups
+    cum_cols = [*metrics, "Count"]
+    df_daily = (
+        cube.group_by(*dims, "OrderDate")
+        .agg(pl.sum(*metrics), pl.len().alias("Count"))
+        .sort(*dims, "OrderDate")
+    )
+    df_index = df_daily.with_columns(
+        pl.col(cum_cols).cum_sum().over(dims) if dims else pl.col(cum_cols).cum_sum()
+    ).sort("OrderDate")
+    return df_index
+
+
+def range_sums(index, dims, windows, metrics=CUBE_METRICS):
+    # windows maps a name to a (start, end) pair, all windows and groups are
+    # answered by a single as-of join against the index
+    cum_cols = [*metrics, "Count"]
+    df_bounds = pl.DataFrame(
+        {
+            "Window": [name for name in windows for _ in range(2)],
+            "Sign": [1, -1] * len(windows),
+            "OrderDate": [
+                date
+                for date_start, date_end in windows.values()
+                for date in (date_end, date_start - dt.timedelta(days=1))
+            ],
+        },
+        schema_overrides={"Sign": pl.Int8, "OrderDate": pl.Date},
+    )
+    if dims:
+        df_lookup = index.select(dims).unique().join(df_bounds, how="cross")
+    else:
+        df_lookup = df_bounds
+    df_sums = (
+        df_lookup.sort("OrderDate")
+        .join_asof(
+            index.select(*dims, "OrderDate", *cum_cols),
+            on="OrderDate",
+            by=dims or None,
+            strategy="backward",
+        )
+        .with_columns(pl.col(cum_cols).fill_null(0) * pl.col("Sign"))
+        .group_by(*dims, "Window")
+        .agg(pl.sum(*cum_cols))
+    )
+    return df_sums
+
+
+def range_sum(index, dims, date_range, metrics=CUBE_METRICS):
+    df_sum = (
+        range_sums(index, dims, {"Range": date_range}, metrics)
+        .filter(pl.col("Count") > 0)
+        .select(*dims, *metrics)
+        .sort(dims)
+    )
+    return df_sum
+
+
+def extend_prefix_index(index, cube_delta, dims, metrics=CUBE_METRICS):
+    # append the running totals of rows newer than the index, seeding each group
+    # with its last running total so history is never summed again
+    cum_cols = [*metrics, "Count"]
+    date_max = index["OrderDate"].max()
+    if date_max is not None and cube_delta["OrderDate"].min() <= date_max:
+        # the delta overlaps the index, the caller has to rebuild it
+        return None
+
+    df_seed = (
+        index.group_by(dims).agg(pl.col(cum_cols).last())
+        if dims
+        else index.select(pl.col(cum_cols).last())
+    ).with_columns(pl.lit(date_max, dtype=pl.Date).alias("OrderDate"))
+    df_daily = (
+        cube_delta.group_by(*dims, "OrderDate")
+        .agg(pl.sum(*metrics), pl.len().alias("Count"))
+        .select(df_seed.columns)
+    )
+    df_delta = (
+        pl.concat([df_seed.filter(pl.col("OrderDate").is_not_null()), df_daily])
+        .sort(*dims, "OrderDate")
+        .with_columns(
+            pl.col(cum_cols).cum_sum().over(dims)
+            if dims
+            else pl.col(cum_cols).cum_sum()
+        )
+        .filter(pl.col("OrderDate") > date_max if date_max is not None else True)
+    )
+    return pl.concat([index, df_delta.select(index.columns)]).sort("OrderDate")
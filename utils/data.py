@@ -1,18 +1,84 @@
 import calendar
 import datetime as dt
+import glob
+import hashlib
+import os
+import re
+import shutil
 
-import plotly.express as px
 import polars as pl
 import streamlit as st
 
-from utils.config import DATA_FILE
+from utils.config import (
+    DATA_FILE,
+    DATABASE_URL,
+    DATASET_DIR,
+    DELTA_DIR,
+    SHARED_DATASET,
+    SNAPSHOT_DIR,
+)
+from utils.cube import (
+    CUBE_DIMS,
+    CUBE_METRICS,
+    build_prefix_index,
+    extend_prefix_index,
+    range_sums,
+)
+from utils.dates import get_month_offsets
+from utils.perf import record_plan, timed
+from utils.pivot import PERIODS, calendar_sums, densify, fold_rows, year_matrix
+from utils.shared import map_frame
+from utils.sketch import SKETCH_COLS, build_sketch
+from utils.snapshot import (
+    find_snapshot,
+    get_part_files,
+    get_tmp_path,
+    is_date_ordered,
+    lock_snapshots,
+    read_dataset_part,
+    read_meta,
+    write_snapshot,
+)
+from utils.sql import SCHEMA, get_part, read_orders, read_rollup
+from utils.star import (
+    DIMENSIONS,
+    build_star,
+    build_star_cube,
+    build_star_sketch,
+    decode,
+    filter_keys,
+)
 
+ID_COLS = [
+    "CustomerID",
+    "ClassID",
+    "BrandID",
+    "CategoryID",
+    "SubcategoryID",
+    "BuyerID",
+    "TeamID",
+    "SupplierID",
+]
+CATEGORICAL_COLS = [
+    "CustomerName",
+    "ClassName",
+    "ProductName",
+    "BrandName",
+    "CategoryName",
+    "SubcategoryName",
+    "BuyerFirstName",
+    "BuyerLastName",
+    "BuyerName",
+]
+# the columns of the prepared order lines, in the order query_data returns them
+ORDER_COLS = list(SCHEMA)
 
-@st.cache_data
-def load_data():
-    df_raw = (
-        pl.read_csv(DATA_FILE)
-        .with_columns(
+
+@timed
+def prepare_data(df):
+    # works on both DataFrame and LazyFrame of raw order rows
+    df_prepared = (
+        df.with_columns(
             pl.col("OrderDate").str.to_date(format="%m/%d/%y"),
         )
         .with_columns(
@@ -25,121 +91,557 @@ def load_data():
                 pl.col("BuyerFirstName"), pl.col("BuyerLastName"), separator=" "
             )
         )
+        .with_columns(pl.col(CATEGORICAL_COLS).cast(pl.Categorical("lexical")))
+        .sort("OrderDate", maintain_order=True)
     )
-    return df_raw
+    return df_prepared
 
 
-def get_td_filters(year, month, quarter, day):
-    ytd_filter = pl.col("OrderDate").dt.year() == year
-    qtd_filter = (pl.col("OrderDate").dt.year() == year) & (
-        pl.col("OrderDate").dt.quarter() == quarter
+@timed
+def read_raw_data(file=DATA_FILE):
+    return pl.read_csv(file, schema_overrides={col: pl.Int32 for col in ID_COLS})
+
+
+@timed
+def restore_dtypes(df):
+    # parquet and pickle keep the categories but not their lexical ordering
+    return df.with_columns(
+        pl.col(col).cast(pl.Categorical("lexical"))
+        for col in CATEGORICAL_COLS
+        if col in df.collect_schema()
     )
-    mtd_filter = (pl.col("OrderDate").dt.year() == year) & (
-        pl.col("OrderDate").dt.month() == month
+
+
+@timed
+def get_source_files():
+    # the base export followed by the appended batches in arrival order, a
+    # partitioned dataset takes the place of the base export
+    deltas = sorted(glob.glob(os.path.join(DELTA_DIR, "*.csv")))
+    return deltas if DATASET_DIR else [DATA_FILE, *deltas]
+
+
+@timed
+def get_dataset_part():
+    part = read_dataset_part(DATASET_DIR)
+    if part is None:
+        raise FileNotFoundError(
+            f"No dataset in {DATASET_DIR}, write it with python -m utils.partition"
+        )
+    return part
+
+
+@timed
+def ingest_file(file, snapshot_dir=SNAPSHOT_DIR):
+    # sessions, the warm-up thread, the prefetch pool and other processes
+    # starting cold ingest one at a time, the ones waiting find the part
+    # written in the meantime
+    with lock_snapshots(snapshot_dir):
+        part = find_snapshot(file, snapshot_dir)
+        if part is not None:
+            return part
+        df_fact, dims = build_star(prepare_data(read_raw_data(file)))
+        cube, sketch = pl.collect_all(
+            [
+                build_star_cube(df_fact.lazy(), dims),
+                build_star_sketch(df_fact.lazy(), dims),
+            ],
+            streaming=True,
+        )
+        return write_snapshot(
+            file, df_fact, {"cube": cube, "sketch": sketch, **dims}, snapshot_dir
+        )
+
+
+@timed
+def get_snapshot_parts():
+    if DATABASE_URL:
+        # one part stands for the state of the orders table
+        return [get_part()]
+    meta = read_meta()
+    parts = [
+        find_snapshot(file, meta=meta) or ingest_file(file)
+        for file in get_source_files()
+    ]
+    return [get_dataset_part(), *parts] if DATASET_DIR else parts
+
+
+@timed
+def get_dataset_version():
+    files = "|".join(part["files"]["data"] for part in get_snapshot_parts())
+    return hashlib.sha256(files.encode()).hexdigest()[:16]
+
+
+@timed
+def append_orders(batch):
+    # batch is a csv file or a frame of raw order rows in the DATA_FILE schema,
+    # it is kept in DELTA_DIR and only its own rows are prepared and aggregated
+    if DATABASE_URL:
+        raise ValueError("Orders are appended to the database table directly")
+    columns = (
+        get_dataset_part()["columns"]
+        if DATASET_DIR
+        else pl.read_csv(DATA_FILE, n_rows=0).columns
     )
-    lytd_filter = pl.col("OrderDate").is_between(
-        dt.date(year - 1, 1, 1), dt.date(year - 1, month, day)
+    df_batch = pl.read_csv(batch, n_rows=0) if isinstance(batch, str) else batch
+    if df_batch.columns != columns:
+        raise ValueError(f"Batch columns {df_batch.columns} do not match {columns}")
+
+    os.makedirs(DELTA_DIR, exist_ok=True)
+    file = os.path.join(DELTA_DIR, f"orders-{dt.datetime.now():%Y%m%d-%H%M%S-%f}.csv")
+    tmp_file = get_tmp_path(file)
+    if isinstance(batch, str):
+        shutil.copyfile(batch, tmp_file)
+    else:
+        df_batch.write_csv(tmp_file)
+    os.replace(tmp_file, file)
+    return ingest_file(file)
+
+
+@timed
+def read_parts(parts, name):
+    if any(part.get("backend") == "sql" for part in parts):
+        # the prepared rows and the cube group_by come out of the database
+        if name == "data":
+            return restore_dtypes(read_orders())
+        if name == "cube":
+            return restore_dtypes(read_rollup(CUBE_DIMS, CUBE_METRICS))
+        return restore_dtypes(collect(build_sketch(read_orders(SKETCH_COLS))))
+    if name == "data":
+        lf = decode(scan_parts(parts), read_dims(parts), ORDER_COLS)
+        df = restore_dtypes(lf.select(ORDER_COLS).collect())
+    elif name in DIMENSIONS:
+        # a combination seen by several parts has the same key in each
+        key, _ = DIMENSIONS[name]
+        return pl.concat(
+            [pl.read_parquet(part["files"][name]) for part in parts]
+        ).unique(key, maintain_order=True)
+    else:
+        # the cube and sketch of a dataset keep their categories as strings
+        # too, see scan_parts
+        df = restore_dtypes(
+            pl.concat(
+                [pl.scan_parquet(part["files"][name]) for part in parts],
+                how="vertical_relaxed",
+            ).collect()
+        )
+    # the sketches are per month and only ever merged, they need no order
+    if "OrderDate" in df.columns and not is_date_ordered(parts):
+        df = df.sort("OrderDate", maintain_order=True)
+    return df
+
+
+@timed
+def read_dims(parts):
+    return {name: read_parts(parts, name) for name in DIMENSIONS}
+
+
+@st.cache_resource(max_entries=32)
+@timed
+def _map_frame(version, name, _build):
+    # cache_resource hands out the mapped frame itself, cache_data would
+    # pickle it into a private copy
+    return map_frame(version, name, _build)
+
+
+def _get_frame(name, load, build):
+    # with SIMS_SHARED_DATASET=1 the frame is written once per dataset version
+    # and every process on the host maps the same file, see utils/shared.py,
+    # otherwise load caches a private copy per process
+    version = get_dataset_version()
+    if SHARED_DATASET:
+        return _map_frame(version, name, build)
+    return load(version)
+
+
+@st.cache_data(max_entries=2)
+@timed
+def _load_data(version):
+    return read_parts(get_snapshot_parts(), "data")
+
+
+@timed
+def load_data(date_range=None):
+    # the order lines, a date_range reads only its own rows, and partitions,
+    # from disk. the pages go through query_data, the cube and the prefix
+    # index instead, this serves the benchmarks and scripts. st.cache_data
+    # pickles its results, which drops the lexical ordering and the sorted
+    # flag, rows are always returned in OrderDate order
+    if date_range is not None:
+        lf = query_data(date_range=date_range)
+        return collect(lf.sort("OrderDate", maintain_order=True))
+    df = _get_frame(
+        "data", _load_data, lambda: read_parts(get_snapshot_parts(), "data")
     )
-    lqtd_filter = pl.col("OrderDate").is_between(
-        dt.date(year - 1, (quarter - 1) * 3 + 1, 1),
-        dt.date(year - 1, quarter * 3, day),
+    return restore_dtypes(df).set_sorted("OrderDate")
+
+
+@st.cache_data(max_entries=2)
+@timed
+def _load_dims(version):
+    return read_dims(get_snapshot_parts())
+
+
+@timed
+def load_dims():
+    # the dimensions are small, every process keeps its own copy
+    return _load_dims(get_dataset_version())
+
+
+@st.cache_data(max_entries=2)
+@timed
+def _load_cube(version):
+    # each part carries the cube of its own rows, cube consumers only sum so
+    # the same keys showing up in several parts is harmless
+    return read_parts(get_snapshot_parts(), "cube")
+
+
+@timed
+def load_cube():
+    df = _get_frame(
+        "cube", _load_cube, lambda: read_parts(get_snapshot_parts(), "cube")
     )
-    lmtd_filter = pl.col("OrderDate").is_between(
-        dt.date(year - 1, month, 1), dt.date(year - 1, month, day)
+    return restore_dtypes(df).set_sorted("OrderDate")
+
+
+@st.cache_data(max_entries=2)
+@timed
+def _load_sketch(version):
+    # sketches of several parts merge like the sketches of several months
+    return read_parts(get_snapshot_parts(), "sketch")
+
+
+@timed
+def load_sketch():
+    df = _get_frame(
+        "sketch", _load_sketch, lambda: read_parts(get_snapshot_parts(), "sketch")
     )
-    return ytd_filter, qtd_filter, mtd_filter, lytd_filter, lqtd_filter, lmtd_filter
+    return restore_dtypes(df)
 
 
-def get_td_metric(df, metric, filters):
-    ytd_filter, qtd_filter, mtd_filter, lytd_filter, lqtd_filter, lmtd_filter = filters
-    df_td_metric = (
-        pl.DataFrame(
-            {
-                "Range": ["YTD", "QTD", "MTD"],
-                "CurrentPeriod": [
-                    df.filter(ytd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                    df.filter(qtd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                    df.filter(mtd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                ],
-                "LastPeriod": [
-                    df.filter(lytd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                    df.filter(lqtd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                    df.filter(lmtd_filter).select(pl.sum(metric)).get_columns()[0][0],
-                ],
-            }
-        )
-        .with_columns(Growth=(pl.col("CurrentPeriod") / pl.col("LastPeriod") - 1))
-        .with_columns(
-            pl.when(pl.col("Growth").is_infinite())
-            .then(float("nan"))
-            .otherwise(pl.col("Growth"))
-            .alias("Growth")
+@st.cache_data(max_entries=4)
+@timed
+def _load_month_offsets(version, name):
+    return get_month_offsets(load_cube() if name == "cube" else load_data())
+
+
+@timed
+def load_month_offsets(name="cube"):
+    return _load_month_offsets(get_dataset_version(), name)
+
+
+_prefix_index_state = {}
+
+
+@timed
+def _build_prefix_index(dims):
+    # extend the index built for the previous version when only newer batches
+    # were appended since, otherwise rebuild it from the cube. shared indexes
+    # are built once per host and version, so the process building one does
+    # not keep a private copy around for the next version
+    parts = get_snapshot_parts()
+    files = [part["files"]["cube"] for part in parts]
+    index = None
+    state = _prefix_index_state.get(dims)
+    if state is not None and files[: len(state[0])] == state[0]:
+        index = state[1]
+        if len(files) > len(state[0]):
+            cube_delta = read_parts(parts[len(state[0]) :], "cube")
+            index = extend_prefix_index(index, cube_delta, list(dims))
+    if index is None:
+        index = build_prefix_index(load_cube(), list(dims))
+    if not SHARED_DATASET:
+        _prefix_index_state[dims] = (files, index)
+    return index
+
+
+@st.cache_data(max_entries=16)
+@timed
+def _load_prefix_index(version, dims):
+    return _build_prefix_index(dims)
+
+
+@timed
+def load_prefix_index(dims):
+    dims = tuple(dims)
+    df = _get_frame(
+        "-".join(["prefix", *dims]),
+        lambda version: _load_prefix_index(version, dims),
+        lambda: _build_prefix_index(dims),
+    )
+    return restore_dtypes(df).set_sorted("OrderDate")
+
+
+@timed
+def scan_parts(parts, date_range=None):
+    # the fact tables of the parts, partitions of a dataset outside date_range
+    # are left out of the scan, a window without any still scans one file for
+    # the schema
+    files = [get_part_files(part, date_range) for part in parts]
+    files = [part_files for part_files in files if part_files] or [
+        get_part_files(parts[0])[:1]
+    ]
+    return pl.concat(
+        [pl.scan_parquet(part_files) for part_files in files], how="vertical_relaxed"
+    )
+
+
+@timed
+def scan_data(date_range=None):
+    parts = get_snapshot_parts()
+    lf = scan_parts(parts, date_range)
+    return lf.set_sorted("OrderDate") if is_date_ordered(parts) else lf
+
+
+@timed
+def query_data(columns=None, date_range=None, filters=None):
+    # filters and projection sit directly on the scan of the fact table so
+    # they are pushed down, filters on attributes go through the keys of
+    # their dimension, only the surviving rows are decoded and only into the
+    # attributes asked for, the categorical ordering is restored on them
+    if DATABASE_URL:
+        # pushed into the sql query instead of the scan
+        return restore_dtypes(read_orders(columns, date_range, filters).lazy())
+    lf = scan_data(date_range)
+    if date_range is not None:
+        date_start, date_end = date_range
+        if date_start is not None:
+            lf = lf.filter(pl.col("OrderDate") >= date_start)
+        if date_end is not None:
+            lf = lf.filter(pl.col("OrderDate") <= date_end)
+    dims = load_dims()
+    for col, value in (filters or {}).items():
+        if value is not None:
+            lf = lf.filter(filter_keys(dims, col, value))
+    columns = ORDER_COLS if columns is None else columns
+    return restore_dtypes(decode(lf, dims, columns).select(columns))
+
+
+SEARCH_COLS = [
+    "ProductID",
+    "ProductName",
+    "BrandName",
+    "CategoryName",
+    "SubcategoryName",
+    "CustomerName",
+    "BuyerName",
+]
+
+
+@timed
+def search_data(lf, text, cols=SEARCH_COLS):
+    # case-insensitive substring match on any of the text columns
+    pattern = f"(?i){re.escape(text)}"
+    return lf.filter(
+        pl.any_horizontal(
+            pl.col(col).cast(pl.String).str.contains(pattern) for col in cols
         )
     )
-    return df_td_metric
 
 
-def get_sub_td_metric(df, metric, col_sub, col_td, td_filter, ltd_filter):
-    col_ltd = col_td + " Growth"
+@timed
+def collect(lf):
+    record_plan(lf)
+    return lf.collect(streaming=True)
 
-    df_sub_td_metric = (
-        df.filter(td_filter | ltd_filter)
-        .with_columns(
-            pl.when(td_filter)
-            .then(pl.lit(col_td))
-            .otherwise(pl.lit(col_ltd))
-            .alias("Range")
+
+@timed
+def get_td_windows(year, month, quarter, day):
+    # the last year windows end on the same day, clamped to the month length
+    def last_year_date(month):
+        return dt.date(
+            year - 1, month, min(day, calendar.monthrange(year - 1, month)[1])
         )
-        .group_by(col_sub, "Range")
-        .agg(pl.sum(metric).alias(metric))
-        .pivot("Range", index=col_sub, values=metric)
-        .sort(col_sub)
-        .filter(pl.col(col_td).is_not_null())
-        .with_columns(
-            # Add col_ltd with NaN if missing using coalesce
-            pl.coalesce(pl.col(f"^{col_ltd}$"), pl.lit(float("nan"))).alias(col_ltd)
+
+    quarter_month = (quarter - 1) * 3 + 1
+    ytd_window = (dt.date(year, 1, 1), dt.date(year, 12, 31))
+    qtd_window = (
+        dt.date(year, quarter_month, 1),
+        dt.date(year, quarter * 3, calendar.monthrange(year, quarter * 3)[1]),
+    )
+    mtd_window = (
+        dt.date(year, month, 1),
+        dt.date(year, month, calendar.monthrange(year, month)[1]),
+    )
+    lytd_window = (dt.date(year - 1, 1, 1), last_year_date(month))
+    lqtd_window = (dt.date(year - 1, quarter_month, 1), last_year_date(quarter * 3))
+    lmtd_window = (dt.date(year - 1, month, 1), last_year_date(month))
+    return ytd_window, qtd_window, mtd_window, lytd_window, lqtd_window, lmtd_window
+
+
+@timed
+def get_td_filters(year, month, quarter, day):
+    return tuple(
+        pl.col("OrderDate").is_between(date_start, date_end)
+        for date_start, date_end in get_td_windows(year, month, quarter, day)
+    )
+
+
+TD_RANGES = ["YTD", "QTD", "MTD"]
+
+
+@timed
+def make_td_tables(td_sums, metrics):
+    # td_sums maps (metric, window position) to a sum, current windows first
+    td_metrics = {}
+    for metric in metrics:
+        td_metrics[metric] = (
+            pl.DataFrame(
+                {
+                    "Range": TD_RANGES,
+                    "CurrentPeriod": [float(td_sums[metric, i]) for i in range(3)],
+                    "LastPeriod": [float(td_sums[metric, i]) for i in range(3, 6)],
+                }
+            )
+            .with_columns(Growth=(pl.col("CurrentPeriod") / pl.col("LastPeriod") - 1))
+            .with_columns(
+                pl.when(pl.col("Growth").is_infinite())
+                .then(float("nan"))
+                .otherwise(pl.col("Growth"))
+                .alias("Growth")
+            )
         )
-        .with_columns(
-            # Compute the growth
-            (pl.col(col_td) / pl.col(col_ltd) - 1).alias(col_ltd)
+    return td_metrics
+
+
+@timed
+def get_td_metrics(df, metrics, filters):
+    # every metric and every window as conditional sums of a single scan
+    td_sums = (
+        df.lazy()
+        .filter(pl.any_horizontal(filters))
+        .select(
+            pl.col(metric).filter(td_filter).sum().alias(f"{metric}|{i}")
+            for metric in metrics
+            for i, td_filter in enumerate(filters)
         )
-        .with_columns(
-            # Handle infinite values and replace with NaN
-            pl.when(pl.col(col_ltd).is_infinite())
-            .then(pl.lit(float("nan")))
-            .otherwise(pl.col(col_ltd))
-            .alias(col_ltd)
+        .pipe(collect)
+        .row(0)
+    )
+    td_sums = dict(zip([(metric, i) for metric in metrics for i in range(6)], td_sums))
+    return make_td_tables(td_sums, metrics)
+
+
+@timed
+def get_td_metrics_from_index(index, metrics, windows):
+    # same tables as get_td_metrics, from two prefix index lookups per window
+    df_sums = range_sums(index, [], dict(enumerate(windows)), metrics)
+    td_sums = {}
+    for row in df_sums.iter_rows(named=True):
+        for metric in metrics:
+            td_sums[metric, row["Window"]] = row[metric]
+    return make_td_tables(td_sums, metrics)
+
+
+@timed
+def get_td_metric(df, metric, filters):
+    return get_td_metrics(df, [metric], filters)[metric]
+
+
+@timed
+def get_sub_td_metrics(df, metric, cols_sub, filters):
+    # one grouped pass at the finest level, then each breakdown is rolled up
+    # from those few rows instead of rescanning the orders. like the tables
+    # joined per window before, a member is only listed when it has rows in
+    # every current window
+    td_cols = TD_RANGES + [f"L{col_td}" for col_td in TD_RANGES]
+    count_cols = [f"{col_td} Count" for col_td in TD_RANGES]
+    df_fine = (
+        df.lazy()
+        .filter(pl.any_horizontal(filters))
+        .group_by(cols_sub)
+        .agg(
+            *(
+                pl.col(metric).filter(td_filter).sum().cast(pl.Float64).alias(col)
+                for col, td_filter in zip(td_cols, filters)
+            ),
+            *(
+                pl.col(metric).filter(td_filter).count().alias(col)
+                for col, td_filter in zip(count_cols, filters)
+            ),
         )
-        .select(col_sub, col_td, col_ltd)
+        .pipe(collect)
     )
 
-    return df_sub_td_metric
+    sub_td_metrics = {}
+    for col_sub in cols_sub:
+        sub_td_metrics[col_sub] = (
+            df_fine.group_by(col_sub)
+            .agg(pl.sum(*td_cols, *count_cols))
+            .filter(pl.all_horizontal(pl.col(count_cols) > 0))
+            .with_columns(
+                (pl.col(col_td) / pl.col(f"L{col_td}") - 1).alias(f"{col_td} Growth")
+                for col_td in TD_RANGES
+            )
+            .with_columns(
+                # Handle infinite values and replace with NaN
+                pl.when(pl.col(f"{col_td} Growth").is_infinite())
+                .then(pl.lit(float("nan")))
+                .otherwise(pl.col(f"{col_td} Growth"))
+                .alias(f"{col_td} Growth")
+                for col_td in TD_RANGES
+            )
+            .sort(col_sub)
+            .select(
+                col_sub,
+                *(pl.col(col_td, f"{col_td} Growth") for col_td in TD_RANGES),
+            )
+        )
+    return sub_td_metrics
 
 
-def get_monthly_ov_heatmap(df, year, group, subgroup):
-    month_abbr_list = calendar.month_abbr[1:]
+def heatmap_dims(group, subgroup):
+    # the rows of the heatmap, the members of group or within one subgroup of
+    # it the next level down
     if subgroup is None:
-        group_final = group
-        colormap = "Agsunset_r"
-    else:
-        group_final = "SubcategoryName" if group == "BrandName" else "BrandName"
-        colormap = "Bluyl"
-
-    df_monthly = (
-        df.filter(pl.col("OrderDate").dt.year() == year)
-        .filter(pl.col(group) == subgroup if subgroup else True)
-        .with_columns(pl.col("OrderDate").dt.strftime("%b").alias("Month"))
-        .group_by(group_final, "Month")
-        .agg(pl.sum("Sales"))
-        .pivot("Month", index=group_final, values="Sales")
-        .sort(group_final)
-        .with_columns(
-            pl.coalesce(pl.col(f"^{mab}$"), pl.lit(float("nan"))).alias(mab)
-            for mab in month_abbr_list
-        )
-        .select(pl.col(group_final, *month_abbr_list))
+        return (group,)
+    return (group, "SubcategoryName" if group == "BrandName" else "BrandName")
+
+
+@timed
+def pivot_calendar(df, dims, metrics, period="month"):
+    return densify(
+        collect(calendar_sums(df.lazy(), dims, metrics, period)), dims, metrics, period
+    )
+
+
+@timed
+def get_monthly_ov(pivot, year, group, subgroup, top_n=None):
+    # pivot holds the monthly sales of heatmap_dims, with top_n, rows beyond
+    # the top_n groups by yearly sales are folded
+    import numpy as np
+
+    month_abbr_list = PERIODS["month"]
+    group_final = heatmap_dims(group, subgroup)[-1]
+
+    df_members = pivot["members"]
+    matrix = year_matrix(pivot, "Sales", year)
+    mask = ~np.isnan(matrix).all(axis=1)
+    if subgroup:
+        mask &= (df_members[group] == subgroup).to_numpy()
+    matrix, labels, folded = fold_rows(
+        matrix[mask], df_members[group_final].filter(pl.Series(mask)), top_n
     )
 
+    # the folded row goes last by its flag, a member may be named like it
+    df_monthly = pl.DataFrame(
+        {
+            group_final: labels,
+            **{mab: matrix[:, i] for i, mab in enumerate(month_abbr_list)},
+        },
+        schema_overrides={mab: pl.Float64 for mab in month_abbr_list},
+    ).sort(pl.Series(folded), maintain_order=True)
+    return df_monthly
+
+
+@timed
+def plot_monthly_ov_heatmap(df_monthly, subgroup):
+    # plotly.express pulls in pandas, only pay for it once a chart is drawn
+    import plotly.express as px
+
+    month_abbr_list = PERIODS["month"]
+    group_final = df_monthly.columns[0]
+    colormap = "Agsunset_r" if subgroup is None else "Bluyl"
+
     fig_heatmap = px.imshow(
         df_monthly.select(pl.col(month_abbr_list)),
         y=df_monthly[group_final].to_numpy(),
@@ -151,72 +653,53 @@ def get_monthly_ov_heatmap(df, year, group, subgroup):
     return fig_heatmap
 
 
-def get_df_ov(df):
-    df_ov = (
-        df.group_by(
-            [
-                pl.col("OrderDate").dt.year().alias("Year"),
-                pl.col("OrderDate").dt.month().alias("Month"),
-            ]
-        )
-        .agg(
-            pl.sum("Sales").alias("Sales"),
-            pl.sum("Profit").alias("Profit"),
-        )
-        .sort(["Year", "Month"])
-        .with_columns(Cost=pl.col("Sales") - pl.col("Profit"))
-        .select(pl.exclude(["Year", "Month"]))
-        .transpose(include_header=True)
-        .select(
-            pl.col("column").alias("Item"),
-            CurrentYear=pl.concat_list(pl.col([f"column_{i}" for i in range(13, 21)])),
-            LastYear=pl.concat_list(pl.col([f"column_{i}" for i in range(13)])),
-        )
+@timed
+def get_monthly_ov_heatmap(df, year, group, subgroup):
+    pivot = pivot_calendar(df, heatmap_dims(group, subgroup), ["Sales"])
+    return plot_monthly_ov_heatmap(
+        get_monthly_ov(pivot, year, group, subgroup), subgroup
     )
 
-    return df_ov
 
+@timed
+def get_df_ov(pivot):
+    # pivot holds the monthly Sales and Profit without dims, the current year
+    # runs up to its last month with sales, months without sales count as 0
+    import numpy as np
 
-def get_df_turnover(df, group, turnover, n_month):
-    sales_col = f"Sales({n_month}M)"
-    avg_sales_col = f"AvgSales({n_month}M)"
-    quantity_col = f"Quantity({n_month}M)"
-    avg_quantity_col = f"AvgQuantity({n_month}M)"
-    df_turnover = (
-        df.with_columns(pl.col("OrderDate").dt.month().alias("Month"))
-        .group_by("Month", group)
-        .agg(
-            pl.sum("Sales").alias("Sales"),
-            pl.sum("Quantity").alias("Quantity"),
-            pl.last("StockValue").alias("StockValue"),
-            pl.last("Stock").alias("Stock"),
-        )
-        .sort("Month")
-        .group_by(group)
-        .agg(
-            pl.concat_list("Sales").alias(sales_col),
-            pl.mean("Sales").alias(avg_sales_col),
-            pl.last("StockValue").alias("StockValue"),
-            pl.concat_list("Quantity").alias(quantity_col),
-            pl.mean("Quantity").alias(avg_quantity_col),
-            pl.last("Stock").alias("Stock"),
-        )
-        .with_columns(
-            (pl.col("StockValue") / pl.col(avg_sales_col) * 30)
-            .round()
-            .alias("DollarTurnover"),
-            (pl.col("Stock") / pl.col(avg_quantity_col) * 30).round().alias("Turnover"),
-        )
-        .with_columns(
-            pl.when(pl.col(turnover) >= 90)
-            .then(pl.lit("🥶"))
-            .when(pl.col(turnover).is_between(60, 90, closed="left"))
-            .then(pl.lit("😊"))
-            .when(pl.col(turnover).is_between(30, 60, closed="left"))
-            .then(pl.lit("😥"))
-            .otherwise(pl.lit("🥵"))
-            .alias("TurnoverStatus")
-        )
-        .sort(group)
+    years = pivot["years"]
+    sales = {year: year_matrix(pivot, "Sales", year)[0] for year in years[-2:]}
+    profit = {year: year_matrix(pivot, "Profit", year)[0] for year in years[-2:]}
+    items = {
+        "Sales": sales,
+        "Profit": profit,
+        "Cost": {year: sales[year] - profit[year] for year in sales},
+    }
+
+    current_year = years[-1] if years else None
+    n_months = (
+        int(np.flatnonzero(~np.isnan(sales[current_year]))[-1]) + 1 if years else 0
     )
-    return df_turnover
+    df_ov = pl.DataFrame(
+        {
+            "Item": list(items),
+            "CurrentYear": [
+                np.nan_to_num(months.get(current_year, []))[:n_months].tolist()
+                for months in items.values()
+            ],
+            "LastYear": [
+                (
+                    np.nan_to_num(months.get(current_year - 1, [])).tolist()
+                    if years
+                    else []
+                )
+                for months in items.values()
+            ],
+        },
+        schema={
+            "Item": pl.String,
+            "CurrentYear": pl.List(pl.Float64),
+            "LastYear": pl.List(pl.Float64),
+        },
+    )
+    return df_ov
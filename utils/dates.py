@@ -0,0 +1,79 @@
+import datetime as dt
+
+import polars as pl
+
+
+def get_month_offsets(df):
+    # row offset of the first row of every month in a frame sorted by OrderDate,
+    # with a trailing sentinel month that points past the last row
+    dates = df["OrderDate"]
+    if dates.is_empty():
+        return pl.DataFrame(schema={"Month": pl.Date, "Offset": pl.UInt32})
+    months = pl.date_range(
+        dates[0].replace(day=1),
+        dates[-1].replace(day=1),
+        interval="1mo",
+        eager=True,
+    )
+    months = pl.concat([months, months.tail(1).dt.offset_by("1mo")])
+    df_offsets = pl.DataFrame(
+        {
+            "Month": months,
+            "Offset": dates.search_sorted(months, side="left").cast(pl.UInt32),
+        }
+    )
+    return df_offsets
+
+
+def _search_date(dates, date, side, offsets):
+    if offsets is None or offsets.is_empty():
+        return dates.search_sorted(date, side=side)
+
+    # narrow the binary search down to the month holding the date
+    month = date.replace(day=1)
+    months = offsets["Month"]
+    i = months.search_sorted(month, side="right") - 1
+    if i < 0:
+        return 0
+    if i >= len(months) - 1:
+        return len(dates)
+    lo, hi = offsets["Offset"][i], offsets["Offset"][i + 1]
+    return lo + dates.slice(lo, hi - lo).search_sorted(date, side=side)
+
+
+def slice_date_range(df, date_range, offsets=None):
+    # df must be sorted by OrderDate, the result is a zero-copy slice
+    date_start, date_end = date_range
+    dates = df["OrderDate"]
+    lo = 0 if date_start is None else _search_date(dates, date_start, "left", offsets)
+    hi = (
+        len(dates)
+        if date_end is None
+        else _search_date(dates, date_end, "right", offsets)
+    )
+    return df.slice(lo, max(hi - lo, 0))
+
+
+def is_date_sorted(df):
+    return isinstance(df, pl.DataFrame) and df["OrderDate"].flags["SORTED_ASC"]
+
+
+def split_window(date_range):
+    # the whole months of date_range as (first day, last day) and the windows
+    # of the partial months at either end, months is None when the window
+    # holds no whole month
+    date_start, date_end = date_range
+    month_start = date_start
+    if date_start is not None and date_start.day != 1:
+        month_start = (date_start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+    month_end = date_end
+    if date_end is not None and (date_end + dt.timedelta(days=1)).day != 1:
+        month_end = date_end.replace(day=1) - dt.timedelta(days=1)
+    if month_start is not None and month_end is not None and month_start > month_end:
+        return None, [date_range]
+    edges = []
+    if month_start != date_start:
+        edges.append((date_start, month_start - dt.timedelta(days=1)))
+    if month_end != date_end:
+        edges.append((month_end + dt.timedelta(days=1), date_end))
+    return (month_start, month_end), edges
@@ -0,0 +1,96 @@
+import glob
+import os
+import re
+import secrets
+import shutil
+import time
+
+import polars as pl
+import streamlit as st
+
+from utils.config import EXPORT_DIR, EXPORT_PART_ROWS, EXPORT_TTL
+
+# file formats of the download actions and their extensions
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet"}
+
+
+def remove_expired(export_dir=EXPORT_DIR, ttl=EXPORT_TTL):
+    now = time.time()
+    for path in glob.glob(os.path.join(export_dir, "*")):
+        if now - os.path.getmtime(path) > ttl:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def write_export(frame, name, fmt, export_dir=EXPORT_DIR, part_rows=EXPORT_PART_ROWS):
+    # frame is the LazyFrame of a view's rows or an aggregate already shown,
+    # the streaming engine sinks it to disk batch by batch so the result is
+    # never collected in memory. it is written once to parquet, the files of
+    # the export are slices of that, each slice only reads its row groups.
+    # the random directory keeps the url of an export unguessable
+    remove_expired(export_dir)
+    path = os.path.join(export_dir, secrets.token_urlsafe(16))
+    os.makedirs(path)
+    name = re.sub(r"[^\w.-]+", "_", name).strip("_") or "export"
+    ext = EXPORT_FORMATS[fmt]
+
+    tmp_file = os.path.join(path, f"{name}.tmp")
+    frame.lazy().sink_parquet(tmp_file)
+    lf = pl.scan_parquet(tmp_file)
+    n_rows = lf.select(pl.len()).collect().item()
+    offsets = range(0, max(n_rows, 1), part_rows)
+    if fmt == "Parquet" and len(offsets) == 1:
+        file = os.path.join(path, f"{name}.{ext}")
+        os.replace(tmp_file, file)
+        return [file]
+
+    files = []
+    for i, offset in enumerate(offsets):
+        suffix = f"-{i + 1:03d}" if len(offsets) > 1 else ""
+        file = os.path.join(path, f"{name}{suffix}.{ext}")
+        lf_part = lf.slice(offset, part_rows)
+        if fmt == "CSV":
+            # csv has no nested types, the monthly series become "1.0 2.0 ..."
+            lists = [c for c, dtype in lf.collect_schema().items() if dtype == pl.List]
+            lf_part.with_columns(
+                pl.col(lists).cast(pl.List(pl.String)).list.join(" ")
+            ).sink_csv(file)
+        else:
+            lf_part.sink_parquet(file)
+        files.append(file)
+    os.remove(tmp_file)
+    return files
+
+
+def get_export_url(file):
+    # streamlit serves ./static at app/static, see .streamlit/config.toml, the
+    # files are streamed from disk rather than held by the media file manager
+    return "app/" + os.path.relpath(file).replace(os.sep, "/")
+
+
+def export_buttons(key, name, views):
+    # download actions of a section, views maps a label to the DataFrame
+    # shown or to a function returning the LazyFrame of its rows, nothing is
+    # queried or written until the export is clicked and the links last until
+    # the next rerun
+    cols = st.columns([2, 1, 1, 3], vertical_alignment="bottom")
+    with cols[0]:
+        label = st.selectbox("Export", list(views), key=f"{key}_export_view")
+    with cols[1]:
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_export_format")
+    with cols[2]:
+        clicked = st.button("Export", key=f"{key}_export")
+    if not clicked:
+        return None
+
+    frame = views[label]
+    files = write_export(frame() if callable(frame) else frame, f"{name}-{label}", fmt)
+    with cols[3]:
+        st.markdown(
+            " ".join(
+                f'<a href="{get_export_url(file)}" download="{os.path.basename(file)}">'
+                f"{os.path.basename(file)}</a>"
+                for file in files
+            ),
+            unsafe_allow_html=True,
+        )
+    return files
@@ -0,0 +1,19 @@
+import argparse
+
+from utils.data import append_orders
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Append batches of new order rows to the dataset."
+    )
+    parser.add_argument("files", nargs="+", help="csv files in the DATA_FILE schema")
+    args = parser.parse_args()
+
+    for file in args.files:
+        part = append_orders(file)
+        print(f"{file}: appended orders from {part['date_min']} to {part['date_max']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import polars as pl
+
+# the turnover tables cover every window of the last n months up to this
+MAX_MONTHS = 12
+# (category, brand) and (category, brand, product), as on the inventory page,
+# as strings since categoricals of separate collects cannot be joined
+LEVELS = {
+    "BrandName": ["CategoryName", "BrandName"],
+    "ProductName": ["CategoryName", "BrandName", "ProductName"],
+}
+TURNOVER_COLS = {"BrandName": "DollarTurnover", "ProductName": "Turnover"}
+
+
+def _month_index(date):
+    return date.year * 12 + date.month - 1
+
+
+def get_stock_snapshot(lf, date):
+    # stock of every product on its latest order line up to date, ties on the
+    # same day go to the highest OrderID so the result never depends on the
+    # row order of the scan
+    return (
+        lf.filter(pl.col("OrderDate") <= date)
+        .group_by("ProductID", *LEVELS["ProductName"])
+        .agg(pl.col("Stock", "StockValue").sort_by("OrderDate", "OrderID").last())
+        .with_columns(pl.col(LEVELS["ProductName"]).cast(pl.String))
+    )
+
+
+def get_monthly_sales(lf, date, max_months=MAX_MONTHS):
+    # sales and quantity per product and month over the last max_months months
+    month = pl.col("OrderDate").dt.year() * 12 + pl.col("OrderDate").dt.month() - 1
+    return (
+        lf.filter(
+            pl.col("OrderDate") <= date,
+            month >= _month_index(date) - max_months + 1,
+        )
+        .group_by(*LEVELS["ProductName"], month.alias("MonthIndex"))
+        .agg(pl.sum("Sales", "Quantity"))
+        .with_columns(pl.col(LEVELS["ProductName"]).cast(pl.String))
+    )
+
+
+def turnover_status(turnover):
+    return (
+        pl.when(pl.col(turnover) >= 90)
+        .then(pl.lit("🥶"))
+        .when(pl.col(turnover).is_between(60, 90, closed="left"))
+        .then(pl.lit("😊"))
+        .when(pl.col(turnover).is_between(30, 60, closed="left"))
+        .then(pl.lit("😥"))
+        .otherwise(pl.lit("🥵"))
+        .alias("TurnoverStatus")
+    )
+
+
+def build_turnover(df_monthly, df_snapshot, date, level, max_months=MAX_MONTHS):
+    # every n_month window from 1 to max_months in one pass, the monthly series
+    # only hold the months with sales and the averages are taken over them
+    keys = LEVELS[level]
+    turnover = TURNOVER_COLS[level]
+    df_windows = pl.DataFrame(
+        {"Months": pl.int_range(1, max_months + 1, eager=True, dtype=pl.Int32)}
+    )
+    df_level = (
+        df_monthly.group_by(*keys, "MonthIndex")
+        .agg(pl.sum("Sales", "Quantity"))
+        .join(df_windows, how="cross")
+        .filter(pl.col("MonthIndex") > _month_index(date) - pl.col("Months"))
+        .sort("MonthIndex")
+        .group_by(*keys, "Months", maintain_order=True)
+        .agg(
+            pl.col("Sales").alias("SalesSeries"),
+            pl.mean("Sales").alias("AvgSales"),
+            pl.col("Quantity").alias("QuantitySeries"),
+            pl.mean("Quantity").alias("AvgQuantity"),
+        )
+        .join(
+            df_snapshot.group_by(keys).agg(pl.sum("Stock", "StockValue")),
+            on=keys,
+            how="left",
+        )
+        .with_columns(
+            (pl.col("StockValue") / pl.col("AvgSales") * 30)
+            .round()
+            .alias("DollarTurnover"),
+            (pl.col("Stock") / pl.col("AvgQuantity") * 30).round().alias("Turnover"),
+        )
+        .with_columns(turnover_status(turnover))
+        .sort("Months", *keys)
+    )
+    return df_level
+
+
+def build_turnover_tables(lf, date):
+    # lf holds the order lines, the scan is shared by both aggregations
+    df_monthly, df_snapshot = pl.collect_all(
+        [get_monthly_sales(lf, date), get_stock_snapshot(lf, date)], streaming=True
+    )
+    return {
+        level: build_turnover(df_monthly, df_snapshot, date, level) for level in LEVELS
+    }
+
+
+def get_turnover(df_level, level, n_month, filters):
+    # the rows of one window in the column names of the inventory page
+    df_turnover = df_level.filter(pl.col("Months") == n_month)
+    for col, value in filters.items():
+        df_turnover = df_turnover.filter(pl.col(col) == value)
+    return df_turnover.select(
+        level,
+        pl.col("SalesSeries").alias(f"Sales({n_month}M)"),
+        pl.col("AvgSales").alias(f"AvgSales({n_month}M)"),
+        "StockValue",
+        pl.col("QuantitySeries").alias(f"Quantity({n_month}M)"),
+        pl.col("AvgQuantity").alias(f"AvgQuantity({n_month}M)"),
+        "Stock",
+        "DollarTurnover",
+        "Turnover",
+        "TurnoverStatus",
+    )
@@ -0,0 +1,157 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import polars as pl
+
+from utils.config import DATA_FILE, DATASET_DIR, PARTITION_BATCH_ROWS
+from utils.data import ID_COLS, prepare_data
+from utils.snapshot import (
+    SNAPSHOT_FORMAT,
+    get_partitions,
+    get_source_key,
+    get_tmp_path,
+    read_dataset_part,
+    write_dataset_meta,
+)
+from utils.star import DIMENSIONS, build_star, build_star_cube, build_star_sketch
+
+
+def spill_batches(file, data_dir, batch_rows=PARTITION_BATCH_ROWS):
+    # prepare the csv batch by batch, the batched reader parses the chunks of
+    # a batch on every core, and spill the fact rows of each batch into a
+    # chunk file per month so memory holds one batch at a time. the keys of a
+    # dimension row are the same in every batch, the dimensions of all
+    # batches are merged and returned
+    n_threads = pl.thread_pool_size()
+    reader = pl.read_csv_batched(
+        file,
+        schema_overrides={col: pl.Int32 for col in ID_COLS},
+        batch_size=max(batch_rows // n_threads, 1),
+    )
+    dims = {name: [] for name in DIMENSIONS}
+    i = 0
+    while batches := reader.next_batches(n_threads):
+        df_fact, batch_dims = build_star(prepare_data(pl.concat(batches)))
+        for name, df_dim in batch_dims.items():
+            dims[name].append(df_dim)
+        df_fact = df_fact.with_columns(
+            pl.col("OrderDate").dt.year().alias("Year"),
+            pl.col("OrderDate").dt.month().alias("Month"),
+        )
+        for (year, month), df_month in df_fact.partition_by(
+            "Year", "Month", as_dict=True, include_key=False
+        ).items():
+            path = os.path.join(data_dir, f"year={year}", f"month={month}")
+            os.makedirs(path, exist_ok=True)
+            df_month.write_parquet(os.path.join(path, f"chunk-{i:06d}.parquet"))
+        i += 1
+    return {
+        name: pl.concat(frames).unique(DIMENSIONS[name][0], maintain_order=True)
+        for name, frames in dims.items()
+        if frames
+    }
+
+
+def merge_partitions(data_dir, dims):
+    # one month at a time, its chunks are sorted into a single file and its
+    # rows aggregated into the cube and sketch of the month, per day and per
+    # month respectively, so the months simply concatenate
+    cubes, sketches, dates = [], [], []
+    for _, _, path in get_partitions(data_dir):
+        chunks = sorted(glob.glob(os.path.join(path, "chunk-*.parquet")))
+        df = pl.read_parquet(chunks).sort("OrderDate", maintain_order=True)
+        df.write_parquet(os.path.join(path, "data.parquet"), statistics=True)
+        for chunk in chunks:
+            os.remove(chunk)
+        cube, sketch = pl.collect_all(
+            [build_star_cube(df.lazy(), dims), build_star_sketch(df.lazy(), dims)],
+            streaming=True,
+        )
+        cubes.append(cube)
+        sketches.append(sketch)
+        dates.extend([df["OrderDate"].min(), df["OrderDate"].max()])
+    return cubes, sketches, dates
+
+
+def partition_csv(file, output, batch_rows=PARTITION_BATCH_ROWS):
+    # write the prepared rows of file as a year/month partitioned dataset in
+    # output, a dataset written earlier stays readable until the new one is
+    # complete
+    key = get_source_key(file, with_hash=False)
+    version = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    data_dir = f"data-{version[:16]}-{SNAPSHOT_FORMAT}"
+    tmp_dir = os.path.join(output, f"{data_dir}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    dims = spill_batches(file, tmp_dir, batch_rows)
+    cubes, sketches, dates = merge_partitions(tmp_dir, dims)
+    if not dates:
+        shutil.rmtree(tmp_dir)
+        raise ValueError(f"{file} holds no order rows")
+
+    files = {"data": data_dir}
+    frames = {"cube": pl.concat(cubes), "sketch": pl.concat(sketches), **dims}
+    for name, df in frames.items():
+        files[name] = f"{name}-{version[:16]}-{SNAPSHOT_FORMAT}.parquet"
+        tmp_path = get_tmp_path(os.path.join(output, files[name]))
+        df.write_parquet(tmp_path, statistics=True)
+        os.replace(tmp_path, os.path.join(output, files[name]))
+    shutil.rmtree(os.path.join(output, data_dir), ignore_errors=True)
+    os.replace(tmp_dir, os.path.join(output, data_dir))
+
+    old_part = read_dataset_part(output)
+    part = write_dataset_meta(
+        output,
+        {
+            **key,
+            "format": SNAPSHOT_FORMAT,
+            "backend": "hive",
+            "columns": pl.read_csv(file, n_rows=0).columns,
+            "files": files,
+            "date_min": min(dates).isoformat(),
+            "date_max": max(dates).isoformat(),
+        },
+    )
+    if old_part is not None:
+        for path in set(old_part["files"].values()) - set(part["files"].values()):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+    return part
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write an order export as a year/month partitioned dataset."
+    )
+    parser.add_argument(
+        "file", nargs="?", default=DATA_FILE, help="csv file in the DATA_FILE schema"
+    )
+    parser.add_argument(
+        "--output",
+        default=DATASET_DIR or os.path.join(os.path.dirname(DATA_FILE), "dataset"),
+        help="dataset directory, point SIMS_DATASET_DIR at it",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=PARTITION_BATCH_ROWS,
+        help="csv rows held in memory at a time",
+    )
+    args = parser.parse_args()
+
+    part = partition_csv(args.file, args.output, args.batch_rows)
+    print(
+        f"{args.file}: wrote orders from {part['date_min']} to {part['date_max']} "
+        f"into {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
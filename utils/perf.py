@@ -0,0 +1,169 @@
+import datetime as dt
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import polars as pl
+import streamlit as st
+
+from utils.config import PERF_PANEL, TRACE_FILE, TRACE_PLANS
+
+# number of recent timings per span kept for the rolling percentiles
+ROLLING_WINDOW = 200
+
+# spans of the rerun running on this thread, streamlit runs every script
+# rerun on its own thread
+_local = threading.local()
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=ROLLING_WINDOW))
+
+
+def start_rerun(page):
+    _local.rerun = {
+        "timestamp": dt.datetime.now().isoformat(timespec="milliseconds"),
+        "page": page,
+        "start": time.perf_counter(),
+        "spans": [],
+        "depth": 0,
+    }
+
+
+def _current_rerun():
+    return getattr(_local, "rerun", None)
+
+
+@contextmanager
+def span(name, kind="section"):
+    rerun = _current_rerun()
+    if rerun is None:
+        yield None
+        return
+
+    record = {"name": name, "kind": kind, "depth": rerun["depth"]}
+    rerun["spans"].append(record)
+    rerun["depth"] += 1
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["start_ms"] = (start - rerun["start"]) * 1000
+        record["duration_ms"] = (time.perf_counter() - start) * 1000
+        rerun["depth"] -= 1
+
+
+def section(name):
+    # a named section of a page script
+    return span(name, "section")
+
+
+def timed(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(f"{func.__module__}.{func.__qualname__}", "function"):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def record_plan(lf):
+    # attach the optimized query plan to the innermost open span
+    rerun = _current_rerun()
+    if not TRACE_PLANS or rerun is None:
+        return
+    open_spans = [record for record in rerun["spans"] if "duration_ms" not in record]
+    if open_spans:
+        open_spans[-1].setdefault("plans", []).append(lf.explain(streaming=True))
+
+
+def _write_trace(rerun):
+    os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+    line = json.dumps(rerun)
+    with _lock, open(TRACE_FILE, "a") as f:
+        f.write(line + "\n")
+
+
+def finish_rerun():
+    rerun = _current_rerun()
+    if rerun is None:
+        return None
+    _local.rerun = None
+
+    rerun["duration_ms"] = (time.perf_counter() - rerun.pop("start")) * 1000
+    del rerun["depth"]
+    with _lock:
+        _durations[f"page:{rerun['page']}"].append(rerun["duration_ms"])
+        for record in rerun["spans"]:
+            _durations[record["name"]].append(record["duration_ms"])
+    if TRACE_FILE:
+        _write_trace(rerun)
+    return rerun
+
+
+def get_rolling_stats():
+    with _lock:
+        durations = {name: list(values) for name, values in _durations.items()}
+    df_stats = (
+        pl.DataFrame(
+            {
+                "Name": list(durations),
+                "Duration": list(durations.values()),
+            },
+            schema={"Name": pl.String, "Duration": pl.List(pl.Float64)},
+        )
+        .select(
+            "Name",
+            pl.col("Duration").list.len().alias("Count"),
+            pl.col("Duration")
+            .list.eval(pl.element().quantile(0.5))
+            .list.first()
+            .alias("p50 (ms)"),
+            pl.col("Duration")
+            .list.eval(pl.element().quantile(0.95))
+            .list.first()
+            .alias("p95 (ms)"),
+        )
+        .sort("p95 (ms)", descending=True)
+    )
+    return df_stats
+
+
+def get_rerun_breakdown(rerun):
+    return pl.DataFrame(
+        {
+            "Name": [
+                "  " * record["depth"] + record["name"] for record in rerun["spans"]
+            ],
+            "Kind": [record["kind"] for record in rerun["spans"]],
+            "Start (ms)": [record["start_ms"] for record in rerun["spans"]],
+            "Duration (ms)": [record["duration_ms"] for record in rerun["spans"]],
+        },
+        schema={
+            "Name": pl.String,
+            "Kind": pl.String,
+            "Start (ms)": pl.Float64,
+            "Duration (ms)": pl.Float64,
+        },
+    )
+
+
+def finish_page():
+    # closes the rerun of a page script and shows the panel when it is enabled
+    rerun = finish_rerun()
+    if not PERF_PANEL or rerun is None:
+        return
+    if not st.sidebar.toggle("Performance panel", key="perf_panel"):
+        return
+
+    with st.sidebar:
+        st.caption(f"Last rerun of {rerun['page']}: {rerun['duration_ms']:.0f} ms")
+        st.dataframe(get_rerun_breakdown(rerun), hide_index=True)
+        st.caption(f"Rolling latencies over the last {ROLLING_WINDOW} runs")
+        st.dataframe(get_rolling_stats(), hide_index=True)
+        for record in rerun["spans"]:
+            for plan in record.get("plans", []):
+                with st.expander(f"Plan of {record['name']}"):
+                    st.code(plan)
@@ -0,0 +1,89 @@
+import calendar
+
+import polars as pl
+
+from utils.charts import OTHER
+
+# calendar periods of a pivot and their column labels within a year, weeks
+# are iso weeks of the iso year
+PERIODS = {
+    "month": calendar.month_abbr[1:],
+    "quarter": [f"Q{i}" for i in range(1, 5)],
+    "week": [f"W{i}" for i in range(1, 54)],
+}
+
+
+def period_keys(period, date_col="OrderDate"):
+    # integer year and period of every row, no per-row strings
+    date = pl.col(date_col).dt
+    year = date.iso_year() if period == "week" else date.year()
+    keys = {"month": date.month(), "quarter": date.quarter(), "week": date.week()}
+    return year.cast(pl.Int32).alias("Year"), keys[period].cast(pl.Int32).alias(
+        "Period"
+    )
+
+
+def calendar_sums(lf, dims, metrics, period="month", date_col="OrderDate"):
+    # the long sums behind a pivot, one row per member, year and period
+    return lf.group_by(*dims, *period_keys(period, date_col)).agg(pl.sum(*metrics))
+
+
+def densify(df_sums, dims, metrics, period="month"):
+    # dense (member, year, period) arrays of every metric over the whole span
+    # of years in df_sums, NaN where a member has no rows, the members are the
+    # sorted rows of dims, a single row without dims
+    import numpy as np
+
+    dims = list(dims)
+    years = (
+        list(range(df_sums["Year"].min(), df_sums["Year"].max() + 1))
+        if len(df_sums)
+        else []
+    )
+    if dims:
+        df_members = df_sums.select(dims).unique().sort(dims)
+        rows = df_sums.join(
+            df_members.with_row_index("Row"), on=dims, how="left", join_nulls=True
+        )["Row"].to_numpy()
+    else:
+        df_members = pl.DataFrame()
+        rows = np.zeros(len(df_sums), dtype=np.int64)
+    cols = (df_sums["Year"] - (years[0] if years else 0)).to_numpy()
+    periods = (df_sums["Period"] - 1).to_numpy()
+
+    shape = (len(df_members) if dims else 1, len(years), len(PERIODS[period]))
+    values = {}
+    for metric in metrics:
+        values[metric] = np.full(shape, np.nan)
+        values[metric][rows, cols, periods] = df_sums[metric].to_numpy()
+    return {"period": period, "years": years, "members": df_members, "values": values}
+
+
+def year_matrix(pivot, metric, year):
+    # the (member, period) matrix of one year, all NaN outside the span
+    import numpy as np
+
+    values = pivot["values"][metric]
+    if year not in pivot["years"]:
+        return np.full((values.shape[0], values.shape[2]), np.nan)
+    return values[:, pivot["years"].index(year), :]
+
+
+def fold_rows(matrix, labels, n):
+    # keep the n rows with the largest total in their order, the rest are
+    # summed into an OTHER row, periods without any value stay NaN, labels
+    # is a series and turns into strings once folded. folded flags the row
+    # of the folded members, a member named like it is not flagged
+    import numpy as np
+
+    if n is None or len(labels) <= n:
+        return matrix, labels, np.zeros(len(labels), dtype=bool)
+    totals = np.nansum(matrix, axis=1)
+    keep = np.sort(np.argsort(-totals, kind="stable")[:n])
+    # a member named like the folded row joins it
+    keep = keep[(labels.gather(keep).cast(pl.String) != OTHER).to_numpy()]
+    rest = np.delete(matrix, keep, axis=0)
+    other = np.where(np.isnan(rest).all(axis=0), np.nan, np.nansum(rest, axis=0))
+    labels = labels.gather(keep).cast(pl.String).append(pl.Series([OTHER]))
+    folded = np.arange(len(labels)) == len(keep)
+    return np.vstack([matrix[keep], other]), labels, folded
@@ -0,0 +1,40 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from utils.config import PREFETCH, PREFETCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def get_executor(max_workers=PREFETCH_WORKERS):
+    return ThreadPoolExecutor(max_workers, thread_name_prefix="prefetch")
+
+
+def _warm(ctx, func, args):
+    # the context of the page keeps the st.cache_data calls of the worker from
+    # warning about a missing context
+    add_script_run_ctx(threading.current_thread(), ctx)
+    try:
+        func.warm(*args)
+    except Exception:
+        # the section raises again when it calls the view itself
+        logger.warning(
+            "prefetch of %s%r failed", func.__qualname__, args, exc_info=True
+        )
+
+
+def prefetch(views):
+    # start the (view, args) pairs of a page's independent sections together,
+    # every section then reads its result from the result cache or waits for
+    # the running computation, so the page takes about as long as its slowest
+    # section rather than the sum of them
+    if not PREFETCH:
+        return []
+    executor = get_executor()
+    ctx = get_script_run_ctx()
+    return [executor.submit(_warm, ctx, func, args) for func, args in views]
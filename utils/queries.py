@@ -0,0 +1,291 @@
+import datetime as dt
+
+import polars as pl
+
+from utils.cache import cached_result
+from utils.config import CHART_TOP_N, DATE, DATE_MIN
+from utils.cube import get_cube_members, range_sum, rollup, slice_cube
+from utils.data import (
+    collect,
+    get_df_ov,
+    get_monthly_ov,
+    get_snapshot_parts,
+    get_sub_td_metrics,
+    get_td_filters,
+    get_td_metrics_from_index,
+    get_td_windows,
+    heatmap_dims,
+    load_cube,
+    load_month_offsets,
+    load_prefix_index,
+    load_sketch,
+    make_td_tables,
+    pivot_calendar,
+    query_data,
+    search_data,
+)
+from utils.dates import split_window
+from utils.inventory import build_turnover_tables, get_turnover
+from utils.perf import timed
+from utils.sketch import (
+    SKETCH_COLS,
+    SKETCH_KEYS,
+    count_distinct,
+    find_level,
+    merge_sketch,
+    slice_months,
+    widen_counts,
+)
+
+# the views behind the pages, cached across sessions in the shared result cache
+
+
+def _year_window(year):
+    return dt.date(year, 1, 1), dt.date(year, 12, 31)
+
+
+def _td_window(date):
+    # current and last year cover every time-to-date window
+    return dt.date(date.year - 1, 1, 1), dt.date(date.year, 12, 31)
+
+
+def _is_default_window(date_range):
+    # only calls over the default window, as of date or raw page are counted
+    # for the warm-up, other values are countless and rarely repeated
+    return tuple(date_range) == (DATE_MIN, DATE)
+
+
+def _is_default_date(date):
+    return date == DATE
+
+
+@timed
+@cached_result(get_snapshot_parts)
+def get_members(col):
+    return get_cube_members(load_cube(), col)
+
+
+@timed
+@cached_result(
+    get_snapshot_parts,
+    window=lambda dims, metrics, date_range: date_range,
+    record=lambda dims, metrics, date_range: _is_default_window(date_range),
+)
+def get_range_rollup(dims, metrics, date_range):
+    return range_sum(load_prefix_index(dims), list(dims), date_range, list(metrics))
+
+
+@timed
+@cached_result(get_snapshot_parts)
+def get_monthly_rollup(dim, metrics):
+    return rollup(load_cube(), [pl.col("OrderDate").dt.month_end(), dim], list(metrics))
+
+
+@timed
+@cached_result(
+    get_snapshot_parts,
+    window=lambda cat, subcat, date, metrics: _td_window(date),
+    record=lambda cat, subcat, date, metrics: _is_default_date(date),
+)
+def get_cat_td_metrics(cat, subcat, date, metrics):
+    quarter = (date.month - 1) // 3 + 1
+    return get_td_metrics_from_index(
+        slice_cube(load_prefix_index([cat]), filters={cat: subcat}),
+        list(metrics),
+        get_td_windows(date.year, date.month, quarter, date.day),
+    )
+
+
+@timed
+@cached_result(
+    get_snapshot_parts,
+    window=lambda cat, subcat, date, metric, cols_sub: _td_window(date),
+    record=lambda cat, subcat, date, metric, cols_sub: _is_default_date(date),
+)
+def get_cat_sub_td_metrics(cat, subcat, date, metric, cols_sub):
+    quarter = (date.month - 1) // 3 + 1
+    df = slice_cube(
+        load_cube(),
+        date_range=_td_window(date),
+        filters={cat: subcat},
+        offsets=load_month_offsets(),
+    )
+    return get_sub_td_metrics(
+        df,
+        metric,
+        list(cols_sub),
+        get_td_filters(date.year, date.month, quarter, date.day),
+    )
+
+
+@timed
+@cached_result(get_snapshot_parts)
+def get_calendar_pivot(dims, metrics, period="month"):
+    # dense year by period arrays over the whole span, shared by every year
+    # and member the heatmap and trend views pick from them
+    return pivot_calendar(load_cube(), list(dims), list(metrics), period)
+
+
+@timed
+@cached_result(
+    get_snapshot_parts, window=lambda year, group, subgroup: _year_window(year)
+)
+def get_heatmap(year, group, subgroup):
+    pivot = get_calendar_pivot(heatmap_dims(group, subgroup), ("Sales",))
+    return get_monthly_ov(pivot, year, group, subgroup, CHART_TOP_N)
+
+
+@timed
+@cached_result(get_snapshot_parts)
+def get_sales_trend():
+    return get_df_ov(get_calendar_pivot((), ("Sales", "Profit")))
+
+
+@timed
+@cached_result(
+    get_snapshot_parts, window=lambda date: (None, date), record=_is_default_date
+)
+def get_turnover_tables(date):
+    # brand and product turnover of every n_month window as of date, the
+    # inventory page only looks rows up in them
+    lf = query_data(
+        [
+            "OrderID",
+            "OrderDate",
+            "CategoryName",
+            "BrandName",
+            "ProductID",
+            "ProductName",
+            "Sales",
+            "Quantity",
+            "Stock",
+            "StockValue",
+        ],
+        date_range=(None, date),
+    )
+    return build_turnover_tables(lf, date)
+
+
+@timed
+def get_category_turnover(category, date, n_month):
+    return get_turnover(
+        get_turnover_tables(date)["BrandName"],
+        "BrandName",
+        n_month,
+        {"CategoryName": category},
+    )
+
+
+@timed
+def get_brand_turnover(category, brand, date, n_month):
+    return get_turnover(
+        get_turnover_tables(date)["ProductName"],
+        "ProductName",
+        n_month,
+        {"CategoryName": category, "BrandName": brand},
+    )
+
+
+@timed
+def get_turnover_rows(category, brand, date, n_month):
+    # order lines of the months the brand turnover is based on
+    month = date.year * 12 + date.month - n_month
+    return get_order_rows(
+        (dt.date(month // 12, month % 12 + 1, 1), date),
+        {"CategoryName": category, "BrandName": brand},
+    )
+
+
+@timed
+@cached_result(
+    get_snapshot_parts,
+    window=lambda dims, date_range, filters, exact: date_range,
+    record=lambda dims, date_range, filters, exact: _is_default_window(date_range),
+)
+def get_distinct_counts(dims, date_range, filters, exact):
+    # distinct customers and orders per group of dims merged from the
+    # sketches, counted over the order lines when exact or when the drill-down
+    # is finer than the sketches
+    dims = list(dims)
+    filtered = [col for col, value in filters.items() if value is not None]
+    if exact or find_level([*dims, *filtered]) is None:
+        lf = query_data(
+            [*dims, "ClassName", *SKETCH_KEYS.values()], date_range, filters
+        )
+        return widen_counts(count_distinct(lf, dims), dims)
+    # whole months come from the stored sketches, the order lines of partial
+    # months at the ends of the window are merged in directly
+    months, edges = split_window(date_range)
+    sketch = load_sketch()
+    sketch = sketch.clear() if months is None else slice_months(sketch, months)
+    rows = [query_data(SKETCH_COLS, window, filters) for window in edges]
+    return widen_counts(merge_sketch(sketch, dims, filters, rows), dims)
+
+
+@timed
+@cached_result(
+    get_snapshot_parts,
+    window=lambda cat, subcat, date, exact: _td_window(date),
+    record=lambda cat, subcat, date, exact: _is_default_date(date),
+)
+def get_cat_td_distinct(cat, subcat, date, exact):
+    quarter = (date.month - 1) // 3 + 1
+    td_counts = {}
+    for i, window in enumerate(
+        get_td_windows(date.year, date.month, quarter, date.day)
+    ):
+        df_counts = get_distinct_counts((), window, {cat: subcat}, exact)
+        for key in SKETCH_KEYS:
+            td_counts[key, i] = df_counts[key].sum()
+    return make_td_tables(td_counts, list(SKETCH_KEYS))
+
+
+@timed
+@cached_result(get_snapshot_parts)
+def get_raw_columns():
+    return query_data().collect_schema().names()
+
+
+def _is_first_page(filters, search, sort, descending, page, page_size):
+    return page == 0 and not search
+
+
+def _raw_rows(filters, search):
+    lf = query_data(filters=filters)
+    return search_data(lf, search) if search else lf
+
+
+@timed
+@cached_result(get_snapshot_parts, record=lambda filters, search: not search)
+def get_raw_count(filters, search):
+    return collect(_raw_rows(filters, search).select(pl.len())).item()
+
+
+@timed
+@cached_result(get_snapshot_parts, record=_is_first_page)
+def get_raw_page(filters, search, sort, descending, page, page_size):
+    # only the requested page leaves polars, the sort and slice run as a top-k.
+    # the top-k of a filtered categorical loses its lexical order, the strings
+    # of the categories sort the same way
+    lf = _raw_rows(filters, search)
+    key = pl.col(sort)
+    if lf.collect_schema()[sort] == pl.Categorical:
+        key = key.cast(pl.String)
+    return collect(
+        lf.sort(key, descending=descending, maintain_order=True).slice(
+            page * page_size, page_size
+        )
+    )
+
+
+@timed
+def get_order_rows(
+    date_range=None, filters=None, search="", sort="OrderDate", descending=False
+):
+    # every matching order line for the exports, left lazy and uncached so the
+    # rows are only ever streamed to disk by utils/export.py, a stable sort
+    # is not supported by the streaming engine so ties may change order
+    lf = query_data(date_range=date_range, filters=filters)
+    if search:
+        lf = search_data(lf, search)
+    return lf.sort(sort, descending=descending)
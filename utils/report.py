@@ -0,0 +1,200 @@
+import argparse
+import datetime as dt
+import html
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import polars as pl
+
+from utils.config import CAT_MAP, DATE
+from utils.data import load_month_offsets, load_prefix_index
+from utils.queries import (
+    get_cat_sub_td_metrics,
+    get_cat_td_metrics,
+    get_members,
+    get_turnover_tables,
+)
+
+TD_METRICS = ["Sales", "Profit", "Cost"]
+
+
+def get_sub_cols(cat):
+    # the same breakdowns as the sales page
+    return ["SubcategoryName", "ProductName" if cat == "BrandName" else "BrandName"]
+
+
+def compute_member(task):
+    # one member of one dimension, the time-to-date tables with the dimension
+    # and member in front so all members can be stacked
+    cat_sel, member, date = task
+    cat = CAT_MAP[cat_sel]
+    keys = {"Dimension": cat_sel, "Member": str(member)}
+    td_metrics = get_cat_td_metrics(cat, member, date, TD_METRICS)
+    sub_td_metrics = get_cat_sub_td_metrics(
+        cat, member, date, "Sales", get_sub_cols(cat)
+    )
+    return {
+        "td_metrics": pl.concat(
+            df.select(pl.lit(metric).alias("Metric"), pl.all())
+            for metric, df in td_metrics.items()
+        ).select(*(pl.lit(value).alias(key) for key, value in keys.items()), pl.all()),
+        **{
+            f"sub_td_{col}": df.select(
+                *(pl.lit(value).alias(key) for key, value in keys.items()),
+                pl.col(col).cast(pl.String),
+                pl.exclude(col),
+            )
+            for col, df in sub_td_metrics.items()
+        },
+    }
+
+
+def warm_up(cats):
+    # load the cube and the prefix indexes of the dimensions once per process
+    load_month_offsets()
+    for cat_sel in cats:
+        load_prefix_index([CAT_MAP[cat_sel]])
+
+
+def compute_reports(date, cats, workers):
+    # the parent prepares the snapshot once, every worker loads the small
+    # aggregates from it and runs the member lookups; workers are spawned
+    # since the polars thread pool does not survive a fork
+    tasks = [
+        (cat_sel, member, date)
+        for cat_sel in cats
+        for member in get_members(CAT_MAP[cat_sel])
+    ]
+    turnover_tables = get_turnover_tables(date)
+    if workers > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            workers, mp_context=context, initializer=warm_up, initargs=(cats,)
+        ) as executor:
+            chunksize = max(len(tasks) // (workers * 4), 1)
+            results = list(executor.map(compute_member, tasks, chunksize=chunksize))
+    else:
+        warm_up(cats)
+        results = [compute_member(task) for task in tasks]
+
+    reports = {
+        name: pl.concat([result[name] for result in results if name in result])
+        for name in dict.fromkeys(name for result in results for name in result)
+    }
+    for level, df in turnover_tables.items():
+        reports[f"turnover_{level}"] = df.select(
+            "Months", pl.exclude("Months", "TurnoverStatus"), "TurnoverStatus"
+        )
+    return reports
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:,.2f}"
+    if isinstance(value, list):
+        return ", ".join(format_value(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def to_html_table(df):
+    header = "".join(f"<th>{html.escape(col)}</th>" for col in df.columns)
+    rows = "".join(
+        "<tr>"
+        + "".join(f"<td>{html.escape(format_value(value))}</td>" for value in row)
+        + "</tr>"
+        for row in df.iter_rows()
+    )
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table>"
+
+
+def write_html(file, title, sections):
+    body = "".join(
+        f"<h2>{html.escape(heading)}</h2>{to_html_table(df)}"
+        for heading, df in sections
+    )
+    with open(file, "w") as f:
+        f.write(
+            "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>{html.escape(title)}</title>"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse;"
+            "margin-bottom:1em}td,th{border:1px solid #ccc;padding:2px 6px;"
+            "text-align:right}</style>"
+            f"</head><body><h1>{html.escape(title)}</h1>{body}</body></html>"
+        )
+
+
+def write_reports(reports, date, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in reports.items():
+        df.write_parquet(os.path.join(output_dir, f"{name}.parquet"))
+
+    pages = []
+    for cat_sel in reports["td_metrics"]["Dimension"].unique(maintain_order=True):
+        sections = []
+        for member in (
+            reports["td_metrics"]
+            .filter(pl.col("Dimension") == cat_sel)["Member"]
+            .unique(maintain_order=True)
+        ):
+            for name, df in reports.items():
+                if name.startswith("turnover_"):
+                    continue
+                df_member = df.filter(
+                    pl.col("Dimension") == cat_sel, pl.col("Member") == member
+                ).drop("Dimension", "Member")
+                sections.append((f"{member} - {name}", df_member))
+        pages.append((f"{cat_sel}.html", f"Sales of every {cat_sel} as of {date}"))
+        write_html(os.path.join(output_dir, pages[-1][0]), pages[-1][1], sections)
+
+    sections = [
+        (f"{level.removeprefix('turnover_')} - {n_month} months", df_n)
+        for level, df in reports.items()
+        if level.startswith("turnover_")
+        for (n_month,), df_n in df.group_by("Months", maintain_order=True)
+    ]
+    pages.append(("Inventory.html", f"Inventory turnover as of {date}"))
+    write_html(os.path.join(output_dir, pages[-1][0]), pages[-1][1], sections)
+
+    links = "".join(
+        f"<li><a href='{html.escape(file)}'>{html.escape(title)}</a></li>"
+        for file, title in pages
+    )
+    with open(os.path.join(output_dir, "index.html"), "w") as f:
+        f.write(
+            "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>Reports as of {date}</title></head>"
+            f"<body><h1>Reports as of {date}</h1><ul>{links}</ul></body></html>"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the sales and inventory reports of every member."
+    )
+    parser.add_argument(
+        "--date",
+        type=dt.date.fromisoformat,
+        default=DATE,
+        help="as of date, YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--dims", nargs="+", choices=list(CAT_MAP), default=list(CAT_MAP)
+    )
+    parser.add_argument(
+        "--output", help="output directory, ./reports/<date> by default"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    args = parser.parse_args()
+
+    output_dir = args.output or os.path.join("reports", args.date.isoformat())
+    reports = compute_reports(args.date, args.dims, args.workers)
+    write_reports(reports, args.date, output_dir)
+    print(f"{output_dir}: wrote {len(reports)} reports")
+
+
+if __name__ == "__main__":
+    main()
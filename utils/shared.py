@@ -0,0 +1,81 @@
+import fcntl
+import glob
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import polars as pl
+
+from utils.config import SHARED_DIR
+
+# versions kept on disk, the previous one stays mapped by processes that
+# have not picked up the refresh yet
+KEEP_VERSIONS = 2
+
+_held = threading.local()
+
+
+@contextmanager
+def lock_dir(path):
+    # one writer at a time across the threads and processes sharing path, an
+    # flock on a file opened per call so threads of one process exclude each
+    # other too, the thread holding the lock can take it again
+    held = _held.__dict__.setdefault("dirs", set())
+    if path in held:
+        yield
+        return
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+
+
+def _remove_stale_versions(shared_dir, version):
+    # unlinking a file does not affect processes that still have it mapped,
+    # temporary files left under the lock come from crashed writers
+    for tmp_file in glob.glob(os.path.join(shared_dir, "*", "*.tmp-*")):
+        os.remove(tmp_file)
+    versions = [
+        name
+        for name in os.listdir(shared_dir)
+        if os.path.isdir(os.path.join(shared_dir, name))
+    ]
+    versions.sort(key=lambda name: os.path.getmtime(os.path.join(shared_dir, name)))
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != version:
+            shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+def publish_frame(version, name, build, shared_dir=SHARED_DIR):
+    # every frame of a dataset version is a file in the directory of the
+    # version, the first process to need it writes it under the lock, the
+    # others wait and then find it; the file is renamed into place so readers
+    # only ever see a complete file
+    file = os.path.join(shared_dir, version, f"{name}.arrow")
+    if os.path.exists(file):
+        return file
+
+    with lock_dir(shared_dir):
+        if not os.path.exists(file):
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            tmp_file = f"{file}.tmp-{os.getpid()}"
+            # uncompressed and in one chunk so the file can be mapped as is
+            build().rechunk().write_ipc(tmp_file, compression="uncompressed")
+            os.rename(tmp_file, file)
+            _remove_stale_versions(shared_dir, version)
+    return file
+
+
+def map_frame(version, name, build, shared_dir=SHARED_DIR):
+    # a read-only memory map shared by every process on the host, the frame
+    # is zero-copy over the page cache
+    return pl.read_ipc(
+        publish_frame(version, name, build, shared_dir),
+        memory_map=True,
+        rechunk=False,
+    )
@@ -0,0 +1,265 @@
+import math
+
+import numpy as np
+import polars as pl
+
+# hyperloglog sketches of the distinct customers and orders per month, kept
+# sparse as a list of the registers seen in every group, each packed with its
+# highest rank as register * 64 + rank. two sketches merge by taking the max
+# rank per register so any set of months, members or parts is one merge
+PRECISION = 12
+REGISTERS = 2**PRECISION
+RANK_BITS = 6
+# relative standard error of a distinct count, about 1.6%
+ERROR = 1.04 / math.sqrt(REGISTERS)
+SKETCH_KEYS = {"Customers": "CustomerID", "Orders": "OrderID"}
+# grouping sets of the sketch table, every level keeps one hierarchy down to
+# the given column, drill-downs below them (e.g. products) are counted exactly
+SKETCH_LEVELS = [
+    ["CategoryName", "SubcategoryName"],
+    ["TeamID", "BuyerName"],
+    ["BrandName"],
+]
+SKETCH_COLS = [
+    "OrderDate",
+    *[col for level in SKETCH_LEVELS for col in level],
+    "ClassName",
+    *SKETCH_KEYS.values(),
+]
+
+
+def _u64(value):
+    return pl.lit(value, dtype=pl.UInt64)
+
+
+def _shift_right(expr, bits):
+    return expr // _u64(2**bits)
+
+
+def hash_ids(col):
+    # splitmix64 finalizer, unlike Expr.hash it is stable across polars
+    # versions so sketches of older snapshot parts still merge
+    z = pl.col(col).cast(pl.UInt64) + _u64(0x9E3779B97F4A7C15)
+    z = z.xor(_shift_right(z, 30)) * _u64(0xBF58476D1CE4E5B9)
+    z = z.xor(_shift_right(z, 27)) * _u64(0x94D049BB133111EB)
+    return z.xor(_shift_right(z, 31))
+
+
+def pack_rows(lf, cols=SKETCH_COLS[1:-2]):
+    # one register entry per order line and key, the leading PRECISION bits of
+    # the hash pick the register, the rank is the position of the first set
+    # bit in the rest. cols are the columns kept next to the month
+    return pl.concat(
+        [
+            lf.select("OrderDate", *cols, col)
+            .with_columns(hash_ids(col).alias("Hash"))
+            .select(
+                pl.col("OrderDate").dt.month_start().alias("Month"),
+                *cols,
+                pl.lit(key).alias("Key"),
+                (
+                    _shift_right(pl.col("Hash"), 64 - PRECISION) * _u64(2**RANK_BITS)
+                    + (
+                        pl.col("Hash") % _u64(2 ** (64 - PRECISION))
+                    ).bitwise_leading_zeros()
+                    - PRECISION
+                    + 1
+                )
+                .cast(pl.UInt32)
+                .alias("Registers"),
+            )
+            for key, col in SKETCH_KEYS.items()
+        ]
+    )
+
+
+def max_registers(lf_packed, by):
+    # the packed entries of a register share its leading bits, so their max
+    # holds the highest rank
+    return lf_packed.group_by(
+        "Month", *by, "Key", (pl.col("Registers") // 2**RANK_BITS).alias("Register")
+    ).agg(pl.max("Registers"))
+
+
+def group_registers(lf_packed):
+    # the register entries of every level of the sketch, one list per group
+    return pl.concat(
+        [
+            max_registers(lf_packed, [*level, "ClassName"])
+            .group_by("Month", *level, "ClassName", "Key")
+            .agg(pl.col("Registers"))
+            .with_columns(pl.lit(i, dtype=pl.UInt8).alias("Level"))
+            for i, level in enumerate(SKETCH_LEVELS)
+        ],
+        how="diagonal",
+    ).sort("Month")
+
+
+def build_sketch(df):
+    return group_registers(pack_rows(df.lazy()))
+
+
+def find_level(cols):
+    # the first level holding every column, None when no level does
+    for i, level in enumerate(SKETCH_LEVELS):
+        if set(cols) <= set(level):
+            return i
+    return None
+
+
+# 2 ** -rank of every rank, looked up rather than computed per register
+_INVERSE_POWERS = 2.0 ** -np.arange(2**RANK_BITS)
+
+
+def estimate(registers):
+    # hyperloglog estimate of every row of a dense (groups, REGISTERS) array,
+    # with the linear counting correction for small counts
+    n_zero = (registers == 0).sum(axis=1)
+    harmonic = _INVERSE_POWERS[registers].sum(axis=1)
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS**2 / harmonic
+    with np.errstate(divide="ignore"):
+        linear = REGISTERS * np.log(REGISTERS / n_zero)
+    counts = np.where((raw <= 2.5 * REGISTERS) & (n_zero > 0), linear, raw)
+    return np.round(counts).astype(np.int64)
+
+
+def _class_key():
+    return pl.format("{} Customers", pl.col("ClassName").cast(pl.String)).alias("Key")
+
+
+def slice_months(sketch, months):
+    # the rows of the months of a (first day, last day) window
+    month_start, month_end = months
+    if month_start is not None:
+        sketch = sketch.filter(pl.col("Month") >= month_start)
+    if month_end is not None:
+        sketch = sketch.filter(pl.col("Month") <= month_end)
+    return sketch
+
+
+def _fill_registers(dfs, by):
+    # the register entries of every group of by in one dense array, filled
+    # with the max rank seen per register, the groups are numbered on the
+    # rows before their register lists are exploded
+    df_groups = (
+        pl.concat([df.select(by) for df in dfs])
+        .unique(maintain_order=True)
+        .with_row_index("Group")
+    )
+    registers = np.zeros((len(df_groups), REGISTERS), dtype=np.uint8)
+    for df in dfs:
+        df_entries = df.join(df_groups, on=by, how="left", join_nulls=True).select(
+            "Group", "Registers"
+        )
+        if df_entries.schema["Registers"] == pl.List:
+            df_entries = df_entries.explode("Registers").drop_nulls()
+        packed = df_entries["Registers"].to_numpy()
+        np.maximum.at(
+            registers,
+            (df_entries["Group"].to_numpy(), packed >> RANK_BITS),
+            (packed & (2**RANK_BITS - 1)).astype(np.uint8),
+        )
+    return df_groups.drop("Group"), registers
+
+
+def _union(df_groups, registers, by):
+    # the registers of the groups sharing by merged into one row each
+    df_by = df_groups.select(by).unique(maintain_order=True).with_row_index("By")
+    ids = df_groups.join(df_by, on=by, how="left", join_nulls=True)["By"].to_numpy()
+    order = np.argsort(ids, kind="stable")
+    starts = np.flatnonzero(np.diff(ids[order].astype(np.int64), prepend=-1))
+    return df_by.drop("By"), np.maximum.reduceat(registers[order], starts, axis=0)
+
+
+def merge_sketch(sketch, dims, filters=None, rows=()):
+    # estimated counts per group of dims over the rows of the sketch and the
+    # order lines of the lazy frames in rows, e.g. the partial months at the
+    # ends of a window. the dims and filtered columns must fit in one level,
+    # see find_level
+    filters = {
+        col: value for col, value in (filters or {}).items() if value is not None
+    }
+    level = find_level([*dims, *filters])
+    by = [*dims, "ClassName", "Key"]
+    frames = [
+        sketch.lazy().filter(pl.col("Level") == level),
+        *(pack_rows(lf) for lf in rows),
+    ]
+    for col, value in filters.items():
+        frames = [lf.filter(pl.col(col) == value) for lf in frames]
+    # the frames may not share their categories, they are compared as strings
+    dfs = pl.collect_all(
+        [
+            lf.select(*by, "Registers").with_columns(
+                pl.col(pl.Categorical).cast(pl.String)
+            )
+            for lf in frames
+        ]
+    )
+    df_groups, registers = _fill_registers(dfs, by)
+    dtypes = {dim: sketch.schema[dim] for dim in dims}
+    if df_groups.is_empty():
+        return pl.DataFrame(schema={**dtypes, "Key": pl.String, "Count": pl.Int64})
+
+    # a customer counts once across classes in the totals
+    df_totals, totals = _union(df_groups, registers, [*dims, "Key"])
+    is_customers = (df_groups["Key"] == "Customers").to_numpy()
+    return pl.concat(
+        [
+            df_totals.with_columns(pl.Series("Count", estimate(totals))),
+            df_groups.filter(is_customers)
+            .select(*dims, _class_key())
+            .with_columns(pl.Series("Count", estimate(registers[is_customers]))),
+        ]
+    ).cast(dtypes)
+
+
+def count_distinct(lf, dims):
+    # exact counts in the long format of merge_sketch, lf holds the order
+    # lines of the selection
+    counts = [pl.col(col).n_unique().alias(key) for key, col in SKETCH_KEYS.items()]
+    df_totals = (
+        (lf.group_by(dims).agg(counts) if dims else lf.select(counts))
+        .collect()
+        .unpivot(index=dims, variable_name="Key", value_name="Count")
+    )
+    df_classes = (
+        lf.group_by(*dims, "ClassName")
+        .agg(pl.col("CustomerID").n_unique().alias("Count"))
+        .select(*dims, _class_key(), "Count")
+        .collect()
+    )
+    # each collect casts the categories anew, the two frames are concatenated
+    # as strings
+    dtypes = lf.collect_schema()
+    return pl.concat(
+        [
+            df_totals.cast({dim: pl.String for dim in dims}),
+            df_classes.cast(
+                {**{dim: pl.String for dim in dims}, "Count": df_totals["Count"].dtype}
+            ),
+        ]
+    ).cast({dim: dtypes[dim] for dim in dims})
+
+
+def widen_counts(df_counts, dims):
+    # one column per count, Customers and Orders first then the customers of
+    # every class, e.g. "SVIP Customers"
+    keys = [*SKETCH_KEYS, *sorted(set(df_counts["Key"]) - set(SKETCH_KEYS))]
+    df_wide = (
+        df_counts.with_columns(pl.lit(0).alias("Row"))
+        .pivot("Key", index=[*dims, "Row"], values="Count")
+        .cast({key: pl.Int64 for key in keys if key in df_counts["Key"]})
+    )
+    return df_wide.select(
+        *dims,
+        *(
+            (
+                pl.col(key).fill_null(0)
+                if key in df_wide.columns
+                else pl.lit(0, pl.Int64).alias(key)
+            )
+            for key in keys
+        ),
+    ).sort(dims)
@@ -0,0 +1,212 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+
+import polars as pl
+
+from utils.config import SNAPSHOT_DIR
+from utils.shared import lock_dir
+
+META_FILE = "meta.json"
+# meta of a partitioned dataset written by utils/partition.py
+DATASET_META_FILE = "dataset.json"
+PARTITION_DIR = re.compile(r"year=(\d+)/month=(\d+)$")
+# bump when the layout of the prepared frame or of the aggregates stored
+# next to it changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 6
+
+
+def get_file_hash(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_source_key(path, with_hash=True):
+    stat = os.stat(path)
+    key = {
+        "source": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if with_hash:
+        key["sha256"] = get_file_hash(path)
+    return key
+
+
+def get_tmp_path(path):
+    # a name next to path for a writer to fill and then rename over path,
+    # unique to the process and thread so concurrent writers never share it
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+def lock_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    # one writer at a time across the threads and processes sharing
+    # snapshot_dir, see utils/shared.py
+    return lock_dir(snapshot_dir)
+
+
+def _write_json(path, obj):
+    tmp_path = get_tmp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def read_meta(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        meta = None
+    if meta is None or meta.get("format") != SNAPSHOT_FORMAT:
+        return {"format": SNAPSHOT_FORMAT, "parts": {}}
+    return meta
+
+
+def _resolve(part, snapshot_dir):
+    return {
+        **part,
+        "files": {
+            name: os.path.join(snapshot_dir, file)
+            for name, file in part["files"].items()
+        },
+    }
+
+
+def find_snapshot(path, snapshot_dir=SNAPSHOT_DIR, meta=None):
+    # every source file (the base export and each appended batch) has its own
+    # snapshot part, so a new batch never invalidates the parts before it
+    meta = meta or read_meta(snapshot_dir)
+    key = get_source_key(path, with_hash=False)
+    part = meta["parts"].get(key["source"])
+    if part is None or not all(
+        os.path.exists(os.path.join(snapshot_dir, file))
+        for file in part["files"].values()
+    ):
+        return None
+
+    if part["size"] != key["size"]:
+        return None
+    if part["mtime_ns"] != key["mtime_ns"]:
+        # the file was touched, only re-ingest when its content really changed
+        if part["sha256"] != get_file_hash(path):
+            return None
+        part["mtime_ns"] = key["mtime_ns"]
+        with lock_snapshots(snapshot_dir):
+            meta = read_meta(snapshot_dir)
+            if meta["parts"].get(key["source"], {}).get("sha256") == part["sha256"]:
+                meta["parts"][key["source"]]["mtime_ns"] = key["mtime_ns"]
+                _write_json(os.path.join(snapshot_dir, META_FILE), meta)
+
+    return _resolve(part, snapshot_dir)
+
+
+def read_snapshot(path, snapshot_dir=SNAPSHOT_DIR):
+    part = find_snapshot(path, snapshot_dir)
+    if part is None:
+        return None
+    return pl.read_parquet(part["files"]["data"])
+
+
+def write_snapshot(path, df, extra=None, snapshot_dir=SNAPSHOT_DIR):
+    # df is the fact table, extra holds its dimensions and the aggregates
+    # derived from the same rows
+    os.makedirs(snapshot_dir, exist_ok=True)
+    key = get_source_key(path)
+    files = {}
+    for name, df_part in {"data": df, **(extra or {})}.items():
+        file = f"{name}-{key['sha256'][:16]}-{SNAPSHOT_FORMAT}.parquet"
+        # write then rename so concurrent readers never see a partial file
+        tmp_path = get_tmp_path(os.path.join(snapshot_dir, file))
+        df_part.write_parquet(tmp_path, statistics=True)
+        os.replace(tmp_path, os.path.join(snapshot_dir, file))
+        files[name] = file
+
+    dates = df["OrderDate"]
+    part = {
+        **key,
+        "files": files,
+        "date_min": None if dates.is_empty() else dates.min().isoformat(),
+        "date_max": None if dates.is_empty() else dates.max().isoformat(),
+    }
+
+    # the meta of the other parts may have changed since it was last read
+    with lock_snapshots(snapshot_dir):
+        meta = read_meta(snapshot_dir)
+        old_part = meta["parts"].get(key["source"])
+        meta["parts"][key["source"]] = part
+        _write_json(os.path.join(snapshot_dir, META_FILE), meta)
+        if old_part is not None:
+            for file in set(old_part["files"].values()) - set(files.values()):
+                try:
+                    os.remove(os.path.join(snapshot_dir, file))
+                except FileNotFoundError:
+                    pass
+
+    return _resolve(part, snapshot_dir)
+
+
+def is_date_ordered(parts):
+    # parts can be scanned as one frame sorted by OrderDate when none of them
+    # starts before the previous one ends
+    date_max = None
+    for part in parts:
+        if part["date_min"] is None:
+            continue
+        if date_max is not None and part["date_min"] < date_max:
+            return False
+        date_max = part["date_max"]
+    return True
+
+
+def read_dataset_part(dataset_dir):
+    # a partitioned dataset is one part whose data is a directory of
+    # year=YYYY/month=M partitions, each holding the sorted rows of the month
+    try:
+        with open(os.path.join(dataset_dir, DATASET_META_FILE)) as f:
+            part = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if part.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return _resolve(part, dataset_dir)
+
+
+def write_dataset_meta(dataset_dir, part):
+    _write_json(os.path.join(dataset_dir, DATASET_META_FILE), part)
+    return _resolve(part, dataset_dir)
+
+
+def get_partitions(data_dir):
+    # (year, month, directory) of every partition in calendar order
+    partitions = []
+    for path in glob.glob(os.path.join(data_dir, "year=*", "month=*")):
+        match = PARTITION_DIR.search(path.replace(os.sep, "/"))
+        if match:
+            partitions.append((int(match[1]), int(match[2]), path))
+    return sorted(partitions)
+
+
+def get_part_files(part, date_range=None):
+    # the data files of a part in OrderDate order, partitions of a dataset
+    # outside date_range are pruned without being opened
+    if part.get("backend") != "hive":
+        return [part["files"]["data"]]
+    date_start, date_end = date_range or (None, None)
+    files = []
+    for year, month, path in get_partitions(part["files"]["data"]):
+        if date_start is not None and (year, month) < (
+            date_start.year,
+            date_start.month,
+        ):
+            continue
+        if date_end is not None and (year, month) > (date_end.year, date_end.month):
+            continue
+        files.extend(sorted(glob.glob(os.path.join(path, "*.parquet"))))
+    return files
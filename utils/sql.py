@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import polars as pl
+
+from utils.config import (
+    DATA_FILE,
+    DATABASE_URL,
+    ORDERS_TABLE,
+    SQL_BATCH_ROWS,
+    SQL_POOL_SIZE,
+    SQL_REFRESH,
+)
+
+# columns of the orders table, OrderDate is ISO text since sqlite has no
+# date type
+ORDER_SCHEMA = {
+    "OrderID": pl.Int64,
+    "OrderDate": pl.String,
+    "CustomerID": pl.Int32,
+    "CustomerName": pl.String,
+    "ClassID": pl.Int32,
+    "ClassName": pl.String,
+    "ProductID": pl.String,
+    "ProductName": pl.String,
+    "BrandID": pl.Int32,
+    "BrandName": pl.String,
+    "CategoryID": pl.Int32,
+    "CategoryName": pl.String,
+    "SubcategoryID": pl.Int32,
+    "SubcategoryName": pl.String,
+    "UnitPrice": pl.Int64,
+    "Discount": pl.Float64,
+    "Quantity": pl.Int64,
+    "BuyerID": pl.Int32,
+    "BuyerFirstName": pl.String,
+    "BuyerLastName": pl.String,
+    "TeamID": pl.Int32,
+    "SupplierID": pl.Int32,
+    "Cost": pl.Float64,
+    "Stock": pl.Int64,
+}
+# the derived columns of prepare_data computed by the database
+DERIVED_SQL = {
+    "Sales": "(UnitPrice - Discount) * Quantity",
+    "StockValue": "(UnitPrice - Discount) * Stock",
+    "Profit": "(UnitPrice - Discount) * Quantity - Cost * Quantity",
+    "BuyerName": "BuyerFirstName || ' ' || BuyerLastName",
+}
+SCHEMA = {
+    **ORDER_SCHEMA,
+    "Sales": pl.Float64,
+    "StockValue": pl.Float64,
+    "Profit": pl.Float64,
+    "BuyerName": pl.String,
+}
+
+
+# column types of the table written by write_orders, INTEGER otherwise
+SQL_TYPES = {pl.String: "TEXT", pl.Float64: "REAL"}
+
+
+def connect_sqlite(url):
+    # sqlite:///relative/path.db or sqlite:////absolute/path.db
+    return sqlite3.connect(urlparse(url).path[1:], check_same_thread=False)
+
+
+# a connect function per url scheme, other DB-API drivers plug in here and
+# must accept qmark placeholders
+CONNECTORS = {"sqlite": connect_sqlite}
+
+
+class ConnectionPool:
+    # at most size connections, opened on first use and handed to one thread
+    # at a time, callers wait for a free one once all are open
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.size = size
+        self.n_open = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            is_new = self.n_open < self.size
+            if is_new:
+                self.n_open += 1
+        if not is_new:
+            return self._idle.get()
+        conn = None
+        try:
+            conn = self.connect()
+        finally:
+            # a failed connect gives its slot back, the error propagates
+            if conn is None:
+                with self._lock:
+                    self.n_open -= 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self.n_open -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url=DATABASE_URL):
+    with _pools_lock:
+        if url not in _pools:
+            scheme = urlparse(url).scheme
+            if scheme not in CONNECTORS:
+                raise ValueError(
+                    f"Unsupported database {scheme!r}, expected one of {list(CONNECTORS)}"
+                )
+            _pools[url] = ConnectionPool(lambda: CONNECTORS[scheme](url), SQL_POOL_SIZE)
+        return _pools[url]
+
+
+def _parse_dates(df):
+    if "OrderDate" in df.columns:
+        return df.with_columns(pl.col("OrderDate").str.to_date("%Y-%m-%d"))
+    return df
+
+
+def read_query(sql, params, schema, url=DATABASE_URL):
+    # the rows are fetched off the cursor SQL_BATCH_ROWS at a time, so at
+    # most one batch is held as python rows before it becomes a frame, the
+    # result is still collected whole
+    with get_pool(url).connection() as conn:
+        batches = [
+            _parse_dates(df_batch)
+            for df_batch in pl.read_database(
+                sql,
+                conn,
+                iter_batches=True,
+                batch_size=SQL_BATCH_ROWS,
+                schema_overrides=schema,
+                execute_options={"parameters": params},
+            )
+        ]
+    if not batches:
+        return _parse_dates(pl.DataFrame(schema=schema))
+    return pl.concat(batches, rechunk=False)
+
+
+def _expr(col):
+    return DERIVED_SQL.get(col, col)
+
+
+def _where(date_range, filters):
+    clauses = []
+    params = []
+    if date_range is not None:
+        date_start, date_end = date_range
+        if date_start is not None:
+            clauses.append("OrderDate >= ?")
+            params.append(date_start.isoformat())
+        if date_end is not None:
+            clauses.append("OrderDate <= ?")
+            params.append(date_end.isoformat())
+    for col, value in (filters or {}).items():
+        if value is not None:
+            clauses.append(f"{_expr(col)} = ?")
+            params.append(value)
+    return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def read_orders(columns=None, date_range=None, filters=None, url=DATABASE_URL):
+    # the prepared order lines, projection and filters run in the database
+    columns = columns or list(SCHEMA)
+    where, params = _where(date_range, filters)
+    select = ", ".join(
+        f"{DERIVED_SQL[col]} AS {col}" if col in DERIVED_SQL else col for col in columns
+    )
+    sql = f"SELECT {select} FROM {ORDERS_TABLE}{where} ORDER BY OrderDate, OrderID"
+    return read_query(sql, params, {col: SCHEMA[col] for col in columns}, url)
+
+
+def read_rollup(dims, metrics, date_range=None, filters=None, url=DATABASE_URL):
+    # the group_by runs in the database, only the groups come back
+    where, params = _where(date_range, filters)
+    select = ", ".join(
+        [
+            *(f"{_expr(dim)} AS {dim}" for dim in dims),
+            *(f"SUM({_expr(metric)}) AS {metric}" for metric in metrics),
+        ]
+    )
+    group_by = ", ".join(_expr(dim) for dim in dims)
+    sql = (
+        f"SELECT {select} FROM {ORDERS_TABLE}{where} "
+        f"GROUP BY {group_by} ORDER BY {group_by}"
+    )
+    return read_query(sql, params, {col: SCHEMA[col] for col in [*dims, *metrics]}, url)
+
+
+# a row counting the changes to the orders table, kept up to date by the
+# triggers of write_orders
+CHANGES_TABLE = f"{ORDERS_TABLE}_changes"
+
+_part_state = {}
+
+
+def _read_changes(cursor):
+    # None for tables written without the triggers, any other error raises so
+    # it cannot pass for an unchanged table
+    try:
+        cursor.execute(f"SELECT changes FROM {CHANGES_TABLE}")
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return None
+    return cursor.fetchone()[0]
+
+
+def get_part(url=DATABASE_URL):
+    # the state of the orders table stands in for the files of a snapshot
+    # part, it is checked again at most every SQL_REFRESH seconds
+    state = _part_state.get(url)
+    if state is not None and time.monotonic() - state[0] < SQL_REFRESH:
+        return state[1]
+
+    with get_pool(url).connection() as conn:
+        cursor = conn.cursor()
+        changes = _read_changes(cursor)
+        if changes is None:
+            # a fingerprint over every column the prepared rows derive from,
+            # misses only updates that keep all the sums
+            cursor.execute(
+                "SELECT COUNT(*), MAX(OrderID), SUM(Quantity), SUM(Stock), "
+                "SUM(UnitPrice), SUM(Discount), SUM(Cost) "
+                f"FROM {ORDERS_TABLE}"
+            )
+            changes = cursor.fetchone()
+        # two subqueries so both are answered from the date index
+        cursor.execute(
+            f"SELECT (SELECT MIN(OrderDate) FROM {ORDERS_TABLE}), "
+            f"(SELECT MAX(OrderDate) FROM {ORDERS_TABLE})"
+        )
+        date_min, date_max = cursor.fetchone()
+        cursor.close()
+    fingerprint = repr((changes, date_min, date_max))
+    key = f"{url}#{hashlib.sha256(fingerprint.encode()).hexdigest()[:16]}"
+    part = {
+        "source": url,
+        "backend": "sql",
+        "files": {"data": key, "cube": key},
+        "date_min": None if date_min is None else str(date_min),
+        "date_max": None if date_max is None else str(date_max),
+    }
+    _part_state[url] = (time.monotonic(), part)
+    return part
+
+
+def write_orders(df, url, if_exists="fail"):
+    # df holds raw order rows in the DATA_FILE schema, OrderDate as m/d/y
+    with get_pool(url).connection() as conn:
+        if if_exists == "replace":
+            conn.execute(f"DROP TABLE IF EXISTS {ORDERS_TABLE}")
+            conn.execute(f"DROP TABLE IF EXISTS {CHANGES_TABLE}")
+        columns = ", ".join(
+            f"{col} {SQL_TYPES.get(dtype, 'INTEGER')}"
+            for col, dtype in ORDER_SCHEMA.items()
+        )
+        conn.execute(f"CREATE TABLE {ORDERS_TABLE} ({columns})")
+        conn.execute(f"CREATE INDEX {ORDERS_TABLE}_date ON {ORDERS_TABLE} (OrderDate)")
+        df = df.with_columns(
+            pl.col("OrderDate").str.to_date("%m/%d/%y").dt.to_string("%Y-%m-%d")
+        ).select(list(ORDER_SCHEMA))
+        placeholders = ", ".join("?" * len(ORDER_SCHEMA))
+        for df_batch in df.iter_slices(SQL_BATCH_ROWS):
+            conn.executemany(
+                f"INSERT INTO {ORDERS_TABLE} VALUES ({placeholders})",
+                df_batch.iter_rows(),
+            )
+        # the triggers come after the bulk insert so it does not pay for them,
+        # later writes bump the counter get_part compares
+        conn.execute(f"CREATE TABLE {CHANGES_TABLE} (changes INTEGER NOT NULL)")
+        conn.execute(f"INSERT INTO {CHANGES_TABLE} VALUES (0)")
+        for event in ["INSERT", "UPDATE", "DELETE"]:
+            conn.execute(
+                f"CREATE TRIGGER {ORDERS_TABLE}_{event.lower()} "
+                f"AFTER {event} ON {ORDERS_TABLE} "
+                f"BEGIN UPDATE {CHANGES_TABLE} SET changes = changes + 1; END"
+            )
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load an order export into a sqlite database."
+    )
+    parser.add_argument("database", help="sqlite database file")
+    parser.add_argument("--source", default=DATA_FILE, help="csv export")
+    parser.add_argument(
+        "--replace", action="store_true", help="replace an existing orders table"
+    )
+    args = parser.parse_args()
+
+    # utils.data reads through this module, imported here to avoid a cycle
+    from utils.data import read_raw_data
+
+    df = read_raw_data(args.source)
+    write_orders(
+        df, f"sqlite:///{args.database}", "replace" if args.replace else "fail"
+    )
+    print(f"{args.database}: wrote {len(df)} rows to {ORDERS_TABLE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import hashlib
+
+import polars as pl
+
+from utils.cube import CUBE_DIMS, CUBE_METRICS, build_cube
+from utils.sketch import SKETCH_LEVELS, group_registers, max_registers, pack_rows
+
+# star schema of the order lines. data/db.dmd holds no tables, so the
+# dimensions follow the columns that travel together in data/data.csv: each
+# holds the distinct combinations of its attributes, keyed by a hash of them,
+# so every snapshot part and partition keys the same combination alike and
+# dimensions of several parts merge by their keys
+DIMENSIONS = {
+    "product": (
+        "ProductKey",
+        [
+            "ProductID",
+            "ProductName",
+            "BrandID",
+            "BrandName",
+            "CategoryID",
+            "CategoryName",
+            "SubcategoryID",
+            "SubcategoryName",
+            "SupplierID",
+        ],
+    ),
+    "customer": ("CustomerKey", ["CustomerID", "CustomerName", "ClassID", "ClassName"]),
+    "buyer": ("BuyerKey", ["BuyerID", "BuyerFirstName", "BuyerLastName", "BuyerName"]),
+}
+# the dimension of every attribute
+ATTRIBUTES = {col: name for name, (_, cols) in DIMENSIONS.items() for col in cols}
+# the fact table keeps the keys and the columns without attributes of their own
+FACT_COLS = [
+    "OrderID",
+    "OrderDate",
+    "ProductKey",
+    "CustomerKey",
+    "BuyerKey",
+    "TeamID",
+    "UnitPrice",
+    "Discount",
+    "Quantity",
+    "Cost",
+    "Stock",
+    "Sales",
+    "StockValue",
+    "Profit",
+]
+
+
+def hash_rows(df):
+    # blake2b of the values of every row, unlike Expr.hash it is stable across
+    # polars versions, dimensions are small so this runs once per combination
+    return pl.Series(
+        [
+            int.from_bytes(
+                hashlib.blake2b(repr(row).encode(), digest_size=8).digest(), "little"
+            )
+            for row in df.iter_rows()
+        ],
+        dtype=pl.UInt64,
+    )
+
+
+def build_star(df):
+    # df is the prepared frame, the fact table keeps its row order and the
+    # dimensions keep their categories as strings so those of several parts
+    # concatenate
+    df_fact = df
+    dims = {}
+    for name, (key, cols) in DIMENSIONS.items():
+        df_dim = df.select(cols).unique(maintain_order=True)
+        df_dim = df_dim.select(hash_rows(df_dim).alias(key), *cols)
+        df_fact = df_fact.join(df_dim, on=cols, how="left", join_nulls=True)
+        dims[name] = df_dim.with_columns(pl.col(pl.Categorical).cast(pl.String))
+    return df_fact.select(FACT_COLS), dims
+
+
+def decode(lf, dims, cols):
+    # the attributes among cols looked up by the keys of every fact row, names
+    # come out as strings like those of a dataset, restore_dtypes casts them
+    exprs = []
+    for col in cols:
+        if col not in ATTRIBUTES:
+            continue
+        key, _ = DIMENSIONS[ATTRIBUTES[col]]
+        df_dim = dims[ATTRIBUTES[col]]
+        exprs.append(pl.col(key).replace_strict(df_dim[key], df_dim[col]).alias(col))
+    return lf.with_columns(exprs)
+
+
+def filter_keys(dims, col, value):
+    # a filter on an attribute becomes one on the keys of its dimension, which
+    # the scan of the fact table can push down
+    if col not in ATTRIBUTES:
+        return pl.col(col) == value
+    key, _ = DIMENSIONS[ATTRIBUTES[col]]
+    df_dim = dims[ATTRIBUTES[col]]
+    return pl.col(key).is_in(df_dim.filter(pl.col(col) == value)[key])
+
+
+def build_star_cube(lf_fact, dims):
+    # summed per day on the integer keys, only those rows are decoded and
+    # rolled up to the names of the cube, as strings like the dimensions so
+    # the cubes of several parts concatenate
+    keys = ["OrderDate", "ProductKey", "BuyerKey", "TeamID"]
+    lf = lf_fact.group_by(keys).agg(pl.sum(*CUBE_METRICS))
+    return build_cube(decode(lf, dims, CUBE_DIMS))
+
+
+def build_star_sketch(lf_fact, dims):
+    # the register maxima are taken per month on the integer keys, only those
+    # rows are decoded into the levels of the sketch, as strings like the cube
+    keys = ["ProductKey", "BuyerKey", "TeamID", "ClassName"]
+    lf_packed = pack_rows(decode(lf_fact, dims, ["CustomerID", "ClassName"]), keys)
+    lf = max_registers(lf_packed, keys).drop("Register")
+    levels = [col for level in SKETCH_LEVELS for col in level]
+    return group_registers(decode(lf, dims, levels))
@@ -0,0 +1,173 @@
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS = ["Home.py", *sorted(glob.glob("pages/*.py"))]
+# "import time: self [us] | cumulative | imported package"
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_import_times(stderr):
+    # one row per imported module with its own import and initialization time,
+    # nested modules are indented by two spaces per level
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append(
+                {
+                    "module": module,
+                    "depth": (len(indent) - 1) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                }
+            )
+    return imports
+
+
+def get_package(module):
+    # modules of the app are reported one by one, libraries as a whole
+    if module.split(".")[0] in ["utils", "pages"]:
+        return module
+    return module.split(".")[0]
+
+
+def group_import_times(imports):
+    packages = {}
+    for row in imports:
+        package = packages.setdefault(
+            get_package(row["module"]), {"modules": 0, "self_ms": 0.0}
+        )
+        package["modules"] += 1
+        package["self_ms"] += row["self_ms"]
+    return sorted(packages.items(), key=lambda item: item[1]["self_ms"], reverse=True)
+
+
+def group_spans(reruns):
+    # total time of every data function over the first run of the script
+    functions = {}
+    for rerun in reruns:
+        for record in rerun["spans"]:
+            if record["kind"] == "function":
+                function = functions.setdefault(
+                    record["name"], {"calls": 0, "total_ms": 0.0}
+                )
+                function["calls"] += 1
+                function["total_ms"] += record["duration_ms"]
+    return sorted(functions.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+
+
+def run_worker(script, result_file):
+    # runs in a fresh interpreter under -X importtime, the streamlit runtime is
+    # imported before the script like in the server
+    from streamlit.testing.v1 import AppTest
+
+    runtime_modules = sorted(sys.modules)
+    start = time.perf_counter()
+    at = AppTest.from_file(script, default_timeout=3600).run()
+    run_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(f"{script} raised {[e.value for e in at.exception]}")
+    with open(result_file, "w") as f:
+        json.dump({"run_ms": run_ms, "runtime_modules": runtime_modules}, f)
+
+
+def profile_script(script):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_file = os.path.join(tmp_dir, "result.json")
+        trace_file = os.path.join(tmp_dir, "trace.jsonl")
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-m",
+                "utils.startup",
+                "--worker",
+                script,
+                result_file,
+            ],
+            env={**os.environ, "SIMS_TRACE_FILE": trace_file, "SIMS_WARMUP": "0"},
+            capture_output=True,
+            text=True,
+            # the stderr of a failed run goes into the error below
+            check=False,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"{script} failed:\n{process.stderr[-2000:]}")
+        with open(result_file) as f:
+            result = json.load(f)
+        reruns = []
+        if os.path.exists(trace_file):
+            with open(trace_file) as f:
+                reruns = [json.loads(line) for line in f]
+
+    runtime_modules = set(result["runtime_modules"])
+    imports = parse_import_times(process.stderr)
+    return {
+        "script": script,
+        "run_ms": result["run_ms"],
+        "runtime_import_ms": sum(
+            row["self_ms"] for row in imports if row["module"] in runtime_modules
+        ),
+        "imports": [row for row in imports if row["module"] not in runtime_modules],
+        "reruns": reruns,
+    }
+
+
+def print_profile(profile, top):
+    print(f"\n{profile['script']}")
+    import_ms = sum(row["self_ms"] for row in profile["imports"])
+    print(
+        f"  streamlit runtime imports                {profile['runtime_import_ms']:>10.1f} ms"
+    )
+    print(f"  first run                                {profile['run_ms']:>10.1f} ms")
+    print(f"  of which imports                         {import_ms:>10.1f} ms")
+    print("  import and initialization time by package")
+    for package, stats in group_import_times(profile["imports"])[:top]:
+        print(
+            f"    {package:<40} {stats['self_ms']:>10.1f} ms"
+            f"  ({stats['modules']} modules)"
+        )
+    functions = group_spans(profile["reruns"])
+    if functions:
+        print("  data functions of the first run")
+        for name, stats in functions[:top]:
+            print(
+                f"    {name:<40} {stats['total_ms']:>10.1f} ms"
+                f"  ({stats['calls']} calls)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile the imports and the first run of every page."
+    )
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS, help="page scripts")
+    parser.add_argument("--top", type=int, default=10, help="rows per table")
+    parser.add_argument("--output", help="json file of the profiles")
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    profiles = [profile_script(script) for script in args.scripts]
+    for profile in profiles:
+        print_profile(profile, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(profiles, f, indent=2)
+        print(f"\nprofiles written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import datetime as dt
+import os
+
+import numpy as np
+import polars as pl
+
+from utils.config import DATA_FILE
+
+# columns that always travel together in the source export, a product keeps its
+# brand, category, price, stock and buyer, a customer keeps its class
+PRODUCT_COLS = [
+    "ProductID",
+    "ProductName",
+    "BrandID",
+    "BrandName",
+    "CategoryID",
+    "CategoryName",
+    "SubcategoryID",
+    "SubcategoryName",
+    "UnitPrice",
+    "Discount",
+    "BuyerID",
+    "BuyerFirstName",
+    "BuyerLastName",
+    "TeamID",
+    "SupplierID",
+    "Cost",
+    "Stock",
+]
+CUSTOMER_COLS = ["CustomerID", "CustomerName", "ClassID", "ClassName"]
+
+
+def read_source(source=DATA_FILE):
+    return pl.read_csv(source)
+
+
+def generate_orders(df_source, n_rows, seed=0, first_order_id=100000, n_years=3):
+    # rows resampled from the source export, so brands, products, teams and
+    # buyers keep their cardinalities, with dates spread over n_years calendar
+    # years up to the last date of the source, so the yearly partitions and
+    # the last year windows have history to skip
+    rng = np.random.default_rng(seed)
+    dates = df_source["OrderDate"].str.to_date(format="%m/%d/%y")
+    first_date = dt.date(dates.max().year - n_years + 1, 1, 1)
+    n_days = (dates.max() - first_date).days + 1
+    order_dates = np.datetime64(first_date, "D") + rng.integers(0, n_days, n_rows)
+
+    df = pl.concat(
+        [
+            df_source.select(PRODUCT_COLS)[rng.integers(0, len(df_source), n_rows)],
+            df_source.select(CUSTOMER_COLS)[rng.integers(0, len(df_source), n_rows)],
+            pl.DataFrame(
+                {
+                    "OrderID": np.arange(n_rows) + first_order_id,
+                    "OrderDate": pl.Series(order_dates).dt.strftime("%-m/%-d/%y"),
+                    "Quantity": df_source["Quantity"].to_numpy()[
+                        rng.integers(0, len(df_source), n_rows)
+                    ],
+                }
+            ),
+        ],
+        how="horizontal",
+    )
+    return df.select(df_source.columns)
+
+
+def write_orders(
+    file, n_rows, seed=0, source=DATA_FILE, chunk_rows=1_000_000, n_years=3
+):
+    # written in chunks so the size of the dataset is not bounded by memory
+    df_source = read_source(source)
+    os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+    tmp_file = f"{file}.tmp"
+    with open(tmp_file, "wb") as f:
+        for i, offset in enumerate(range(0, n_rows, chunk_rows)):
+            df_chunk = generate_orders(
+                df_source,
+                min(chunk_rows, n_rows - offset),
+                seed=(seed, i),
+                first_order_id=100000 + offset,
+                n_years=n_years,
+            )
+            df_chunk.write_csv(f, include_header=i == 0)
+    os.replace(tmp_file, file)
+    return file
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic orders in the DATA_FILE schema."
+    )
+    parser.add_argument("file", help="csv file to write")
+    parser.add_argument("--rows", type=int, required=True, help="number of rows")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument(
+        "--years", type=int, default=3, help="calendar years the dates span"
+    )
+    args = parser.parse_args()
+
+    write_orders(args.file, args.rows, args.seed, n_years=args.years)
+    print(f"{args.file}: wrote {args.rows} synthetic orders")
+
+
+if __name__ == "__main__":
+    main()
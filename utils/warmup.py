@@ -0,0 +1,149 @@
+import importlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+from utils.cache import get_usage, merge_usage, normalize_key
+from utils.config import (
+    CAT,
+    CAT_MAP,
+    DATE,
+    DATE_MIN,
+    USAGE_DECAY,
+    USAGE_FILE,
+    WARMUP,
+    WARMUP_INTERVAL,
+    WARMUP_TOP_N,
+)
+from utils.shared import lock_dir
+from utils.snapshot import get_tmp_path
+
+logger = logging.getLogger(__name__)
+
+
+def get_default_views():
+    # the views of every page before any widget is touched, the data modules
+    # are imported on the warm-up thread so Home.py does not wait for them
+    from utils import queries
+    from utils.cube import HIERARCHIES
+
+    cat = CAT_MAP[CAT[0]]
+    subcat = queries.get_members.warm(cat)[0]
+    date_range = (DATE_MIN, DATE)
+    raw_filters = {col: None for col in CAT_MAP.values()}
+    return [
+        (queries.get_raw_columns, ()),
+        *[(queries.get_members, (col,)) for col in CAT_MAP.values()],
+        (queries.get_raw_count, (raw_filters, "")),
+        (queries.get_raw_page, (raw_filters, "", "OrderDate", False, 0, 100)),
+        (queries.get_range_rollup, (HIERARCHIES["Category"], ["Sales"], date_range)),
+        (queries.get_range_rollup, (HIERARCHIES["Team"], ["Sales"], date_range)),
+        (queries.get_range_rollup, (["BrandName"], ["Sales"], date_range)),
+        *[(queries.get_monthly_rollup, (col, ["Sales"])) for col in CAT_MAP.values()],
+        (queries.get_cat_td_metrics, (cat, subcat, DATE, ["Sales", "Profit", "Cost"])),
+        (
+            queries.get_cat_sub_td_metrics,
+            (cat, subcat, DATE, "Sales", ["SubcategoryName", "BrandName"]),
+        ),
+        (queries.get_cat_td_distinct, (cat, subcat, DATE, False)),
+        (queries.get_distinct_counts, ((), date_range, {}, False)),
+        (queries.get_distinct_counts, ((cat,), date_range, {}, False)),
+        (queries.get_heatmap, (DATE.year, cat, None)),
+        (queries.get_sales_trend, ()),
+        (queries.get_turnover_tables, (DATE,)),
+    ]
+
+
+def rank_views(top_n=WARMUP_TOP_N):
+    # the defaults and the top_n most called views, most called first, the
+    # defaults go first on a fresh server
+    usage = get_usage()
+    views = {}
+    for func, args in get_default_views():
+        key = (func.__module__, func.__qualname__, normalize_key(args))
+        views[key] = (func, args, usage.get(key, {}).get("count", 0))
+    ranked = sorted(usage.items(), key=lambda item: item[1]["count"], reverse=True)
+    for key, entry in ranked[:top_n]:
+        if key not in views:
+            module, qualname, _ = key
+            func = getattr(importlib.import_module(module), qualname, None)
+            if func is not None and hasattr(func, "warm"):
+                views[key] = (func, entry["args"], entry["count"])
+    return sorted(views.values(), key=lambda view: view[2], reverse=True)
+
+
+def warm_up():
+    for func, args, _ in rank_views():
+        try:
+            func.warm(*args)
+        except Exception:
+            # recorded arguments may not apply to the current dataset
+            logger.warning(
+                "warm-up of %s%r failed", func.__qualname__, args, exc_info=True
+            )
+
+
+def _read_usage(file):
+    # the counts and the time they were saved at, None for a new file
+    if not os.path.exists(file):
+        return {}, None
+    with open(file, "rb") as f:
+        saved = pickle.load(f)
+    return saved["usage"], saved["saved_at"]
+
+
+def load_usage(file=USAGE_FILE):
+    merge_usage(_read_usage(file)[0], clear_delta=False)
+
+
+def save_usage(file=USAGE_FILE):
+    # the server processes of a host share the file, each one adds the calls
+    # it saw since its last save to the counts under the lock. the counts
+    # decay by the time since the file was last saved, by any process, so
+    # they fade at the same rate however many processes save them
+    with lock_dir(os.path.dirname(file)):
+        saved, saved_at = _read_usage(file)
+        now = time.time()
+        elapsed = 0 if saved_at is None else max(now - saved_at, 0)
+        usage = merge_usage(saved, USAGE_DECAY ** (elapsed / WARMUP_INTERVAL))
+        tmp_file = get_tmp_path(file)
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"usage": usage, "saved_at": now}, f)
+        os.replace(tmp_file, file)
+
+
+def _run(interval):
+    # warm up at start and every time the dataset version changes, polars
+    # releases the gil so sessions keep running alongside
+    from utils.data import get_dataset_version
+
+    version = None
+    while True:
+        try:
+            new_version = get_dataset_version()
+            if new_version != version:
+                warm_up()
+                version = new_version
+            save_usage()
+        except Exception:
+            logger.exception("warm-up failed")
+        time.sleep(interval)
+
+
+@st.cache_resource
+def start_warmup(interval=WARMUP_INTERVAL):
+    # one background thread per server process, started by the first rerun
+    if not WARMUP:
+        return None
+    load_usage()
+    thread = threading.Thread(target=_run, args=(interval,), name="warmup", daemon=True)
+    # the context of the starting rerun keeps the st.cache_data calls of the
+    # thread from warning about a missing context
+    add_script_run_ctx(thread)
+    thread.start()
+    return thread